@@ -0,0 +1,8 @@
+"""Makes the shared database modules importable by the tests."""
+
+# pylint: skip-file
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "shared"))
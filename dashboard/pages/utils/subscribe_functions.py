@@ -1,27 +1,20 @@
 """This script includes functions used in Subscribe.py."""
 
-from os import environ as ENV
-
-import psycopg2
 import pandas as pd
 import altair as alt
 import streamlit as st
 
 from dotenv import load_dotenv
 
+from db_pool import PooledConnection, get_pool
 
 load_dotenv()
 
 
-def connect_rds() -> psycopg2.extensions.connection:
-    """Initialize PostgreSQL connection."""
-    return psycopg2.connect(
-        host=ENV["DB_HOST"],
-        database=ENV["DB_NAME"],
-        user=ENV["DB_USER"],
-        password=ENV["DB_PASSWORD"],
-        port=ENV["DB_PORT"]
-    )
+def connect_rds() -> PooledConnection:
+    """Returns a PostgreSQL connection from the dashboard's pool. Leaving a
+    `with` block on it returns it to the pool."""
+    return get_pool().getconn()
 
 
 def is_email_in_rds(email: str) -> bool:
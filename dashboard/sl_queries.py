@@ -2,23 +2,32 @@
 This script includes dashboard functions and queries to the database.
 """
 
-from os import environ as ENV
-
 import streamlit as st
-from psycopg2 import connect
 import pandas as pd
 from dotenv import load_dotenv
 
+from db_pool import PooledConnection, get_pool
+
 load_dotenv()
 
 
-def get_connection() -> connect:
-    '''Returns a connection to the RDS database'''
-    return connect(host=ENV["DB_HOST"],
-                   port=ENV["DB_PORT"],
-                   user=ENV["DB_USER"],
-                   password=ENV["DB_PASSWORD"],
-                   database=ENV["DB_NAME"])
+def get_connection() -> PooledConnection:
+    '''Returns a connection to the RDS database, from the pool shared by
+    every session of the dashboard. Closing it returns it to the pool.'''
+    return get_pool().getconn()
+
+
+def fetch_all(query: str, params: list = None) -> list[tuple]:
+    '''Runs a query on a pooled connection, returning every row.'''
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        result = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    return result
 
 
 @st.cache_data(ttl=900)
@@ -75,10 +84,7 @@ def get_game_data(show_nsfw: bool, start_date: str, end_date: str,
     """
 
     # Execute the query with the parameters
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    result = cursor.fetchall()
+    result = fetch_all(query, params)
 
     # Convert the result to a pandas DataFrame
     df = pd.DataFrame(result, columns=[
@@ -88,9 +94,6 @@ def get_game_data(show_nsfw: bool, start_date: str, end_date: str,
 
     df['release_price'] = df['release_price'] / 100  # Convert to pounds
 
-    cursor.close()
-    conn.close()
-
     return df
 
 
@@ -120,20 +123,13 @@ def get_daily_releases(show_nsfw: bool, start_date: str,
     else:
         params = [show_nsfw, start_date, end_date]
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
     if len(os_selection) == 1:
         os_selection = [os_selection]
 
-    cursor.execute(query, params)
-    result = cursor.fetchall()
+    result = fetch_all(query, params)
 
     df = pd.DataFrame(result, columns=['release_date', 'platform_name'])
 
-    cursor.close()
-    conn.close()
-
     return df
 
 
@@ -142,16 +138,10 @@ def get_weekdays_data() -> pd.DataFrame:
     '''Retrieves release dates from the database'''
     query = "SELECT release_date FROM game;"
 
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query)
-    result = cursor.fetchall()
+    result = fetch_all(query)
 
     # Create DataFrame from the fetched result manually
     df = pd.DataFrame(result, columns=['release_date'])
-
-    cursor.close()
-    conn.close()
     return df
 
 
@@ -167,15 +157,9 @@ def get_daily_game_count() -> pd.DataFrame:
     ORDER BY g.release_date;
     """
 
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query)
-    result = cursor.fetchall()
+    result = fetch_all(query)
 
     df = pd.DataFrame(result, columns=['release_date', 'total_games'])
-
-    cursor.close()
-    conn.close()
     return df
 
 
@@ -207,16 +191,10 @@ def get_genre_data(show_nsfw: bool, start_date: str,
 
     query += " GROUP BY ge.genre_name LIMIT 10;"
 
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    result = cursor.fetchall()
+    result = fetch_all(query, params)
 
     df = pd.DataFrame(result, columns=['genre_name', 'game_count'])
 
-    cursor.close()
-    conn.close()
-
     return df
 
 
@@ -248,14 +226,8 @@ def get_game_descriptions(show_nsfw: bool, start_date: str, end_date: str, os_se
         query += " AND gen.genre_name = %s"
         params.append(genre_selection)
 
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    result = cursor.fetchall()
+    result = fetch_all(query, params)
 
     descriptions = [row[0] for row in result]
 
-    cursor.close()
-    conn.close()
-
     return descriptions
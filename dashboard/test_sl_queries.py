@@ -8,6 +8,7 @@ import pandas as pd
 from dotenv import load_dotenv
 
 from sl_queries import (
+    fetch_all,
     get_connection,
     get_game_data,
     get_daily_releases,
@@ -139,3 +140,15 @@ def test_get_game_descriptions(mock_get_connection):
     assert isinstance(result, list)
     assert len(result) > 0
     assert result[0] == 'Description 1'
+
+
+@patch('sl_queries.get_connection')
+def test_fetch_all_returns_the_connection_on_error(mock_get_connection):
+    """Tests that a failed query still returns its connection to the pool."""
+    mock_cursor = MagicMock()
+    mock_cursor.execute.side_effect = RuntimeError("query failed")
+    mock_get_connection.return_value.cursor.return_value = mock_cursor
+
+    with pytest.raises(RuntimeError):
+        fetch_all("SELECT 1;")
+    mock_get_connection.return_value.close.assert_called_once()
@@ -0,0 +1,110 @@
+"""Benchmarks loading synthetic listings a listing at a time against the
+bulk load, on a local Postgres.
+
+The tables are created from `schema/schema.sql` in a scratch schema,
+`bulk_load_benchmark`, which is dropped afterwards, so the database's own
+tables are never touched. Connects with the usual `DB_*` variables.
+
+Run with `python3 benchmark_bulk_load.py [number of listings]`. Defaults to 10,000."""
+
+from pathlib import Path
+from sys import argv
+from time import perf_counter
+
+from bulk_load import bulk_upload_listings
+from dimension_cache import DimensionCache
+from get_data_from_database import get_connection
+from upload_to_db import iter_genres, upload_all_listings_to_database
+
+SCHEMA = "bulk_load_benchmark"
+SCHEMA_FILE = Path(__file__).parent.parent / "schema" / "schema.sql"
+PLATFORMS = ["steam", "gog", "epic"]
+GENRES = ["Indie", "Action", "Casual", "Adventure", "RPG", "Strategy", "Roguelike", "Puzzle"]
+OPERATING_SYSTEMS = ["Windows", "Mac", "Linux"]
+TABLES = "game_listing, game_os_assignment, game_genre_assignment, game"
+
+
+def make_listings(count: int, platform: str) -> list[dict]:
+    """Returns synthetic listings, in the scrapers' output format."""
+    return [{"title": f"Game {i}",
+             "description": f"The {i}th game on {platform}.",
+             "release_date": f"{i % 28 + 1:02}/10/2026",
+             "operating_systems": OPERATING_SYSTEMS[:i % 3 + 1],
+             "genres": [GENRES[i % len(GENRES)], GENRES[(i + 3) % len(GENRES)]],
+             "is_nsfw": False,
+             "tags": ["Singleplayer", "Pixel Graphics"],
+             "current_price": i % 6000,
+             "url": f"https://{platform}.example.com/game/{i}",
+             "img_url": f"https://{platform}.example.com/game/{i}.jpg"}
+            for i in range(count)]
+
+
+def make_batch(count: int) -> list[dict]:
+    """Returns `count` listings, split between the platforms."""
+    return [{"platform": platform, "listings": make_listings(count // len(PLATFORMS), platform)}
+            for platform in PLATFORMS]
+
+
+def reset_tables(conn) -> None:
+    """Empties the game tables, keeping the seeded ones."""
+    with conn.cursor() as curs:
+        curs.execute(f"TRUNCATE {TABLES} RESTART IDENTITY;")
+        curs.execute("DELETE FROM genre WHERE genre_id > 14;")
+    conn.commit()
+
+
+def time_row_load(batch: list[dict], conn) -> float:
+    """Returns the seconds taken to load a batch a listing at a time."""
+    cache = DimensionCache()
+    cache.add_genres(iter_genres(batch), conn)
+    maps = cache.get_maps(conn)
+    start = perf_counter()
+    for dataset in batch:
+        upload_all_listings_to_database(dataset, maps, conn)
+    return perf_counter() - start
+
+
+def time_bulk_load(batch: list[dict], conn) -> float:
+    """Returns the seconds taken to bulk load a batch."""
+    start = perf_counter()
+    bulk_upload_listings(batch, conn)
+    return perf_counter() - start
+
+
+def count_rows(conn) -> dict:
+    """Returns how many rows each game table holds."""
+    with conn.cursor() as curs:
+        counts = {}
+        for table in TABLES.split(", "):
+            curs.execute(f"SELECT COUNT(*) AS count FROM {table};")
+            counts[table] = curs.fetchone()["count"]
+    return counts
+
+
+if __name__ == "__main__":
+    listing_count = int(argv[1]) if len(argv) > 1 else 10_000
+    connection = get_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA};")
+        cursor.execute(f"SET search_path TO {SCHEMA};")
+        cursor.execute(SCHEMA_FILE.read_text(encoding="utf_8"))
+    connection.commit()
+    try:
+        listings = make_batch(listing_count)
+        row_time = time_row_load(listings, connection)
+        row_counts = count_rows(connection)
+        reset_tables(connection)
+        bulk_time = time_bulk_load(listings, connection)
+        if count_rows(connection) != row_counts:
+            raise ValueError("The row and bulk loads inserted different rows.")
+        total = sum(len(dataset["listings"]) for dataset in listings)
+        print(f"{'method':<6} | {'total':>8} | {'per listing':>11}")
+        print(f"{'row':<6} | {row_time:>7.2f}s | {row_time / total * 1000:>9.3f}ms")
+        print(f"{'bulk':<6} | {bulk_time:>7.2f}s | {bulk_time / total * 1000:>9.3f}ms")
+        print(f"Speed-up: {row_time / bulk_time:.1f}x over {total} listings.")
+    finally:
+        connection.rollback()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA {SCHEMA} CASCADE;")
+        connection.commit()
+        connection.close()
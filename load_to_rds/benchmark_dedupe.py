@@ -0,0 +1,118 @@
+"""Benchmarks the ways of finding which scraped listings are already in the
+database, with a million listings already loaded.
+
+In memory, it times checking each scraped URL against a list of the loaded
+ones, as the loader used to, against a set. Checking the list is timed on a
+sample of the batch and scaled up, as it takes minutes in full.
+
+With `--db`, it also times, on a local Postgres, fetching every loaded URL
+to check against, against asking only about the batch's URLs with
+`get_loaded_listings`. The listings are inserted into a scratch schema,
+`dedupe_benchmark`, which is dropped afterwards. Connects with the usual
+`DB_*` variables.
+
+Run with `python3 benchmark_dedupe.py [number scraped] [--db]`. Defaults to 10,000."""
+
+from pathlib import Path
+from sys import argv
+from time import perf_counter
+
+from get_data_from_database import get_connection, get_loaded_listings
+
+SCHEMA = "dedupe_benchmark"
+SCHEMA_FILE = Path(__file__).parent.parent / "schema" / "schema.sql"
+LOADED_COUNT = 1_000_000
+LIST_SAMPLE = 100
+
+
+def make_url(i: int) -> str:
+    """Returns the URL of the ith synthetic listing."""
+    return f"https://store.example.com/game/{i}"
+
+
+def make_batch(count: int) -> list[str]:
+    """Returns the URLs of a scraped batch, half of them already loaded."""
+    return [make_url(LOADED_COUNT - count // 2 + i) for i in range(count)]
+
+
+def time_list_check(batch: list[str], loaded: list[str]) -> float:
+    """Returns the seconds checking the batch against a list would take,
+    timed on a sample of it."""
+    sample = batch[:LIST_SAMPLE]
+    start = perf_counter()
+    _ = [url for url in sample if url not in loaded]
+    return (perf_counter() - start) * len(batch) / len(sample)
+
+
+def time_set_check(batch: list[str], loaded: list[str]) -> float:
+    """Returns the seconds taken to check the batch against a set, including
+    building it."""
+    start = perf_counter()
+    loaded = set(loaded)
+    _ = [url for url in batch if url not in loaded]
+    return perf_counter() - start
+
+
+def load_listings(conn) -> None:
+    """Fills the scratch schema with a million listings."""
+    with conn.cursor() as curs:
+        curs.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA};")
+        curs.execute(f"SET search_path TO {SCHEMA};")
+        curs.execute(SCHEMA_FILE.read_text(encoding="utf_8"))
+        curs.execute("""INSERT INTO game (game_title, release_date)
+                        SELECT 'Game ' || i, '2026-10-18'
+                        FROM generate_series(0, %s - 1) AS i;""", (LOADED_COUNT,))
+        curs.execute("""INSERT INTO game_listing (game_id, platform_id, release_price, listing_url)
+                        SELECT game_id, 1, 0, %s || (game_id - 1)
+                        FROM game;""", (make_url(""),))
+        curs.execute("ANALYZE game_listing;")
+    conn.commit()
+
+
+def time_fetch_all(batch: list[str], conn) -> float:
+    """Returns the seconds taken to fetch every loaded URL and check the
+    batch against them."""
+    start = perf_counter()
+    with conn.cursor() as curs:
+        curs.execute("SELECT listing_url FROM game_listing;")
+        loaded = {row["listing_url"] for row in curs.fetchall()}
+    _ = [url for url in batch if url not in loaded]
+    return perf_counter() - start
+
+
+def time_lookup(batch: list[str], conn) -> float:
+    """Returns the seconds taken to look up only the batch's URLs."""
+    start = perf_counter()
+    loaded = get_loaded_listings(batch, conn)
+    _ = [url for url in batch if url not in loaded]
+    return perf_counter() - start
+
+
+def print_times(times: dict, total: int) -> None:
+    """Prints each method's time, in total and per scraped listing."""
+    print(f"{'method':<10} | {'total':>9} | {'per listing':>11}")
+    for method, seconds in times.items():
+        print(f"{method:<10} | {seconds:>8.3f}s | {seconds / total * 1e6:>9.1f}us")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in argv[1:] if arg != "--db"]
+    batch_count = int(args[0]) if args else 10_000
+    scraped = make_batch(batch_count)
+    loaded_urls = [make_url(i) for i in range(LOADED_COUNT)]
+    print(f"Checking {batch_count} scraped listings against {LOADED_COUNT} loaded.")
+    print_times({"list": time_list_check(scraped, loaded_urls),
+                 "set": time_set_check(scraped, loaded_urls)}, batch_count)
+
+    if "--db" in argv:
+        connection = get_connection()
+        try:
+            load_listings(connection)
+            print_times({"fetch all": time_fetch_all(scraped, connection),
+                         "lookup": time_lookup(scraped, connection)}, batch_count)
+        finally:
+            connection.rollback()
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+            connection.commit()
+            connection.close()
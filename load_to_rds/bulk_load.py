@@ -0,0 +1,207 @@
+"""This script is for loading a whole batch of listings into the database at once.
+
+Every scraped listing is streamed into a temporary staging table with one
+`COPY`, then each table is filled from it with one set-based statement, in
+a single transaction. Loading a batch costs a handful of round-trips and
+one commit, however many listings it holds, instead of about five
+round-trips and a commit per listing.
+
+Every statement is an upsert, so loading the same batch again changes
+nothing. A game released on several platforms is one row of `game`,
+matched by its normalised title and release date."""
+
+from csv import writer
+from io import StringIO
+from collections.abc import Iterable, Iterator
+
+from psycopg2.extensions import connection
+
+from transform_game_data import transform_to_tuples
+
+COPY_CHUNK_SIZE = 64 * 1024
+# Written for None, so that COPY does not also read empty strings as NULL,
+# and both load methods store the same values.
+COPY_NULL = "\\N"
+
+CREATE_STAGING_TABLE = """
+    CREATE TEMPORARY TABLE staged_listing (
+        game_id INT NOT NULL DEFAULT nextval(pg_get_serial_sequence('game', 'game_id')),
+        platform_name TEXT NOT NULL,
+        game_title TEXT NOT NULL,
+        game_description TEXT,
+        release_date TIMESTAMPTZ NOT NULL,
+        is_nsfw BOOLEAN,
+        image_url TEXT,
+        release_price INT NOT NULL,
+        listing_url TEXT NOT NULL,
+        genres TEXT[] NOT NULL,
+        operating_systems TEXT[] NOT NULL
+    ) ON COMMIT DROP;"""
+
+COPY_LISTINGS = """
+    COPY staged_listing (platform_name, game_title, game_description, release_date, is_nsfw,
+                         image_url, release_price, listing_url, genres, operating_systems)
+    FROM STDIN WITH (FORMAT csv, NULL '\\N');"""
+
+# Listings already in the database, repeated in the batch or from an
+# unknown platform are dropped before anything is inserted.
+REMOVE_UNLOADABLE_LISTINGS = """
+    DELETE FROM staged_listing AS staged
+    WHERE EXISTS (SELECT 1 FROM game_listing
+                  WHERE game_listing.listing_url = staged.listing_url)
+       OR EXISTS (SELECT 1 FROM staged_listing AS earlier
+                  WHERE earlier.listing_url = staged.listing_url
+                    AND earlier.game_id < staged.game_id)
+       OR NOT EXISTS (SELECT 1 FROM platform
+                      WHERE lower(platform.platform_name) = lower(staged.platform_name));"""
+
+INSERT_NEW_GENRES = """
+    INSERT INTO genre (genre_name)
+    SELECT DISTINCT ON (lower(staged_genre.genre_name)) staged_genre.genre_name
+    FROM staged_listing
+    CROSS JOIN LATERAL unnest(staged_listing.genres) AS staged_genre (genre_name)
+    WHERE NOT EXISTS (SELECT 1 FROM genre
+                      WHERE lower(genre.genre_name) = lower(staged_genre.genre_name))
+    ORDER BY lower(staged_genre.genre_name)
+    ON CONFLICT (genre_name) DO NOTHING;"""
+
+# A game already in the table keeps its title and fills in any details it
+# is missing; the row-by-row load uses the same clause, so both methods
+# leave the same rows.
+GAME_CONFLICT_UPDATE = """
+    ON CONFLICT ON CONSTRAINT game_identity DO UPDATE SET
+    game_description = COALESCE(game.game_description, EXCLUDED.game_description),
+    is_NSFW = game.is_NSFW OR EXCLUDED.is_NSFW,
+    image_URL = COALESCE(game.image_URL, EXCLUDED.image_URL)"""
+
+# A game listed on several platforms in the batch is inserted once, with
+# the id and title staged for its first listing, and the first of its
+# listings' details that are given, as loading them one by one would.
+INSERT_GAMES = """
+    INSERT INTO game (game_id, game_title, game_description, release_date, is_NSFW, image_URL)
+    OVERRIDING SYSTEM VALUE
+    SELECT min(game_id),
+           (array_agg(game_title ORDER BY game_id))[1],
+           (array_agg(game_description ORDER BY game_id)
+                FILTER (WHERE game_description IS NOT NULL))[1],
+           release_date,
+           bool_or(is_nsfw),
+           (array_agg(image_url ORDER BY game_id) FILTER (WHERE image_url IS NOT NULL))[1]
+    FROM staged_listing
+    GROUP BY normalise_title(game_title), release_date""" + GAME_CONFLICT_UPDATE + """
+    RETURNING xmax = 0 AS inserted;"""
+
+RESOLVE_GAME_IDS = """
+    UPDATE staged_listing SET game_id = game.game_id
+    FROM game
+    WHERE game.normalised_title = normalise_title(staged_listing.game_title)
+      AND game.release_date = staged_listing.release_date;"""
+
+INSERT_LISTINGS = """
+    INSERT INTO game_listing (game_id, platform_id, release_price, listing_url)
+    SELECT staged_listing.game_id, platform.platform_id,
+           staged_listing.release_price, staged_listing.listing_url
+    FROM staged_listing
+    JOIN platform ON lower(platform.platform_name) = lower(staged_listing.platform_name)
+    ON CONFLICT (listing_url) DO NOTHING;"""
+
+INSERT_GENRE_ASSIGNMENTS = """
+    INSERT INTO game_genre_assignment (game_id, genre_id)
+    SELECT DISTINCT staged_listing.game_id, genre.genre_id
+    FROM staged_listing
+    CROSS JOIN LATERAL unnest(staged_listing.genres) AS staged_genre (genre_name)
+    JOIN genre ON lower(genre.genre_name) = lower(staged_genre.genre_name)
+    ON CONFLICT (game_id, genre_id) DO NOTHING;"""
+
+INSERT_OS_ASSIGNMENTS = """
+    INSERT INTO game_os_assignment (game_id, os_id)
+    SELECT DISTINCT staged_listing.game_id, operating_system.os_id
+    FROM staged_listing
+    CROSS JOIN LATERAL unnest(staged_listing.operating_systems) AS staged_os (os_name)
+    JOIN operating_system ON lower(operating_system.os_name) = lower(staged_os.os_name)
+    ON CONFLICT (game_id, os_id) DO NOTHING;"""
+
+
+def format_array(values: list[str]) -> str:
+    """Formats a list of strings as a Postgres array literal."""
+
+    elements = ('"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+                for value in values)
+    return "{" + ",".join(elements) + "}"
+
+
+def to_staged_row(game: dict, platform: str) -> tuple:
+    """Transforms a game's details to a row of the staging table."""
+
+    title, description, release_date, is_nsfw, image_url = transform_to_tuples(game)
+    return (platform, title, description, release_date.isoformat(), is_nsfw, image_url,
+            game["current_price"], game["url"],
+            format_array(game["genres"]), format_array(game["operating_systems"]))
+
+
+def iter_staged_rows(all_scraped_data: list[dict]) -> Iterator[tuple]:
+    """Yields a staging table row for every listing, of every platform."""
+
+    for dataset in all_scraped_data:
+        for game in dataset["listings"]:
+            yield to_staged_row(game, dataset["platform"])
+
+
+class CsvRowReader:
+    """A file-like object reading rows as CSV, for `COPY ... FROM STDIN`.
+    Rows are only formatted as `COPY` reads them, so streamed listings are
+    never all held in memory. None is written as `COPY_NULL`."""
+
+    def __init__(self, rows: Iterable[tuple]):
+        self.rows = iter(rows)
+        self.buffer = StringIO()
+        self.csv = writer(self.buffer, lineterminator="\n")
+        self.rows_read = 0
+
+    def read(self, size: int = -1) -> str:
+        """Returns at least `size` characters of CSV, unless the rows run
+        out first, or all of it if `size` is negative."""
+
+        while size < 0 or self.buffer.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.csv.writerow(COPY_NULL if value is None else value for value in row)
+            self.rows_read += 1
+        chunk = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return chunk
+
+    def readline(self) -> str:
+        """Returns the next row as a line of CSV."""
+
+        return self.read(1)
+
+
+def bulk_upload_listings(all_scraped_data: list[dict], conn: connection) -> int:
+    """Uploads every platform's listings to the database in one
+    transaction, returning how many new games were inserted. Genres are matched
+    by name and created if they are new; unknown operating systems are
+    left out."""
+
+    try:
+        with conn.cursor() as curs:
+            curs.execute(CREATE_STAGING_TABLE)
+            reader = CsvRowReader(iter_staged_rows(all_scraped_data))
+            curs.copy_expert(COPY_LISTINGS, reader, size=COPY_CHUNK_SIZE)
+            curs.execute(REMOVE_UNLOADABLE_LISTINGS)
+            curs.execute(INSERT_NEW_GENRES)
+            curs.execute(INSERT_GAMES)
+            inserted = sum(row["inserted"] for row in curs.fetchall())
+            curs.execute(RESOLVE_GAME_IDS)
+            curs.execute(INSERT_LISTINGS)
+            curs.execute(INSERT_GENRE_ASSIGNMENTS)
+            curs.execute(INSERT_OS_ASSIGNMENTS)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    print(f"Staged {reader.rows_read} listings, inserted {inserted}.")
+    return inserted
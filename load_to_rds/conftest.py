@@ -0,0 +1,10 @@
+"""Makes the shared database modules, and the scrapers' watermark, importable
+by the tests."""
+
+# pylint: skip-file
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "shared"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "web_scraping" / "shared"))
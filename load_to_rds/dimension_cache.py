@@ -0,0 +1,130 @@
+"""This script is for caching the ids of the lookup tables: genres, platforms
+and operating systems.
+
+The cache lives as long as the process, so a warm Lambda reads each table
+once rather than on every invocation. A table is only read again when a
+name is missing from it, in case another load has added it since. New
+genres for a whole batch are added at once, with one insert and, for any
+added concurrently by another load, one re-select."""
+
+from collections.abc import Iterable
+from threading import Lock
+
+from psycopg2.extensions import connection
+
+from get_data_from_database import get_ids
+
+DIMENSIONS = {"genre": ("genre", "genre"),
+              "platform": ("platform", "platform"),
+              "os": ("operating_system", "os")}
+
+INSERT_GENRES = """
+    INSERT INTO genre (genre_name)
+    SELECT unnest(%s::TEXT[])
+    ON CONFLICT (genre_name) DO NOTHING
+    RETURNING genre_id, genre_name;"""
+
+SELECT_GENRES = """
+    SELECT genre_id, genre_name
+    FROM genre
+    WHERE lower(genre_name) = ANY(%s);"""
+
+
+class DimensionCache:
+    """Maps each lookup table's lower-cased names to their ids, reading a
+    table only when it is first needed or a name is missing from it."""
+
+    def __init__(self):
+        self.maps = {}
+        self.lock = Lock()
+        self.counts = {"queries": 0, "round_trips_saved": 0, "genres_added": 0}
+
+    def count(self, outcome: str, by: int = 1) -> None:
+        """Adds to one of the counters."""
+        self.counts[outcome] += by
+
+    def refresh(self, dimension: str, conn: connection) -> dict:
+        """Reads a lookup table again, returning its map."""
+        table_name, column_prefix = DIMENSIONS[dimension]
+        self.maps[dimension] = get_ids(table_name, conn, column_prefix)
+        self.count("queries")
+        return self.maps[dimension]
+
+    def get_map(self, dimension: str, conn: connection, names: Iterable[str] = ()) -> dict:
+        """Returns a lookup table's map, reading the table on first use, or
+        again if any of the names are missing from it."""
+        with self.lock:
+            id_map = self.maps.get(dimension)
+            if id_map is not None and all(name.lower() in id_map for name in names):
+                self.count("round_trips_saved")
+                return id_map
+            return self.refresh(dimension, conn)
+
+    def get_maps(self, conn: connection, platforms: Iterable[str] = ()) -> dict:
+        """Returns every lookup table's map, making sure the platforms are
+        in the platform map if they are in the table."""
+        return {dimension: self.get_map(dimension, conn,
+                                        platforms if dimension == "platform" else ())
+                for dimension in DIMENSIONS}
+
+    def add_genres(self, genres: Iterable[str], conn: connection) -> dict:
+        """Makes sure every genre is in the genre table, adding the new ones
+        in one go and committing them, so that only ids of committed rows
+        are ever cached. Returns the genre map."""
+        genre_to_id = self.get_map("genre", conn)
+        new_genres = {}
+        for genre in genres:
+            if genre.lower() not in genre_to_id:
+                new_genres.setdefault(genre.lower(), genre)
+        if not new_genres:
+            return genre_to_id
+
+        with self.lock:
+            genre_to_id = self.refresh("genre", conn)
+            new_genres = {key: genre for key, genre in new_genres.items()
+                          if key not in genre_to_id}
+            if new_genres:
+                with conn.cursor() as curs:
+                    curs.execute(INSERT_GENRES, (list(new_genres.values()),))
+                    rows = curs.fetchall()
+                    self.count("queries")
+                    self.count("genres_added", len(rows))
+                    genre_to_id.update({row["genre_name"].lower(): row["genre_id"]
+                                        for row in rows})
+                    missing = [key for key in new_genres if key not in genre_to_id]
+                    if missing:
+                        curs.execute(SELECT_GENRES, (missing,))
+                        self.count("queries")
+                        genre_to_id.update({row["genre_name"].lower(): row["genre_id"]
+                                            for row in curs.fetchall()})
+                conn.commit()
+        return genre_to_id
+
+    def clear(self) -> None:
+        """Forgets every table, so they are read again on next use."""
+        with self.lock:
+            self.maps = {}
+
+    def as_dict(self) -> dict:
+        """Returns the counters."""
+        with self.lock:
+            return dict(self.counts)
+
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_dimension_cache() -> DimensionCache:
+    """Returns the process-wide cache, creating it on first use."""
+    global _cache  # pylint: disable=W0603
+    with _cache_lock:
+        if _cache is None:
+            _cache = DimensionCache()
+        return _cache
+
+
+def get_dimension_cache_stats() -> dict:
+    """Returns how many queries the cache made, how many lookups it
+    answered without one, and how many genres it added."""
+    return get_dimension_cache().as_dict()
@@ -10,6 +10,8 @@ from get_subscriber_emails import get_subscribers_per_genre
 
 load_dotenv()
 
+EMAILED_FIELDS = ("title", "url", "img_url", "current_price", "genres", "description")
+
 
 def get_games_by_genre(genre: str, scraped_data: list[dict]) -> list[dict]:
     """Given a genre, returns all games with that genre."""
@@ -25,6 +27,26 @@ def get_games_by_genre(genre: str, scraped_data: list[dict]) -> list[dict]:
     return genre_games
 
 
+def group_games_by_genre(genres: list[str], scraped_data: list[dict]) -> dict[str, list[dict]]:
+    """Given several genres, returns the games with each genre, reading
+    the scraped data only once. Only the fields emailed are kept of each
+    game, so that a streamed listing is not held in full."""
+
+    genre_games = {genre: [] for genre in genres}
+
+    for website in scraped_data:
+        for game in website["listings"]:
+            game_genres = [game_genre.lower() for game_genre in game["genres"]]
+            emailed = None
+            for genre, games in genre_games.items():
+                if any(genre in game_genre for game_genre in game_genres):
+                    if emailed is None:
+                        emailed = {field: game.get(field) for field in EMAILED_FIELDS}
+                    games.append(emailed)
+
+    return genre_games
+
+
 def send_genre_emails(scraped_data: list[dict]):
     """Sends emails to the genre subscribers."""
 
@@ -32,31 +54,32 @@ def send_genre_emails(scraped_data: list[dict]):
                  aws_access_key_id=ENV["MY_AWS_ACCESS_KEY"],
                  aws_secret_access_key=ENV["MY_AWS_SECRET_ACCESS_KEY"])
 
-    subscribers_per_genre = get_subscribers_per_genre()
+    subscribers_per_genre = [item for item in get_subscribers_per_genre()
+                             if len(item["subscribers"]) > 0]
+    games_per_genre = group_games_by_genre([item["genre"] for item in subscribers_per_genre],
+                                           scraped_data)
 
     for item in subscribers_per_genre:
 
-        if len(item["subscribers"]) > 0:
-
-            genre = item["genre"]
-            genre_games = get_games_by_genre(genre, scraped_data)
-            if len(genre_games) > 0:
-                to_send = create_html(genre_games, genre)
-
-                subscriber_emails = item["subscribers"]
-
-                ses.send_email(
-                    Source=ENV["SENDER_EMAIL_ADDRESS"],
-                    Destination={"ToAddresses": [],
-                                 "BccAddresses": subscriber_emails,
-                                 "CcAddresses": []},
-                    Message={
-                        "Subject": {
-                            "Data": f"New {format_genre_text(genre)} games for you!"
-                        },
-                        "Body": {
-                            "Html": {
-                                "Data": to_send
-                            }
+        genre = item["genre"]
+        genre_games = games_per_genre[genre]
+        if len(genre_games) > 0:
+            to_send = create_html(genre_games, genre)
+
+            subscriber_emails = item["subscribers"]
+
+            ses.send_email(
+                Source=ENV["SENDER_EMAIL_ADDRESS"],
+                Destination={"ToAddresses": [],
+                             "BccAddresses": subscriber_emails,
+                             "CcAddresses": []},
+                Message={
+                    "Subject": {
+                        "Data": f"New {format_genre_text(genre)} games for you!"
+                    },
+                    "Body": {
+                        "Html": {
+                            "Data": to_send
                         }
-                    })
+                    }
+                })
@@ -1,27 +1,24 @@
 """This script is for getting data from the RDS, to help with uploading data in other places."""
 
-from os import environ as ENV
-from datetime import datetime
+from collections.abc import Iterable
+from itertools import islice
 
-from psycopg2 import connect
 from psycopg2.extensions import connection
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 
+from db_pool import PooledConnection, execute_prepared, get_pool
+
 load_dotenv()
 
+LOOKUP_CHUNK_SIZE = 10_000
+
 
-def get_connection() -> connection:
-    """Returns a live DB connection."""
+def get_connection() -> PooledConnection:
+    """Returns a live DB connection from the process-wide pool. Closing it
+    returns it to the pool."""
 
-    return connect(
-        host=ENV["DB_HOST"],
-        user=ENV["DB_USER"],
-        dbname=ENV["DB_NAME"],
-        port=ENV["DB_PORT"],
-        password=ENV["DB_PASSWORD"],
-        cursor_factory=RealDictCursor
-    )
+    return get_pool().getconn(cursor_factory=RealDictCursor)
 
 
 def get_ids(table_name: str, conn: connection, column_prefix: str = None) -> dict:
@@ -41,14 +38,19 @@ def get_ids(table_name: str, conn: connection, column_prefix: str = None) -> dic
     return name_to_id
 
 
-def get_listings_for_the_day(day: datetime, conn: connection) -> list[str]:
-    """Returns a list of listings already scraped that day."""
+def get_loaded_listings(urls: Iterable[str], conn: connection,
+                        chunk_size: int = LOOKUP_CHUNK_SIZE) -> set[str]:
+    """Returns which of the listing URLs are already in the database, from
+    any day. Only the URLs asked about are sent and returned, a chunk at a
+    time, each looked up on the listing URL's unique index."""
 
+    loaded = set()
+    urls = iter(urls)
     with conn.cursor() as curs:
-        curs.execute("""SELECT listing_url
-                     FROM game_listing
-                     JOIN game USING (game_id) 
-                     WHERE release_date = %s;""", (day,))
-        rows = curs.fetchall()
-        return [row["listing_url"]
-                for row in rows]
+        while chunk := list(islice(urls, chunk_size)):
+            execute_prepared(curs, "get_loaded_listings",
+                             """SELECT listing_url
+                             FROM game_listing
+                             WHERE listing_url = ANY(%s);""", (chunk,))
+            loaded.update(row["listing_url"] for row in curs.fetchall())
+    return loaded
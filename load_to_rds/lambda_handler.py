@@ -1,27 +1,21 @@
 """The script that gets called from the lambda."""
 
-from json import loads
-
+from read_scraped_data import read_output
 from upload_to_db import load_to_db
 from email_subscribers import send_genre_emails
+from watermark import commit_watermark
 
 # pylint: disable=W0613
 
 
 def lambda_handler(event, session):
     """The lambda handler.
-        Event should be a list of inputs from other lambdas."""
-
-    scraped_data = []
-
-    for output in event:
-
-        data = output["body"]["data"]
-
-        if not isinstance(data, dict):
-            data = loads(data)
+        Event should be a list of inputs from other lambdas.
+        Each scraper's watermark is committed once its listings are loaded."""
 
-        scraped_data.append(data)
+    scraped_data = [read_output(output) for output in event]
 
     load_to_db(scraped_data)
+    for dataset in scraped_data:
+        commit_watermark(dataset["platform"])
     send_genre_emails(scraped_data)
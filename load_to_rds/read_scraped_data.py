@@ -0,0 +1,56 @@
+"""This script is for reading the data output by the scrapers, either from
+their responses or, when they stream it, line by line from their files."""
+
+from collections.abc import Iterator
+from json import loads
+
+
+class ListingStream:
+    """The listings a scraper streamed to a newline-delimited JSON file,
+    locally or on S3. Iterating over it reads the file a line at a time,
+    so only one listing is ever held in memory; it can be iterated over
+    more than once. Listings at excluded URLs are skipped."""
+
+    def __init__(self, location: str, exclude_urls: set = None, s3_client=None):
+        self.location = location
+        self.exclude_urls = exclude_urls or set()
+        self.s3 = s3_client
+
+    def excluding(self, urls: set) -> "ListingStream":
+        """Returns the same stream, skipping the listings at more URLs."""
+        return ListingStream(self.location, self.exclude_urls | set(urls), self.s3)
+
+    def iter_lines(self) -> Iterator[bytes]:
+        """Yields each line of the file."""
+        if self.location.startswith("s3://"):
+            if self.s3 is None:
+                from boto3 import client  # pylint: disable=C0415
+                self.s3 = client("s3")
+            bucket, key = self.location.removeprefix("s3://").split("/", 1)
+            yield from self.s3.get_object(Bucket=bucket, Key=key)["Body"].iter_lines()
+        else:
+            with open(self.location, "rb") as file:
+                yield from file
+
+    def __iter__(self) -> Iterator[dict]:
+        for line in self.iter_lines():
+            if line.strip():
+                listing = loads(line)
+                if listing["url"] not in self.exclude_urls:
+                    yield listing
+
+
+def read_output(output: dict) -> dict:
+    """Returns a platform's data from a scraper's response. Streamed
+    listings are not read until they are iterated over."""
+
+    data = output["body"]["data"]
+
+    if not isinstance(data, dict):
+        data = loads(data)
+
+    if "stream" in data:
+        return {"platform": data["platform"],
+                "listings": ListingStream(data["stream"])}
+
+    return data
@@ -1,14 +1,27 @@
 # pylint: skip-file
 
+from csv import reader
 from datetime import datetime
+from io import BytesIO, StringIO
+from json import dumps
+from unittest import mock
 
 import pytest
 
-from upload_to_db import remove_duplicates
+import bulk_load
+from bulk_load import (COPY_LISTINGS, COPY_NULL, GAME_CONFLICT_UPDATE, INSERT_GAMES,
+                       CsvRowReader, bulk_upload_listings, format_array, iter_staged_rows)
+import dimension_cache
+from dimension_cache import DimensionCache
+from get_data_from_database import get_loaded_listings
+from upload_to_db import iter_listing_urls, load_to_db, remove_duplicates, upload_game
 from transform_game_data import has_nsfw_tags, transform_to_tuples
 from create_html_message import format_genre_text, put_in_tag
-from email_subscribers import get_games_by_genre
+from email_subscribers import EMAILED_FIELDS, get_games_by_genre, group_games_by_genre
+from read_scraped_data import ListingStream, read_output
 from get_subscriber_emails import create_SNS_topic_object
+import lambda_handler
+import watermark
 
 
 def test_remove_duplicates():
@@ -107,3 +120,337 @@ def test_get_games_by_genre():
     }]
 
     assert len(get_games_by_genre(genre, scraped_data)) == 2
+
+
+def test_group_games_by_genre():
+
+    scraped_data = [{"listings": [{"genres": ["Action", "Indie"]}]},
+                    {"listings": [{"genres": ["action"]}, {"genres": ["Adventure"]}]}]
+
+    grouped = group_games_by_genre(["action", "adventure", "rpg"], scraped_data)
+
+    assert [[game["genres"] for game in games] for games in grouped.values()] == \
+        [[["Action", "Indie"], ["action"]], [["Adventure"]], []]
+
+
+def test_group_games_by_genre_keeps_only_emailed_fields():
+
+    game = {"title": "Game", "url": "url", "img_url": "img", "current_price": 100,
+            "genres": ["Action", "RPG"], "description": "A game",
+            "tags": ["Action"] * 100, "operating_systems": ["Windows"]}
+
+    grouped = group_games_by_genre(["action", "rpg"], [{"listings": [game]}])
+
+    assert grouped["action"] == [{field: game[field] for field in EMAILED_FIELDS}]
+    assert grouped["action"][0] is grouped["rpg"][0]
+
+
+def write_stream(path, listings):
+    path.write_text("".join(dumps(listing) + "\n" for listing in listings), encoding="utf_8")
+    return str(path)
+
+
+def test_read_output_inline():
+
+    data = {"platform": "gog", "listings": [{"url": "url_1"}]}
+
+    assert read_output({"body": {"data": dumps(data)}}) == data
+    assert read_output({"body": {"data": data}}) == data
+
+
+def test_read_output_stream(tmp_path):
+
+    location = write_stream(tmp_path / "gog.ndjson", [{"url": "url_1"}, {"url": "url_2"}])
+    output = {"body": {"data": dumps({"platform": "gog", "stream": location, "count": 2})}}
+
+    data = read_output(output)
+
+    assert data["platform"] == "gog"
+    assert isinstance(data["listings"], ListingStream)
+    assert list(data["listings"]) == [{"url": "url_1"}, {"url": "url_2"}]
+    assert list(data["listings"]) == [{"url": "url_1"}, {"url": "url_2"}]
+
+
+def test_listing_stream_reads_from_s3():
+
+    s3 = mock.MagicMock()
+    s3.get_object.return_value = {"Body": mock.MagicMock(iter_lines=lambda: iter(
+        [b'{"url": "url_1"}', b'{"url": "url_2"}']))}
+
+    stream = ListingStream("s3://bucket/streams/steam/1.ndjson", s3_client=s3)
+
+    assert list(stream) == [{"url": "url_1"}, {"url": "url_2"}]
+    s3.get_object.assert_called_once_with(Bucket="bucket", Key="streams/steam/1.ndjson")
+
+
+def test_remove_duplicates_from_streams(tmp_path):
+
+    location = write_stream(tmp_path / "steam.ndjson",
+                            [{"url": "url_1"}, {"url": "url_2"}, {"url": "url_3"}])
+    scraped_games = [{"platform": "steam", "listings": ListingStream(location)}]
+
+    scraped_games = remove_duplicates(scraped_games, ["url_2"])
+
+    assert list(scraped_games[0]["listings"]) == [{"url": "url_1"}, {"url": "url_3"}]
+
+
+def test_get_loaded_listings_asks_only_about_the_batch():
+    """Tests that loaded listings are found from any day, by looking up the
+    batch's URLs a chunk at a time rather than fetching every loaded one."""
+    conn = mock.MagicMock()
+    curs = conn.cursor.return_value.__enter__.return_value
+    curs.fetchall.side_effect = [[{"listing_url": "url_1"}], [], [{"listing_url": "url_4"}]]
+
+    loaded = get_loaded_listings((f"url_{i}" for i in range(5)), conn, chunk_size=2)
+
+    assert loaded == {"url_1", "url_4"}
+    assert [call.args[1] for call in curs.execute.call_args_list] == [
+        (["url_0", "url_1"],), (["url_2", "url_3"],), (["url_4"],)]
+    assert "release_date" not in curs.execute.call_args[0][0]
+
+
+def test_iter_listing_urls(tmp_path):
+
+    location = write_stream(tmp_path / "gog.ndjson", [{"url": "url_2"}])
+    scraped_games = [{"platform": "steam", "listings": [{"url": "url_1"}]},
+                     {"platform": "gog", "listings": ListingStream(location)}]
+
+    assert list(iter_listing_urls(scraped_games)) == ["url_1", "url_2"]
+
+
+def test_listing_stream_reads_one_line_at_a_time(tmp_path):
+
+    location = write_stream(tmp_path / "epic.ndjson", [{"url": f"url_{i}"} for i in range(3)])
+    stream = iter(ListingStream(location))
+
+    assert next(stream) == {"url": "url_0"}
+    assert next(stream) == {"url": "url_1"}
+
+
+BULK_GAME = {"title": "Game, the \"Sequel\"", "description": "A game.\nOn two lines.",
+             "release_date": "18/10/2026", "tags": ["Nudity"], "img_url": "example.com/1.jpg",
+             "current_price": 999, "url": "example.com/game",
+             "genres": ["Action", 'Say "hi"', "Back\\slash"], "operating_systems": ["Windows"]}
+
+
+@pytest.mark.parametrize("values, literal", [
+    ([], "{}"), (["Action", "RPG"], '{"Action","RPG"}'),
+    (['Say "hi"', "a\\b", "a,b"], '{"Say \\"hi\\"","a\\\\b","a,b"}')
+])
+def test_format_array(values, literal):
+    assert format_array(values) == literal
+
+
+def test_staged_rows_are_valid_csv():
+    """Tests that a listing survives being written as CSV for COPY."""
+    rows = list(iter_staged_rows([{"platform": "Steam", "listings": [BULK_GAME]}]))
+    copied = list(reader(StringIO(CsvRowReader(rows).read())))
+    assert copied == [["Steam", 'Game, the "Sequel"', "A game.\nOn two lines.",
+                       "2026-10-18T00:00:00", "True", "example.com/1.jpg", "999",
+                       "example.com/game", '{"Action","Say \\"hi\\"","Back\\\\slash"}',
+                       '{"Windows"}']]
+
+
+def test_load_methods_store_empty_fields_alike():
+    """Tests that an empty description and a missing image are copied as
+    the same values the row-by-row load inserts."""
+    game = dict(BULK_GAME, description="", img_url=None)
+    conn = mock.MagicMock()
+    curs = conn.cursor.return_value.__enter__.return_value
+    upload_game(game, conn)
+    inserted = curs.execute.call_args[0][1]
+
+    rows = list(iter_staged_rows([{"platform": "Steam", "listings": [game]}]))
+    copied = next(reader(StringIO(CsvRowReader(rows).read())))
+    copied = [None if value == COPY_NULL else value for value in copied]
+    assert f"NULL '{COPY_NULL}'" in COPY_LISTINGS
+    assert (copied[2], copied[5]) == (inserted[1], inserted[4]) == ("", None)
+
+
+def test_csv_rows_are_read_as_copy_asks_for_them():
+    """Tests that rows are only formatted a chunk at a time."""
+    rows = iter([("a", i) for i in range(100)])
+    csv_reader = CsvRowReader(rows)
+    assert csv_reader.read(20) == "a,0\na,1\na,2\na,3\na,4\n"
+    assert csv_reader.rows_read == 5
+    assert len(csv_reader.read()) == len("a,5\n") * 5 + len("a,10\n") * 90
+    assert csv_reader.read(20) == ""
+
+
+def make_bulk_connection(inserted: int = 2):
+    """Returns a mocked connection, recording the statements executed and
+    the CSV copied."""
+    conn = mock.MagicMock()
+    curs = conn.cursor.return_value.__enter__.return_value
+    curs.copied = []
+    curs.copy_expert.side_effect = lambda sql, file, size: curs.copied.append(file.read())
+    curs.fetchall.return_value = [{"inserted": True} for _ in range(inserted)]
+    return conn, curs
+
+
+def test_bulk_upload_is_one_transaction():
+    """Tests that every platform's listings are copied at once and loaded
+    with one statement per table, then committed once."""
+    conn, curs = make_bulk_connection()
+    data = [{"platform": "Steam", "listings": [BULK_GAME]},
+            {"platform": "gog", "listings": [dict(BULK_GAME, url="example.com/other")]}]
+
+    assert bulk_upload_listings(data, conn) == 2
+    assert curs.copy_expert.call_count == 1
+    assert len(list(reader(StringIO(curs.copied[0])))) == 2
+    assert curs.execute.call_count == 8
+    assert mock.call(INSERT_GAMES) in curs.execute.call_args_list
+    conn.commit.assert_called_once()
+    conn.rollback.assert_not_called()
+
+
+@pytest.mark.parametrize("statement", [name for name in dir(bulk_load)
+                                       if name.startswith("INSERT_")])
+def test_bulk_inserts_are_upserts(statement):
+    """Tests that reloading a batch cannot fail on a row already loaded."""
+    assert "ON CONFLICT" in getattr(bulk_load, statement)
+
+
+def test_games_are_matched_across_platforms():
+    conn = mock.MagicMock()
+    curs = conn.cursor.return_value.__enter__.return_value
+    curs.fetchone.return_value = {"game_id": 7}
+    assert upload_game(BULK_GAME, conn) == {"game_id": 7}
+    assert "ON CONFLICT ON CONSTRAINT game_identity" in curs.execute.call_args[0][0]
+
+
+def test_load_methods_upsert_games_alike():
+    """Tests that a game already loaded is updated the same way whichever
+    method loads it again."""
+    conn = mock.MagicMock()
+    curs = conn.cursor.return_value.__enter__.return_value
+    upload_game(BULK_GAME, conn)
+    assert GAME_CONFLICT_UPDATE in curs.execute.call_args[0][0]
+    assert GAME_CONFLICT_UPDATE in INSERT_GAMES
+    assert "DO UPDATE" in GAME_CONFLICT_UPDATE
+
+
+def test_bulk_upload_counts_only_new_games():
+    conn, curs = make_bulk_connection()
+    curs.fetchall.return_value = [{"inserted": True}, {"inserted": False}]
+    assert bulk_upload_listings([{"platform": "Steam", "listings": [BULK_GAME]}], conn) == 1
+
+
+def test_bulk_upload_rolls_back_on_failure():
+    conn, curs = make_bulk_connection()
+    curs.execute.side_effect = [None, None, RuntimeError("deadlock")]
+    with pytest.raises(RuntimeError):
+        bulk_upload_listings([{"platform": "Steam", "listings": [BULK_GAME]}], conn)
+    conn.commit.assert_not_called()
+    conn.rollback.assert_called_once()
+
+
+def test_load_to_db_rejects_unknown_methods():
+    with pytest.raises(ValueError, match="Unknown load method"):
+        load_to_db([], method="upsert")
+
+
+@pytest.fixture
+def lookup_tables(monkeypatch):
+    """Serves the lookup tables from dictionaries, counting the reads."""
+    tables = {"genre": {"action": 1, "indie": 2},
+              "platform": {"steam": 1},
+              "operating_system": {"windows": 1}}
+    reads = []
+
+    def get_ids(table_name, conn, column_prefix=None):
+        reads.append(table_name)
+        return dict(tables[table_name])
+
+    monkeypatch.setattr(dimension_cache, "get_ids", get_ids)
+    return tables, reads
+
+
+def test_dimension_cache_stays_warm(lookup_tables):
+    _, reads = lookup_tables
+    cache = DimensionCache()
+
+    first = cache.get_maps(mock.MagicMock())
+    second = cache.get_maps(mock.MagicMock())
+
+    assert first == second
+    assert second["os"] == {"windows": 1}
+    assert len(reads) == 3
+    assert cache.as_dict()["round_trips_saved"] == 3
+
+
+def test_dimension_cache_refreshes_on_a_missing_platform(lookup_tables):
+    tables, reads = lookup_tables
+    cache = DimensionCache()
+    cache.get_maps(mock.MagicMock(), ["Steam"])
+    tables["platform"]["gog"] = 2
+
+    assert cache.get_maps(mock.MagicMock(), ["Steam", "GOG"])["platform"]["gog"] == 2
+    assert reads.count("platform") == 2
+
+
+def test_new_genres_are_added_once_per_batch(lookup_tables):
+    """Tests that a batch's new genres, however many games share them, are
+    added with one insert, and that any another load added first are
+    selected instead."""
+    conn = mock.MagicMock()
+    curs = conn.cursor.return_value.__enter__.return_value
+    curs.fetchall.side_effect = [[{"genre_id": 3, "genre_name": "Roguelike"}],
+                                 [{"genre_id": 4, "genre_name": "puzzle"}]]
+    cache = DimensionCache()
+
+    genre_to_id = cache.add_genres(["Action", "Roguelike", "Puzzle", "roguelike", "Puzzle"], conn)
+
+    assert genre_to_id == {"action": 1, "indie": 2, "roguelike": 3, "puzzle": 4}
+    (insert, (inserted, )), (select, (selected, )) = [
+        call.args for call in curs.execute.call_args_list]
+    assert "ON CONFLICT (genre_name) DO NOTHING" in insert
+    assert inserted == ["Roguelike", "Puzzle"]
+    assert selected == ["puzzle"]
+    conn.commit.assert_called_once()
+    assert cache.as_dict()["genres_added"] == 1
+
+
+def test_known_genres_are_not_inserted(lookup_tables):
+    conn = mock.MagicMock()
+    cache = DimensionCache()
+    cache.add_genres(["Action", "INDIE"], conn)
+    conn.cursor.assert_not_called()
+
+
+def test_load_to_db_returns_its_connection_on_failure():
+    conn = mock.MagicMock()
+    with mock.patch("upload_to_db.get_connection", return_value=conn), \
+            mock.patch("upload_to_db.get_loaded_listings", side_effect=RuntimeError()):
+        with pytest.raises(RuntimeError):
+            load_to_db([], method="bulk")
+    conn.close.assert_called_once()
+
+
+@pytest.fixture
+def watermark_store(monkeypatch):
+    """Keeps the scrapers' watermarks in memory for a test, with one
+    staged for Steam."""
+    monkeypatch.setenv("WATERMARK_BACKEND", "memory")
+    monkeypatch.setattr(watermark, "_store", None)
+    mark = watermark.Watermark("steam")
+    mark.record_game({"url": "url_1", "release_date": "18/10/2026"})
+    watermark.stage_watermark(mark)
+    return watermark.get_watermark_store()
+
+
+def test_watermark_is_committed_once_loaded(watermark_store):
+    data = {"platform": "steam", "listings": []}
+    with mock.patch("lambda_handler.load_to_db") as load, \
+            mock.patch("lambda_handler.send_genre_emails"):
+        lambda_handler.lambda_handler([{"body": {"data": dumps(data)}}], None)
+    load.assert_called_once()
+    assert "url_1" in watermark_store.get("steam")["seen"]
+
+
+def test_watermark_is_not_committed_if_loading_fails(watermark_store):
+    data = {"platform": "steam", "listings": []}
+    with mock.patch("lambda_handler.load_to_db", side_effect=RuntimeError()):
+        with pytest.raises(RuntimeError):
+            lambda_handler.lambda_handler([{"body": {"data": dumps(data)}}], None)
+    assert watermark_store.get("steam") is None
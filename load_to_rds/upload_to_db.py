@@ -1,51 +1,64 @@
 """This script is for uploading the listings to the database."""
 
-from datetime import datetime
+from os import environ as ENV
+from collections.abc import Iterator
 
 from psycopg2.extensions import connection
 from psycopg2.extras import execute_values
 
-from get_data_from_database import get_connection, get_ids, get_listings_for_the_day
+from bulk_load import GAME_CONFLICT_UPDATE, bulk_upload_listings
+from db_pool import execute_prepared, get_pool_stats
+from dimension_cache import get_dimension_cache, get_dimension_cache_stats
+from get_data_from_database import get_connection, get_loaded_listings
+from read_scraped_data import ListingStream
 from transform_game_data import transform_to_tuples
 
+LOAD_METHODS = ["bulk", "row"]
 
-def get_today() -> datetime:
-    """Gets the beginning of today as a datetime."""
 
-    now = datetime.now()
-    return datetime(now.year, now.month, now.day)
+def iter_listing_urls(scraped_data: list[dict]) -> Iterator[str]:
+    """Yields the URL of every listing, of every platform."""
 
+    for listings in scraped_data:
+        for game in listings["listings"]:
+            yield game["url"]
 
-def remove_duplicates(scraped_data: list[dict], already_scraped: list[str]) -> list[dict]:
-    """Removes any game that is already scraped."""
 
-    for listings in scraped_data:
-        listings["listings"] = [game for game in listings["listings"]
-                                if game["url"] not in already_scraped]
+def iter_genres(scraped_data: list[dict]) -> Iterator[str]:
+    """Yields every genre of every listing, of every platform."""
 
-    return scraped_data
+    for listings in scraped_data:
+        for game in listings["listings"]:
+            yield from game["genres"]
 
 
-def update_genres(new_genres: list[str], conn: connection) -> dict:
-    """Adds any new genres to the genre table, returning their id map."""
-    query = "INSERT INTO genre (genre_name) VALUES %s RETURNING genre_id, genre_name;"
+def remove_duplicates(scraped_data: list[dict], already_scraped: set[str]) -> list[dict]:
+    """Removes any game that is already scraped. Streamed listings are
+    skipped as they are read instead."""
 
-    with conn.cursor() as curs:
-        execute_values(curs, query, new_genres)
-        rows = curs.fetchall()
+    already_scraped = set(already_scraped)
+    for listings in scraped_data:
+        if isinstance(listings["listings"], ListingStream):
+            listings["listings"] = listings["listings"].excluding(already_scraped)
+        else:
+            listings["listings"] = [game for game in listings["listings"]
+                                    if game["url"] not in already_scraped]
 
-    return {row["genre_name"]: row["genre_id"]
-            for row in rows}
+    return scraped_data
 
 
 def upload_game(game: dict, conn: connection) -> int:
-    """Uploads a single game to the game table, returning its id."""
+    """Uploads a single game to the game table, returning its id. A game
+    already in the table, from this platform or another, is matched by its
+    normalised title and release date, and its id returned instead; any
+    details it is missing are filled in."""
 
     with conn.cursor() as curs:
-        curs.execute("""INSERT INTO game
+        execute_prepared(curs, "upload_game", """INSERT INTO game
                         (game_title, game_description, release_date, is_NSFW, image_URL)
-                        VALUES (%s,%s,%s,%s,%s) RETURNING game_id;""",
-                     transform_to_tuples(game))
+                        VALUES (%s,%s,%s,%s,%s)""" + GAME_CONFLICT_UPDATE + """
+                        RETURNING game_id;""",
+                         transform_to_tuples(game))
         rows = curs.fetchone()
 
     return rows
@@ -53,34 +66,30 @@ def upload_game(game: dict, conn: connection) -> int:
 
 def upload_listing(game: dict, game_id: int, platform: str,
                    platform_to_id: dict, conn: connection) -> None:
-    """Uploads the listing details to the listing table."""
+    """Uploads the listing details to the listing table, unless the
+    listing is already there."""
 
     platform_id = platform_to_id[platform.lower()]
 
     with conn.cursor() as curs:
-        curs.execute("""INSERT INTO game_listing
+        execute_prepared(curs, "upload_listing", """INSERT INTO game_listing
                         (game_id, platform_id, release_price, listing_url)
-                        VALUES (%s,%s,%s,%s);""",
-                     (game_id, platform_id, game["current_price"], game["url"]))
+                        VALUES (%s,%s,%s,%s)
+                        ON CONFLICT (listing_url) DO NOTHING;""",
+                         (game_id, platform_id, game["current_price"], game["url"]))
 
 
 def upload_genre(game_id: int, genres: list[str],
                  genre_to_id: dict, conn: connection) -> None:
-    """Updates the genre assignment table in the database."""
-
-    new_genres = [(genre, ) for genre in genres
-                  if genre.lower() not in genre_to_id.keys()]
-    if len(new_genres) > 0:
-
-        new_genre_map = update_genres(new_genres, conn)
-        for key, value in new_genre_map.items():
-            genre_to_id[key.lower()] = value
+    """Updates the genre assignment table in the database. Every genre
+    must already be in the genre map."""
 
     upload_tuples = [(game_id, genre_to_id[genre.lower()])
                      for genre in genres]
     query = """INSERT INTO game_genre_assignment
                 (game_id, genre_id)
-                VALUES %s;"""
+                VALUES %s
+                ON CONFLICT (game_id, genre_id) DO NOTHING;"""
 
     with conn.cursor() as curs:
         execute_values(curs, query, upload_tuples)
@@ -94,7 +103,8 @@ def upload_os(game_id: int, oss: list[str],
                      for os in oss]
     query = """INSERT INTO game_os_assignment
                 (game_id, os_id)
-                VALUES %s;"""
+                VALUES %s
+                ON CONFLICT (game_id, os_id) DO NOTHING;"""
 
     with conn.cursor() as curs:
         execute_values(curs, query, upload_tuples)
@@ -119,29 +129,39 @@ def upload_all_listings_to_database(json_data: dict, maps: list[dict], conn: con
     """Upload all listings to the database."""
 
     platform = json_data["platform"]
+    inserted = 0
     for listing in json_data["listings"]:
         upload_entire_listing_to_database(listing, platform, maps, conn)
+        inserted += 1
 
-    print(f"""Inserted {len(json_data["listings"])
-                      } listings from {platform}.""")
+    print(f"Inserted {inserted} listings from {platform}.")
 
 
-def load_to_db(all_scraped_data: list):
+def load_to_db(all_scraped_data: list, method: str = None):
     """The main function
-        Uploads all of the gathered data to the database."""
-
-    conn = get_connection()
-    maps = {
-        "genre": get_ids("genre", conn),
-        "platform": get_ids("platform", conn),
-        "os": get_ids("operating_system", conn,  "os")
-    }
+        Uploads all of the gathered data to the database, in one bulk
+        transaction, or a listing at a time with `LOAD_METHOD=row`."""
 
-    already_scraped = get_listings_for_the_day(get_today(), conn)
+    method = method or ENV.get("LOAD_METHOD", "bulk")
+    if method not in LOAD_METHODS:
+        raise ValueError(f"Unknown load method: {method}.")
 
-    all_scraped_data = remove_duplicates(all_scraped_data, already_scraped)
-
-    for dataset in all_scraped_data:
-        upload_all_listings_to_database(dataset, maps, conn)
-
-    conn.close()
+    conn = get_connection()
+    try:
+        already_scraped = get_loaded_listings(iter_listing_urls(all_scraped_data), conn)
+
+        all_scraped_data = remove_duplicates(all_scraped_data, already_scraped)
+
+        if method == "bulk":
+            bulk_upload_listings(all_scraped_data, conn)
+        else:
+            cache = get_dimension_cache()
+            cache.add_genres(iter_genres(all_scraped_data), conn)
+            maps = cache.get_maps(conn, [dataset["platform"] for dataset in all_scraped_data])
+            for dataset in all_scraped_data:
+                upload_all_listings_to_database(dataset, maps, conn)
+            print(f"Dimension cache: {get_dimension_cache_stats()}")
+    finally:
+        conn.close()
+
+    print(f"Connection pool: {get_pool_stats()}")
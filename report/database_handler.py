@@ -1,25 +1,20 @@
 """The main script to handle database connections, and querying for the report 
-generation and emailing."""
-
-from os import environ as ENV
+generation and emailing. Every query shares one pooled connection, rather
+than each opening its own."""
 
 from dotenv import load_dotenv
-from psycopg2 import connect
 from psycopg2.extras import RealDictCursor
 from psycopg2.extensions import cursor, connection
 
+from db_pool import PooledConnection, get_pool
+
 load_dotenv()
 
 
-def get_connection() -> connection:
-    """Returns an open connection to the database."""
-    return connect(
-        database=ENV['DB_NAME'],
-        host=ENV['DB_HOST'],
-        user=ENV['DB_USER'],
-        password=ENV['DB_PASSWORD'],
-        port=ENV['DB_PORT']
-    )
+def get_connection() -> PooledConnection:
+    """Returns an open connection to the database, from the process-wide
+    pool. Leaving a `with` block on it returns it to the pool."""
+    return get_pool().getconn()
 
 
 def get_cursor(conn: connection) -> cursor:
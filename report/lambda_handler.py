@@ -1,5 +1,6 @@
 """Script run when the AWS Lambda is triggered."""
 
+from db_pool import get_pool_stats
 from email_report import generate_and_send_report
 
 # pylint: disable=W0613
@@ -8,4 +9,5 @@ from email_report import generate_and_send_report
 def lambda_handler(event, context):
     """Function run when AWS Lambda is triggered."""
     generate_and_send_report()
+    print(f"Connection pool: {get_pool_stats()}")
     return {"statusCode": 200}
@@ -0,0 +1,44 @@
+-- Adds the cross-platform game identity to a database created before it,
+-- merging the games already duplicated across platforms into one row.
+-- Run once with `bash migrate.sh migrate_game_identity.sql`.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION normalise_title(title TEXT) RETURNS TEXT
+    LANGUAGE SQL IMMUTABLE STRICT PARALLEL SAFE
+    AS $$ SELECT btrim(lower(regexp_replace(title, '[^[:alnum:]]+', ' ', 'g'))) $$;
+
+ALTER TABLE game
+    ADD COLUMN normalised_title TEXT GENERATED ALWAYS AS (normalise_title(game_title)) STORED;
+
+-- Every game is merged into the first game loaded with its identity.
+CREATE TEMPORARY TABLE merged_game ON COMMIT DROP AS
+    SELECT game_id, min(game_id) OVER (PARTITION BY normalised_title, release_date) AS kept_game_id
+    FROM game;
+DELETE FROM merged_game WHERE game_id = kept_game_id;
+
+UPDATE game_listing SET game_id = merged_game.kept_game_id
+FROM merged_game WHERE game_listing.game_id = merged_game.game_id;
+
+UPDATE game_genre_assignment SET game_id = merged_game.kept_game_id
+FROM merged_game WHERE game_genre_assignment.game_id = merged_game.game_id;
+
+UPDATE game_os_assignment SET game_id = merged_game.kept_game_id
+FROM merged_game WHERE game_os_assignment.game_id = merged_game.game_id;
+
+DELETE FROM game USING merged_game WHERE game.game_id = merged_game.game_id;
+
+-- The merged games' genres and operating systems are now repeated.
+DELETE FROM game_genre_assignment AS later USING game_genre_assignment AS earlier
+WHERE later.game_id = earlier.game_id AND later.genre_id = earlier.genre_id
+  AND later.assignment_id > earlier.assignment_id;
+
+DELETE FROM game_os_assignment AS later USING game_os_assignment AS earlier
+WHERE later.game_id = earlier.game_id AND later.os_id = earlier.os_id
+  AND later.assignment_id > earlier.assignment_id;
+
+ALTER TABLE game ADD CONSTRAINT game_identity UNIQUE (normalised_title, release_date);
+ALTER TABLE game_genre_assignment ADD UNIQUE (game_id, genre_id);
+ALTER TABLE game_os_assignment ADD UNIQUE (game_id, os_id);
+
+COMMIT;
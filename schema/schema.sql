@@ -1,6 +1,14 @@
 
 DROP TABLE IF EXISTS game_listing, game_os_assignment, game_genre_assignment, game ;
 DROP TABLE IF EXISTS operating_system, platform, genre, subscriber ;
+DROP FUNCTION IF EXISTS normalise_title ;
+
+
+-- A game's title as it is matched across platforms: lower case, with every
+-- run of punctuation, symbols and spaces (including ™ and ®) made one space.
+CREATE FUNCTION normalise_title(title TEXT) RETURNS TEXT
+    LANGUAGE SQL IMMUTABLE STRICT PARALLEL SAFE
+    AS $$ SELECT btrim(lower(regexp_replace(title, '[^[:alnum:]]+', ' ', 'g'))) $$;
 
 
 CREATE TABLE subscriber (
@@ -35,7 +43,9 @@ CREATE TABLE game (
     release_date TIMESTAMPTZ NOT NULL, 
     is_NSFW BOOLEAN ,
     image_URL TEXT , 
-PRIMARY KEY (game_id)
+    normalised_title TEXT GENERATED ALWAYS AS (normalise_title(game_title)) STORED ,
+PRIMARY KEY (game_id),
+CONSTRAINT game_identity UNIQUE (normalised_title, release_date)
 );
 
 CREATE TABLE game_genre_assignment (
@@ -44,7 +54,8 @@ CREATE TABLE game_genre_assignment (
     genre_id SMALLINT NOT NULL ,
 PRIMARY KEY (assignment_id),
 FOREIGN KEY (game_id) REFERENCES game(game_id),
-FOREIGN KEY (genre_id) REFERENCES genre(genre_id)
+FOREIGN KEY (genre_id) REFERENCES genre(genre_id),
+UNIQUE (game_id, genre_id)
 );
 
 CREATE TABLE game_os_assignment (
@@ -53,7 +64,8 @@ CREATE TABLE game_os_assignment (
     os_id SMALLINT NOT NULL ,
 PRIMARY KEY (assignment_id),
 FOREIGN KEY (game_id) REFERENCES game(game_id),
-FOREIGN KEY (os_id) REFERENCES operating_system(os_id)
+FOREIGN KEY (os_id) REFERENCES operating_system(os_id),
+UNIQUE (game_id, os_id)
 );
 
 CREATE TABLE game_listing (
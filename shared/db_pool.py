@@ -0,0 +1,248 @@
+"""Shares a pool of database connections between everything in a process
+that queries the database.
+
+A connection handed out by the pool looks like any psycopg2 connection, but
+closing it, or leaving a `with` block on it, returns it to the pool instead
+of closing it: the `with` block commits, or rolls back if it raised, first.
+The pool lives as long as the process, so a warm Lambda reuses the last
+invocation's connection rather than opening a new one.
+
+A connection which has been idle for `DB_HEALTH_CHECK_AFTER` seconds is
+checked with `SELECT 1` before it is handed out again, and replaced if it
+was dropped while idle. At most `DB_POOL_SIZE` connections are open at
+once; past that, callers wait up to `DB_POOL_TIMEOUT` seconds for one to be
+returned.
+
+Statements run often are prepared on each connection once, with
+`execute_prepared`. RDS Proxy pins a client to one database connection as
+soon as it prepares a statement, so set `DB_PREPARE=false` when `DB_HOST`
+is a proxy endpoint; the statements are then run as they are. Connections
+hold no other session state, so they are otherwise safe to multiplex."""
+
+from os import environ as ENV
+from collections.abc import Callable
+from threading import Condition, Lock
+from time import monotonic
+import re
+
+from psycopg2 import connect, InterfaceError, OperationalError
+from psycopg2 import Error as DatabaseError
+from psycopg2.extensions import connection, cursor, TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+
+
+class PreparingConnection(connection):
+    """A connection remembering which statements were prepared on it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def to_positional(query: str) -> str:
+    """Replaces a query's `%s` placeholders with `$1`, `$2` and so on, as
+    `PREPARE` expects."""
+    count = iter(range(1, query.count("%s") + 1))
+    return re.sub("%s", lambda _: f"${next(count)}", query)
+
+
+def execute_prepared(curs: cursor, name: str, query: str, params: tuple) -> None:
+    """Runs a query with `%s` placeholders as a prepared statement, preparing
+    it under `name` on the cursor's connection the first time. Connections
+    which do not prepare statements run the query as it is."""
+    conn = curs.connection
+    if not isinstance(conn, PreparingConnection):
+        curs.execute(query, params)
+        return
+    if name not in conn.prepared:
+        curs.execute(f"PREPARE {name} AS {to_positional(query)}")
+        conn.prepared.add(name)
+    curs.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+def connect_from_env() -> connection:
+    """Opens a connection to the database in the `DB_*` variables."""
+    prepare = ENV.get("DB_PREPARE", "true").lower() == "true"
+    return connect(host=ENV["DB_HOST"],
+                   port=ENV["DB_PORT"],
+                   user=ENV["DB_USER"],
+                   password=ENV["DB_PASSWORD"],
+                   dbname=ENV["DB_NAME"],
+                   connect_timeout=int(ENV.get("DB_CONNECT_TIMEOUT", "10")),
+                   sslmode=ENV.get("DB_SSLMODE", "prefer"),
+                   application_name=ENV.get("DB_APPLICATION_NAME", "games-release-tracker"),
+                   connection_factory=PreparingConnection if prepare else None)
+
+
+class PooledConnection:
+    """A connection checked out of a pool. Everything but `close` and the
+    `with` block is passed on to the connection itself."""
+
+    def __init__(self, pool: "ConnectionPool", conn: connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name: str):
+        if self._conn is None:
+            raise InterfaceError("The connection was returned to the pool.")
+        return getattr(self._conn, name)
+
+    def close(self) -> None:
+        """Returns the connection to the pool."""
+        if self._conn is not None:
+            self._pool.putconn(self._conn)
+            self._conn = None
+
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self.close()
+
+
+class ConnectionPool:
+    """Hands out up to `max_size` connections, opening them as they are
+    first needed and keeping them open once they are returned."""
+
+    def __init__(self, connect_to: Callable[[], connection] = connect_from_env,
+                 max_size: int = None, timeout: float = None,
+                 health_check_after: float = None):
+        self.connect_to = connect_to
+        self.max_size = int(ENV.get("DB_POOL_SIZE", "5")) \
+            if max_size is None else max_size
+        self.timeout = float(ENV.get("DB_POOL_TIMEOUT", "30")) \
+            if timeout is None else timeout
+        self.health_check_after = float(ENV.get("DB_HEALTH_CHECK_AFTER", "30")) \
+            if health_check_after is None else health_check_after
+        self.idle = []
+        self.open_count = 0
+        self.condition = Condition()
+        self.counts = {"checkouts": 0, "waits": 0, "creations": 0,
+                       "health_checks": 0, "discarded": 0}
+
+    def take(self) -> tuple:
+        """Takes an idle connection and when it was returned, or reserves
+        room for a new one, returning `(None, None)`. Waits for one to be
+        returned if the pool is full."""
+        deadline = monotonic() + self.timeout
+        with self.condition:
+            self.counts["checkouts"] += 1
+            if not self.idle and self.open_count >= self.max_size:
+                self.counts["waits"] += 1
+            while not self.idle and self.open_count >= self.max_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    raise PoolError(f"No connection was returned within {self.timeout}s.")
+            if self.idle:
+                return self.idle.pop()
+            self.open_count += 1
+            return None, None
+
+    def is_healthy(self, conn: connection, returned_at: float) -> bool:
+        """Checks a connection is still open, asking the server if it has
+        been idle for a while."""
+        if conn.closed:
+            return False
+        if monotonic() - returned_at < self.health_check_after:
+            return True
+        with self.condition:
+            self.counts["health_checks"] += 1
+        try:
+            with conn.cursor() as curs:
+                curs.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except (OperationalError, InterfaceError):
+            return False
+
+    def getconn(self, cursor_factory: type = None) -> PooledConnection:
+        """Checks a connection out of the pool, opening one if none are idle.
+        Its cursors are made with `cursor_factory`, if it is given."""
+        conn, returned_at = self.take()
+        if conn is not None and not self.is_healthy(conn, returned_at):
+            self.discard(conn)
+            conn = None
+        if conn is None:
+            try:
+                conn = self.connect_to()
+            except Exception:
+                with self.condition:
+                    self.open_count -= 1
+                    self.condition.notify()
+                raise
+            with self.condition:
+                self.counts["creations"] += 1
+        conn.cursor_factory = cursor_factory
+        return PooledConnection(self, conn)
+
+    def discard(self, conn: connection) -> None:
+        """Closes a broken connection, keeping its room in the pool for the
+        one replacing it."""
+        with self.condition:
+            self.counts["discarded"] += 1
+        try:
+            conn.close()
+        except DatabaseError:
+            pass
+
+    def putconn(self, conn: connection) -> None:
+        """Returns a connection to the pool, rolling back anything left
+        uncommitted, or closes it if it is broken."""
+        if not conn.closed:
+            try:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                conn.cursor_factory = None
+            except DatabaseError:
+                conn.close()
+        with self.condition:
+            if conn.closed:
+                self.open_count -= 1
+                self.counts["discarded"] += 1
+            else:
+                self.idle.append((conn, monotonic()))
+            self.condition.notify()
+
+    def closeall(self) -> None:
+        """Closes every idle connection."""
+        with self.condition:
+            while self.idle:
+                conn, _ = self.idle.pop()
+                conn.close()
+                self.open_count -= 1
+
+    def as_dict(self) -> dict:
+        """Returns the counters, and how many connections are open and idle."""
+        with self.condition:
+            return dict(self.counts, open=self.open_count, idle=len(self.idle))
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Returns the process-wide pool, creating it on first use."""
+    global _pool  # pylint: disable=W0603
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def get_connection(cursor_factory: type = None) -> PooledConnection:
+    """Checks a connection out of the process-wide pool."""
+    return get_pool().getconn(cursor_factory)
+
+
+def get_pool_stats() -> dict:
+    """Returns how many connections were checked out, how many checkouts
+    had to wait for one, how many were opened, health checked and
+    discarded, and how many are open and idle now."""
+    return get_pool().as_dict()
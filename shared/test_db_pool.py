@@ -0,0 +1,201 @@
+"""Tests for the db_pool.py file."""
+
+# pylint: skip-file
+
+from threading import Thread
+from time import sleep
+from unittest import mock
+
+import pytest
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from psycopg2.pool import PoolError
+
+from db_pool import (ConnectionPool, PreparingConnection, execute_prepared, get_pool,
+                     to_positional)
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection, recording what is done to it."""
+
+    def __init__(self):
+        self.closed = 0
+        self.status = TRANSACTION_STATUS_IDLE
+        self.cursor_factory = None
+        self.broken = False
+        self.calls = []
+
+    def cursor(self):
+        curs = mock.MagicMock()
+        if self.broken:
+            curs.__enter__.return_value.execute.side_effect = OperationalError("gone")
+        return curs
+
+    def get_transaction_status(self):
+        return self.status
+
+    def commit(self):
+        self.calls.append("commit")
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.calls.append("rollback")
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def opened():
+    """Records every connection a pool opens."""
+    return []
+
+
+@pytest.fixture
+def pool(opened):
+    def connect_to():
+        opened.append(FakeConnection())
+        return opened[-1]
+    return ConnectionPool(connect_to, max_size=2, timeout=0.2, health_check_after=60)
+
+
+def test_get_pool_is_shared():
+    assert get_pool() is get_pool()
+
+
+def test_connections_are_reused(pool, opened):
+    """Tests that closing a connection returns it to the pool, to be handed
+    out again instead of opening another."""
+    for _ in range(3):
+        conn = pool.getconn()
+        conn.close()
+
+    assert len(opened) == 1
+    assert opened[0].closed == 0
+    stats = pool.as_dict()
+    assert stats["checkouts"] == 3
+    assert stats["creations"] == 1
+    assert stats["idle"] == 1
+
+
+def test_with_block_commits_and_returns(pool, opened):
+    with pool.getconn() as conn:
+        conn.status = TRANSACTION_STATUS_INTRANS
+    assert opened[0].calls == ["commit"]
+    assert pool.as_dict()["idle"] == 1
+
+
+def test_with_block_rolls_back_on_error(pool, opened):
+    with pytest.raises(ValueError):
+        with pool.getconn():
+            raise ValueError()
+    assert opened[0].calls == ["rollback"]
+    assert pool.as_dict()["idle"] == 1
+
+
+def test_uncommitted_work_is_rolled_back_on_return(pool, opened):
+    conn = pool.getconn()
+    opened[0].status = TRANSACTION_STATUS_INTRANS
+    conn.close()
+    assert opened[0].calls == ["rollback"]
+
+
+def test_returned_connections_cannot_be_used(pool):
+    conn = pool.getconn()
+    conn.close()
+    with pytest.raises(Exception, match="returned to the pool"):
+        conn.cursor()
+
+
+def test_cursor_factory_is_set_for_one_checkout(pool, opened):
+    conn = pool.getconn(cursor_factory=dict)
+    assert opened[0].cursor_factory is dict
+    conn.close()
+    assert opened[0].cursor_factory is None
+
+
+def test_checkouts_wait_for_a_connection(pool, opened):
+    """Tests that a full pool makes callers wait until a connection is
+    returned, rather than opening more."""
+    first, second = pool.getconn(), pool.getconn()
+    Thread(target=lambda: (sleep(0.05), first.close())).start()
+
+    third = pool.getconn()
+
+    assert third._conn is opened[0]
+    assert len(opened) == 2
+    assert pool.as_dict()["waits"] == 1
+    second.close()
+    third.close()
+
+
+def test_checkouts_time_out(pool):
+    held = [pool.getconn(), pool.getconn()]
+    with pytest.raises(PoolError):
+        pool.getconn()
+
+
+def test_idle_connections_are_health_checked(opened):
+    """Tests that a connection idle for too long is checked, and replaced
+    if the server dropped it."""
+    def connect_to():
+        opened.append(FakeConnection())
+        return opened[-1]
+    pool = ConnectionPool(connect_to, max_size=1, timeout=0.2, health_check_after=0)
+
+    pool.getconn().close()
+    pool.getconn().close()
+    assert len(opened) == 1
+
+    opened[0].broken = True
+    conn = pool.getconn()
+
+    assert conn._conn is opened[1]
+    assert opened[0].closed
+    stats = pool.as_dict()
+    assert stats["health_checks"] == 2
+    assert stats["discarded"] == 1
+    assert stats["open"] == 1
+
+
+def test_closed_connections_are_replaced(pool, opened):
+    conn = pool.getconn()
+    opened[0].closed = 1
+    conn.close()
+    pool.getconn()
+    assert len(opened) == 2
+    assert pool.as_dict()["open"] == 1
+
+
+def test_failed_connections_free_their_room(pool):
+    pool.connect_to = mock.Mock(side_effect=OperationalError("refused"))
+    for _ in range(3):
+        with pytest.raises(OperationalError):
+            pool.getconn()
+    assert pool.as_dict()["open"] == 0
+
+
+def test_to_positional():
+    assert to_positional("SELECT %s, %s WHERE x = %s;") == "SELECT $1, $2 WHERE x = $3;"
+
+
+def test_statements_are_prepared_once_per_connection():
+    curs = mock.MagicMock()
+    curs.connection = mock.MagicMock(spec=PreparingConnection)
+    curs.connection.prepared = set()
+
+    for _ in range(2):
+        execute_prepared(curs, "find_game", "SELECT * FROM game WHERE game_id = %s;", (1,))
+
+    assert [call.args for call in curs.execute.call_args_list] == [
+        ("PREPARE find_game AS SELECT * FROM game WHERE game_id = $1;",),
+        ("EXECUTE find_game (%s)", (1,)),
+        ("EXECUTE find_game (%s)", (1,))]
+
+
+def test_statements_are_not_prepared_without_support():
+    """Tests that statements are run as they are when preparing is off."""
+    curs = mock.MagicMock()
+    execute_prepared(curs, "find_game", "SELECT * FROM game WHERE game_id = %s;", (1,))
+    curs.execute.assert_called_once_with("SELECT * FROM game WHERE game_id = %s;", (1,))
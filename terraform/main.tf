@@ -45,6 +45,32 @@ resource "aws_db_instance" "games-db" {
 }
 
 
+### SET UP PAGE CACHE
+
+# bucket keeping the store pages downloaded by the scrapers, so unchanged pages are not downloaded again
+resource "aws_s3_bucket" "page-cache-bucket" {
+  bucket        = "c13-lakshmibai-page-cache"
+  force_destroy = true
+}
+
+# The scrapers' streamed listings are only read once, by the transform and load Lambda
+resource "aws_s3_bucket_lifecycle_configuration" "listing-streams-expiry" {
+  bucket = aws_s3_bucket.page-cache-bucket.id
+
+  rule {
+    id     = "expire-listing-streams"
+    status = "Enabled"
+
+    filter {
+      prefix = "listing-streams/"
+    }
+
+    expiration {
+      days = 7
+    }
+  }
+}
+
 ### SET UP LAMBDAS 
 
 # Assuming the role for the lambda
@@ -94,6 +120,19 @@ data "aws_iam_policy_document" "lambda_permissions_policy" {
     ]
     resources = ["*"] 
   }
+  statement {
+    effect = "Allow"
+    actions = [
+      "s3:GetObject",
+      "s3:PutObject",
+      "s3:DeleteObject",
+      "s3:ListBucket"
+    ]
+    resources = [
+      aws_s3_bucket.page-cache-bucket.arn,
+      "${aws_s3_bucket.page-cache-bucket.arn}/*"
+    ]
+  }
   
 }
 
@@ -148,6 +187,16 @@ resource "aws_lambda_function" "gog-scraper-lambda" {
   memory_size = 512
 
   image_uri = data.aws_ecr_image.gog-scraper-image.image_uri
+  environment {
+    variables = {
+      PAGE_CACHE_BACKEND    = "s3"
+      PAGE_CACHE_BUCKET     = aws_s3_bucket.page-cache-bucket.bucket
+      PARSE_MEMO_BACKEND    = "s3"
+      WATERMARK_BACKEND     = "s3"
+      SCRAPER_OUTPUT        = "ndjson"
+      SCRAPER_STREAM_BUCKET = aws_s3_bucket.page-cache-bucket.bucket
+    }
+  }
 }
 
 resource "aws_lambda_function" "steam-scraper-lambda" {
@@ -159,6 +208,16 @@ resource "aws_lambda_function" "steam-scraper-lambda" {
   memory_size = 512
 
   image_uri = data.aws_ecr_image.steam-scraper-image.image_uri
+  environment {
+    variables = {
+      PAGE_CACHE_BACKEND    = "s3"
+      PAGE_CACHE_BUCKET     = aws_s3_bucket.page-cache-bucket.bucket
+      PARSE_MEMO_BACKEND    = "s3"
+      WATERMARK_BACKEND     = "s3"
+      SCRAPER_OUTPUT        = "ndjson"
+      SCRAPER_STREAM_BUCKET = aws_s3_bucket.page-cache-bucket.bucket
+    }
+  }
 }
 
 resource "aws_lambda_function" "epic-scraper-lambda" {
@@ -174,6 +233,10 @@ resource "aws_lambda_function" "epic-scraper-lambda" {
     variables = {
       AWS_ACCOUNT_ID = var.AWS_ACCOUNT_ID
       ECR_REPO_NAME = var.ECR_REPO_NAME
+      PAGE_CACHE_BUCKET     = aws_s3_bucket.page-cache-bucket.bucket
+      WATERMARK_BACKEND     = "s3"
+      SCRAPER_OUTPUT        = "ndjson"
+      SCRAPER_STREAM_BUCKET = aws_s3_bucket.page-cache-bucket.bucket
     }
    }
 }
@@ -226,6 +289,8 @@ resource "aws_lambda_function" "transform-load-lambda" {
       ECR_REPO_NAME=var.tf_ECR
       SNS_TOPIC_PREFIX=var.SNS_PREFIX
       SENDER_EMAIL_ADDRESS=var.SENDER_EMAIL_ADDRESS
+      PAGE_CACHE_BUCKET=aws_s3_bucket.page-cache-bucket.bucket
+      WATERMARK_BACKEND="s3"
     }
   }
 }
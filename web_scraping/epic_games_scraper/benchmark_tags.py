@@ -0,0 +1,75 @@
+"""Benchmarks classifying Epic listings' tags and categories in one pass
+against scanning them once per field, over a large synthetic catalogue.
+
+Run with `python3 benchmark_tags.py [number of listings]`. Defaults to
+100,000 listings."""
+
+from random import Random
+from sys import argv
+from timeit import repeat
+
+from extract_epic import classify_tags, listing_is_game
+
+RUNS = 3
+PLATFORMS = ["Windows", "MacOS", "Mac OS", "Linux", "iOS", "Android"]
+GENRES = ["Action", "Adventure", "RPG", "Strategy", "Puzzle", "Racing", "Shooter", "Indie"]
+FEATURES = ["Single Player", "Multiplayer", "Co-op", "Controller Support", "Achievements",
+            "Cloud Saves", "Competitive", "VR"]
+OTHER_GROUPS = ["epicInternal", "event", "accessibility"]
+CATEGORY_PATHS = ["games", "games/edition", "games/edition/base", "applications",
+                  "addons", "addons/durable", "digitalextras/soundtrack", "spthidden"]
+
+
+def make_catalogue(size: int, seed: int = 0) -> list[dict]:
+    """Returns the tags and categories of a synthetic catalogue of listings."""
+    random = Random(seed)
+    catalogue = []
+    for _ in range(size):
+        tags = ([{"name": name, "groupName": "platform"} for name in random.sample(PLATFORMS, 2)]
+                + [{"name": name, "groupName": "genre"} for name in random.sample(GENRES, 3)]
+                + [{"name": name, "groupName": "feature"} for name in random.sample(FEATURES, 4)]
+                + [{"name": f"{group} {i}", "groupName": group}
+                   for i, group in enumerate(random.sample(OTHER_GROUPS, 2))])
+        random.shuffle(tags)
+        categories = [{"path": path} for path in random.sample(CATEGORY_PATHS, 3)]
+        catalogue.append({"tags": tags, "categories": categories})
+    return catalogue
+
+
+def per_field_scans(listing: dict) -> tuple:
+    """The previous classification: one scan of the tags per field, and a
+    scan of every keyword per category."""
+    tags = listing["tags"]
+    platforms = [tag['name'].replace("MacOS", "Mac").replace("Mac OS", "Mac")
+                 for tag in tags if tag.get('groupName') == "platform"]
+    genres = [tag['name'] for tag in tags if tag.get('groupName') == "genre"]
+    features = [tag['name'] for tag in tags if tag.get('groupName') == "feature"]
+    is_game = not any(keyword in category['path'] for category in listing["categories"]
+                      for keyword in {'addons', 'digitalextras', 'spthidden'})
+    return platforms, genres, features, is_game
+
+
+def single_pass(listing: dict) -> tuple:
+    """Classifies the tags in one pass, with the precompiled lookups."""
+    tags = classify_tags(listing["tags"])
+    return (tags["operating_systems"], tags["genres"], tags["tags"],
+            listing_is_game(listing["categories"]))
+
+
+def best_time_per_listing(classify, catalogue: list[dict]) -> float:
+    """Returns the best time taken to classify one listing, in microseconds."""
+    def classify_catalogue():
+        for listing in catalogue:
+            classify(listing)
+    return min(repeat(classify_catalogue, number=1, repeat=RUNS)) / len(catalogue) * 1_000_000
+
+
+if __name__ == "__main__":
+    listings = make_catalogue(int(argv[1]) if len(argv) > 1 else 100_000)
+    if any(per_field_scans(listing) != single_pass(listing) for listing in listings):
+        raise ValueError("The classifications disagree.")
+    before = best_time_per_listing(per_field_scans, listings)
+    after = best_time_per_listing(single_pass, listings)
+    print(f"{len(listings):,} listings")
+    print(f"{'per-field':>11} | {'single pass':>11} | speed-up")
+    print(f"{before:>9.2f}µs | {after:>9.2f}µs | {before / after:>7.1f}x")
@@ -1,58 +1,236 @@
 """Extracting game data from Epic Games' GraphQL API."""
 
+from os import environ as ENV
 from json import dumps, loads
-from datetime import datetime
-
-from gql import Client, gql
+from collections.abc import AsyncIterator, Iterable, Iterator
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import count
+from pathlib import Path
+import asyncio
+import atexit
+import re
+
+from gql import Client, GraphQLRequest, gql
+from gql.client import AsyncClientSession
 from gql.transport.aiohttp import AIOHTTPTransport
-from gql.transport.exceptions import TransportQueryError
-
-EPIC_URL = "https://graphql.epicgames.com/graphql"
+from gql.transport.exceptions import (TransportConnectionFailed, TransportQueryError,
+                                      TransportServerError)
 
+from rate_limiter import get_rate_limiter
+from retry import RETRY_STATUSES, schedule_retry
+from watermark import Watermark
 
-def load_graph_ql_query(file_name: str) -> gql:
-    """Returns a GraphQL query from a file. Instantiates the 
-    query with the current day."""
+EPIC_URL = "https://graphql.epicgames.com/graphql"
+QUERY_FILE = Path(__file__).parent / "query.graphql"
+PAGE_SIZE = int(ENV.get("EPIC_PAGE_SIZE", "30"))
+TAG_GROUPS = ("platform", "genre", "feature")
+PLATFORM_NAME_PATTERN = re.compile("MacOS|Mac OS")
+NON_GAME_PATH_PATTERN = re.compile("addons|digitalextras|spthidden")
+# Lookup tables filled in as each platform name and category path is first
+# met; a catalogue only has a few dozen of each.
+PLATFORM_NAMES = {}
+NON_GAME_PATHS = {}
+
+
+@lru_cache(maxsize=None)
+def load_graph_ql_query(file_name: str | Path) -> GraphQLRequest:
+    """Returns a GraphQL query from a file. The query is read and parsed
+    once per process; its arguments are passed as variables."""
     with open(file_name, 'r', encoding='UTF-8') as file:
-        query = file.read().strip()
+        return gql(file.read().strip())
+
 
-    current_date = datetime.now().isoformat().split("T")[0]
+def get_release_date_filter(day: datetime) -> str:
+    """Returns the release date filter matching a given day."""
+    current_date = day.isoformat().split("T")[0]
     start_time = f"{current_date}T00:00:00.000Z"
     end_time = f"{current_date}T18:00:00.000Z"
-    filter_string = f'[{start_time},{end_time}]'
-    query = query.replace("{{RELEASE_DATE}}", filter_string)
-    return gql(query)
-
-
-def execute_query(q: gql) -> str:
+    return f'[{start_time},{end_time}]'
+
+
+# The client, its session and the event loop they run on are kept for the
+# life of the process, so a warm Lambda reuses the open connections.
+_loop = None
+_client = None
+_session = None
+_session_loop = None
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Returns the process-wide event loop the GraphQL client runs on."""
+    global _loop  # pylint: disable=W0603
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+
+async def close_client_on(client: Client, loop: asyncio.AbstractEventLoop) -> None:
+    """Closes a client on the event loop it was connected on, which may
+    be running in another thread, or idle. Nothing can be run on a closed
+    loop, so a client left open on one cannot be closed."""
+    close = client.close_async()
+    if loop is asyncio.get_running_loop():
+        await close
+    elif loop.is_running():
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(close, loop))
+    elif not loop.is_closed():
+        await asyncio.to_thread(loop.run_until_complete, close)
+    else:
+        close.close()
+
+
+async def get_session() -> AsyncClientSession:
+    """Returns the process-wide GraphQL session, connecting it on first
+    use, or again if `EPIC_URL` has changed. A session only works on the
+    loop it was connected on, so another loop closes it and gets its own."""
+    global _client, _session, _session_loop  # pylint: disable=W0603
+    loop = asyncio.get_running_loop()
+    if _session is not None and _session_loop is not loop:
+        _session = None
+        await close_client_on(_client, _session_loop)
+    if _session is not None and _client.transport.url != EPIC_URL:
+        await _client.close_async()
+        _session = None
+    if _session is None:
+        _client = Client(transport=AIOHTTPTransport(EPIC_URL), fetch_schema_from_transport=False)
+        _session = await _client.connect_async()
+        _session_loop = loop
+    return _session
+
+
+async def close_session_async() -> None:
+    """Closes the process-wide GraphQL session, if it is open."""
+    global _client, _session  # pylint: disable=W0603
+    if _session is not None:
+        await _client.close_async()
+        _client, _session = None, None
+
+
+@atexit.register
+def close_session() -> None:
+    """Closes the process-wide GraphQL session, if it is open on the
+    process-wide event loop."""
+    if _session is not None and _session_loop is _loop and not _loop.is_closed():
+        _loop.run_until_complete(close_session_async())
+
+
+async def execute_query_async(q: GraphQLRequest, variables: dict = None) -> dict:
+    """Executes a GraphQL query on the shared session, once the
+    process-wide rate limiter allows it, returning the data. Dropped
+    connections and retryable server errors are retried after a backoff;
+    gql does not expose `Retry-After`, so throttling is backed off from too."""
+    session = await get_session()
+    limiter = get_rate_limiter()
+    for attempt in count():
+        await limiter.wait_async(EPIC_URL)
+        try:
+            return await session.execute(GraphQLRequest(q, variable_values=variables))
+        except TransportServerError as error:
+            delay = schedule_retry(EPIC_URL, attempt, error.code) \
+                if error.code in RETRY_STATUSES else None
+            if delay is None:
+                raise
+        except (TransportConnectionFailed, asyncio.TimeoutError):
+            delay = schedule_retry(EPIC_URL, attempt)
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
+
+
+def execute_query(q: GraphQLRequest, variables: dict = None) -> dict:
     """Executes a GraphQL query on a URL."""
-    transport = AIOHTTPTransport(EPIC_URL)
-    client = Client(transport=transport)
-    result = client.execute(q)
-    return dumps(result)
+    return get_event_loop().run_until_complete(execute_query_async(q, variables))
 
 
-def get_listings_from_json(json_str: str) -> list[dict]:
-    """Returns all game listing objects from the GraphQL response JSON."""
-    data = loads(json_str.strip())
+def get_listings(data: dict) -> list[dict]:
+    """Returns all game listing objects from the GraphQL response data."""
     return data['Catalog']['searchStore']['elements']
 
 
+def get_total(data: dict) -> int:
+    """Returns the total number of listings matching the query, or None
+    if the response does not say."""
+    paging = data['Catalog']['searchStore'].get('paging') or {}
+    return paging.get('total')
+
+
+async def iter_listing_pages(ql_query: GraphQLRequest, day: datetime,
+                             page_size: int = None) -> AsyncIterator[list[dict]]:
+    """Yields each page of the listings released on a day, fetching pages
+    of `page_size` listings until one comes back empty, or until the total
+    number of listings has been fetched."""
+    page_size = page_size or PAGE_SIZE
+    fetched = 0
+    while True:
+        data = await execute_query_async(ql_query, {"count": page_size, "start": fetched,
+                                                    "releaseDate": get_release_date_filter(day)})
+        page = get_listings(data)
+        if not page:
+            return
+        yield page
+        fetched += len(page)
+        total = get_total(data)
+        if total is not None and fetched >= total:
+            return
+
+
+async def fetch_listings(ql_query: GraphQLRequest, day: datetime,
+                         page_size: int = None) -> list[dict]:
+    """Returns every listing released on a day, fetching every page."""
+    return [listing async for page in iter_listing_pages(ql_query, day, page_size)
+            for listing in page]
+
+
+async def fetch_listings_for_days(days: list[datetime], page_size: int = None) -> list[dict]:
+    """Returns every listing released on any of the days, querying each
+    day's window concurrently. The listings are in the order of the days."""
+    ql_query = load_graph_ql_query(QUERY_FILE)
+    await get_session()
+    pages = await asyncio.gather(*(fetch_listings(ql_query, day, page_size) for day in days))
+    return [listing for day_listings in pages for listing in day_listings]
+
+
+def get_days(start_day: datetime, end_day: datetime = None) -> list[datetime]:
+    """Returns every day between two days, inclusive."""
+    end_day = end_day or start_day
+    return [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+
+
+def normalise_platform(name: str) -> str:
+    """Returns the name of a platform as the other scrapers spell it."""
+    normalised = PLATFORM_NAMES.get(name)
+    if normalised is None:
+        normalised = PLATFORM_NAMES[name] = PLATFORM_NAME_PATTERN.sub("Mac", name)
+    return normalised
+
+
+def classify_tags(tags: list[dict]) -> dict[str, list[str]]:
+    """Sorts a listing's tags into its operating systems, genres and
+    features, bucketing them by group in one pass over the tags."""
+    buckets = {group: [] for group in TAG_GROUPS}
+    for tag in tags:
+        bucket = buckets.get(tag.get('groupName'))
+        if bucket is not None:
+            bucket.append(tag['name'])
+    return {"operating_systems": [normalise_platform(name) for name in buckets["platform"]],
+            "genres": buckets["genre"],
+            "tags": buckets["feature"]}
+
+
 def get_operating_systems(tags: list[dict]):
     """Returns a list of operating systems from a list of tag dicts."""
-    platforms = [tag['name'].replace("MacOS", "Mac").replace("Mac OS", "Mac")
-                 for tag in tags if tag.get('groupName') == "platform"]
-    return platforms
+    return classify_tags(tags)["operating_systems"]
 
 
 def get_genres(tags: list[dict]):
     """Returns a list of genre from a list of API tags"""
-    return [tag['name'] for tag in tags if tag.get('groupName') == "genre"]
+    return classify_tags(tags)["genres"]
 
 
 def get_features(tags: list[dict]):
     """Returns all features from a list of tags"""
-    return [tag['name'] for tag in tags if tag.get('groupName') == "feature"]
+    return classify_tags(tags)["tags"]
 
 
 def format_release_date(release_date_str: str) -> str:
@@ -77,14 +255,15 @@ def get_listing_image(image_list: list[dict]) -> str:
 
 def parse_listing(listing: dict) -> dict:
     """Parses a game listing, returns a formatted dictionary describing the game object."""
+    tags = classify_tags(listing['tags'])
     return {
         "title": listing["title"],
         "description": listing["description"],
         "release_date": format_release_date(listing["releaseDate"]),
-        "operating_systems": get_operating_systems(listing['tags']),
-        "genres": get_genres(listing['tags']),
+        "operating_systems": tags["operating_systems"],
+        "genres": tags["genres"],
         "is_nsfw": False,  # Epic Games do not allow NSFW listings.
-        "tags": get_features(listing['tags']),
+        "tags": tags["tags"],
         "current_price": listing["currentPrice"],
         "url": get_game_url(listing['mappings']),
         "img_url": get_listing_image(listing['keyImages'])
@@ -101,10 +280,14 @@ def parse_listings(listings: list[dict]) -> dict:
 
 def listing_is_game(categories: list[dict]) -> bool:
     """Returns true if a listing is a game. Filters out DLCs, soundtracks, etc."""
-    non_game_keywords = {'addons', 'digitalextras',
-                         'spthidden'}
-    return not any(keyword in category['path']
-                   for category in categories for keyword in non_game_keywords)
+    for category in categories:
+        path = category['path']
+        is_non_game = NON_GAME_PATHS.get(path)
+        if is_non_game is None:
+            is_non_game = NON_GAME_PATHS[path] = NON_GAME_PATH_PATTERN.search(path) is not None
+        if is_non_game:
+            return False
+    return True
 
 
 def write_json_to_file(json_str: str, file_name: str):
@@ -115,18 +298,105 @@ def write_json_to_file(json_str: str, file_name: str):
         f.write(so_pretty)
 
 
-def process_listings(save_to_file: bool = False) -> None:
-    """Main function to process listings. Optionally saves to a JSON file locally."""
+def iter_new_games(listings: Iterable[dict], watermark: Watermark = None) -> Iterator[dict]:
+    """Parses the listings which are games, skipping those the watermark
+    has already seen and recording the rest in it."""
+    for listing in listings:
+        if not listing_is_game(listing['categories']):
+            continue
+        if watermark is not None and watermark.has_seen(get_game_url(listing['mappings'])):
+            continue
+        game = parse_listing(listing)
+        if watermark is not None:
+            watermark.record_game(game)
+        yield game
+
+
+async def process_listings_async(day: datetime = None, page_size: int = None,
+                                 end_day: datetime = None, watermark: Watermark = None) -> dict:
+    """Processes the listings released today unless given a day, or every
+    day up to `end_day`. The days are queried concurrently, and every page
+    of each day's listings is fetched. Listings the watermark has already
+    seen are not parsed, and the rest are recorded in it."""
+    days = get_days(day or datetime.now(), end_day)
     try:
-        ql_query = load_graph_ql_query("query.graphql")
-        response = execute_query(ql_query)
-        all_listings = get_listings_from_json(response)
-        game_listings = [listing for listing in all_listings
-                         if listing_is_game(listing['categories'])]
+        all_listings = await fetch_listings_for_days(days, page_size)
     except TransportQueryError:
-        game_listings = []
+        all_listings = []
+    return {"platform": "epic", "listings": list(iter_new_games(all_listings, watermark))}
+
+
+async def iter_games_async(day: datetime = None, page_size: int = None,
+                           end_day: datetime = None,
+                           watermark: Watermark = None) -> AsyncIterator[dict]:
+    """Yields the games released today unless given a day, or every day up
+    to `end_day`, in the order of the days, as each page arrives. The days
+    are queried concurrently, each holding at most one page that has not
+    been yielded yet. The stream ends early if the API rejects a query."""
+    ql_query = load_graph_ql_query(QUERY_FILE)
+    await get_session()
+    days = get_days(day or datetime.now(), end_day)
+    queues = [asyncio.Queue(maxsize=1) for _ in days]
+
+    async def fill(queue: asyncio.Queue, day: datetime) -> None:
+        try:
+            async for page in iter_listing_pages(ql_query, day, page_size):
+                await queue.put(page)
+            await queue.put(None)
+        except Exception as error:  # pylint: disable=W0718
+            await queue.put(error)
+
+    tasks = [asyncio.create_task(fill(queue, day)) for queue, day in zip(queues, days)]
+    try:
+        for queue in queues:
+            while (page := await queue.get()) is not None:
+                if isinstance(page, TransportQueryError):
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                for game in iter_new_games(page, watermark):
+                    yield game
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def iter_games(day: datetime = None, page_size: int = None, end_day: datetime = None,
+               watermark: Watermark = None,
+               loop: asyncio.AbstractEventLoop = None) -> Iterator[dict]:
+    """Lazily yields the games `iter_games_async` does, for a caller which
+    is not async, such as a stream writer. The games are fetched on the
+    process-wide event loop, or on `loop`, which must then be running in
+    another thread."""
+    loop = loop or get_event_loop()
+    games = iter_games_async(day, page_size, end_day, watermark)
+
+    def run(awaitable) -> dict:
+        async def wait():
+            return await awaitable
+        if loop.is_running():
+            return asyncio.run_coroutine_threadsafe(wait(), loop).result()
+        return loop.run_until_complete(wait())
 
-    parsed = parse_listings(game_listings)
+    try:
+        while True:
+            try:
+                yield run(anext(games))
+            except StopAsyncIteration:
+                return
+    finally:
+        run(games.aclose())
+
+
+def process_listings(save_to_file: bool = False, day: datetime = None,
+                     page_size: int = None, end_day: datetime = None,
+                     watermark: Watermark = None) -> dict:
+    """Main function to process listings, released today unless given a day,
+    or every day up to `end_day`, on the process-wide event loop.
+    Optionally saves to a JSON file locally."""
+    parsed = get_event_loop().run_until_complete(
+        process_listings_async(day, page_size, end_day, watermark))
     if save_to_file:
         write_json_to_file(dumps(parsed), 'sample_output.json')
     return parsed
@@ -1,15 +1,38 @@
 """Script that runs when AWS Lambda is triggered."""
 
+from datetime import datetime
 from json import dumps
 
-from extract_epic import process_listings
+from extract_epic import iter_games, process_listings
+from listing_stream import is_streaming, stream_listings
+from retry import get_retry_stats
+from watermark import load_watermark, stage_watermark
 
 # pylint: disable=W0613
 
 
 def lambda_handler(event, context):
-    """Entry-point for the AWS Lambda."""
-    listings = process_listings()
+    """Entry-point for the AWS Lambda. Extracts today's releases, or
+    backfills every day between the optional 'start_date' and 'end_date'
+    arguments passed in the event, formatted as YYYY-MM-DD. When streaming,
+    the listings are written to a file and only its location is returned.
+    The optional 'watermark' argument, 'use', 'ignore' or 'reset', says
+    whether games already scraped are skipped. The watermark is staged
+    last, for the loader to commit once the games are loaded."""
+    event = event or {}
+    watermark = load_watermark("epic", event.get("watermark"))
+    start_date, end_date = None, None
+    if event.get("start_date"):
+        start_date = datetime.fromisoformat(event["start_date"])
+        end_date = datetime.fromisoformat(event.get("end_date", event["start_date"]))
+    if is_streaming():
+        listings = stream_listings(
+            "epic", iter_games(day=start_date, end_day=end_date, watermark=watermark))
+    else:
+        listings = process_listings(day=start_date, end_day=end_date, watermark=watermark)
+    print(f"Retries: {get_retry_stats()}")
+    print(f"Watermark: {watermark.get_stats()}")
+    stage_watermark(watermark)
     return {"statusCode": 200,
             "body": {
                 "data": dumps(listings)}
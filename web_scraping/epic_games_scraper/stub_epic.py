@@ -0,0 +1,41 @@
+"""Builds the responses of a stub of Epic Games' GraphQL API, served by the
+shared stub server in the tests."""
+
+from json import dumps
+
+
+def make_listing(number: int, release_date: str = "2026-10-18T15:00:00.000Z",
+                 category: str = "games/edition/base") -> dict:
+    """Returns a listing as the searchStore query returns it."""
+    return {
+        "title": f"Game {number}",
+        "releaseDate": release_date,
+        "description": f"The {number}th game.",
+        "id": f"id-{number}",
+        "publisherDisplayName": "Publisher",
+        "developerDisplayName": "Developer",
+        "seller": {"name": "Seller"},
+        "currentPrice": 1999,
+        "tags": [{"name": "Windows", "groupName": "platform"},
+                 {"name": "Action", "groupName": "genre"},
+                 {"name": "Single Player", "groupName": "feature"}],
+        "keyImages": [{"type": "Thumbnail", "url": f"https://cdn.epicgames.com/{number}.jpg"}],
+        "mappings": [{"pageSlug": f"game-{number}"}],
+        "categories": [{"path": category}]
+    }
+
+
+def make_search_store(listings: list[dict] | dict[str, list[dict]], with_total: bool = True):
+    """Returns a function answering the searchStore query from a list of
+    listings, by the query's `start` and `count` variables. The listings can
+    also be a dictionary of lists, by the query's `releaseDate` filter."""
+    def search_store(request: dict) -> str:
+        variables = request["variables"]
+        start, count = variables["start"], variables["count"]
+        listings_released = (listings.get(variables["releaseDate"], [])
+                             if isinstance(listings, dict) else listings)
+        search = {"elements": listings_released[start:start + count]}
+        if with_total:
+            search["paging"] = {"count": count, "total": len(listings_released)}
+        return dumps({"data": {"Catalog": {"searchStore": search}}})
+    return search_store
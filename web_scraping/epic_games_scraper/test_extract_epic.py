@@ -1,11 +1,23 @@
 # pylint: skip-file
 
+import asyncio
 import pytest
+from datetime import datetime
+from time import perf_counter
 from unittest.mock import patch, MagicMock
 from extract_epic import format_release_date, get_operating_systems, get_genres, listing_is_game, process_listings
-from gql.transport.exceptions import TransportQueryError
+from gql.transport.exceptions import TransportQueryError, TransportServerError
 from extract_epic import (format_release_date, get_operating_systems, get_genres, listing_is_game,
-                          get_listings_from_json, get_features, get_game_url, get_listing_image)
+                          get_listings, get_features, get_game_url, get_listing_image,
+                          load_graph_ql_query, fetch_listings, fetch_listings_for_days,
+                          get_days, get_event_loop, classify_tags, iter_games, QUERY_FILE)
+import extract_epic
+import retry
+from rate_limiter import HostRateLimiter
+from retry import RetryPolicy
+from stub_epic import make_listing, make_search_store
+from stub_server import RESET, serve_pages
+from watermark import Watermark
 
 
 @pytest.mark.parametrize("image_list, expected", [
@@ -50,16 +62,16 @@ def test_get_features(tags, expected):
     assert get_features(tags) == expected
 
 
-@pytest.mark.parametrize("json_str, expected", [
-    ('{"Catalog": {"searchStore": {"elements": [{"id": 1, "name": "Game 1"}, {"id": 2, "name": "Game 2"}]}}}',
+@pytest.mark.parametrize("data, expected", [
+    ({"Catalog": {"searchStore": {"elements": [{"id": 1, "name": "Game 1"}, {"id": 2, "name": "Game 2"}]}}},
      [{"id": 1, "name": "Game 1"}, {"id": 2, "name": "Game 2"}]),
-    ('{"Catalog": {"searchStore": {"elements": []}}}', []),
-    ('{"Catalog": {"searchStore": {"elements": [{"id": 3, "name": "Game 3"}]}}}',
+    ({"Catalog": {"searchStore": {"elements": []}}}, []),
+    ({"Catalog": {"searchStore": {"elements": [{"id": 3, "name": "Game 3"}]}}},
      [{"id": 3, "name": "Game 3"}]),
-    ('{"Catalog": {"searchStore": {"elements": null}}}', None),
+    ({"Catalog": {"searchStore": {"elements": None}}}, None),
 ])
-def test_get_listings_from_json(json_str, expected):
-    assert get_listings_from_json(json_str) == expected
+def test_get_listings(data, expected):
+    assert get_listings(data) == expected
 
 
 @pytest.mark.parametrize("input_date, expected_output", [
@@ -114,6 +126,21 @@ def test_get_genres(input_tags, expected_output):
     assert get_genres(input_tags) == expected_output
 
 
+def test_classify_tags():
+    """Tests that each tag is sorted into its group, in order, in one pass."""
+    tags = [{"name": "Mac OS", "groupName": "platform"},
+            {"name": "Action", "groupName": "genre"},
+            {"name": "Single Player", "groupName": "feature"},
+            {"name": "Windows", "groupName": "platform"},
+            {"name": "Ubuntu", "groupName": "Linux"},
+            {"name": "Co-op"},
+            {"name": "RPG", "groupName": "genre"}]
+    assert classify_tags(tags) == {"operating_systems": ["Mac", "Windows"],
+                                   "genres": ["Action", "RPG"],
+                                   "tags": ["Single Player"]}
+    assert classify_tags([]) == {"operating_systems": [], "genres": [], "tags": []}
+
+
 @pytest.mark.parametrize("input_categories, expected_output", [
     ([{"path": "games/action/adventure"}], True),
     ([{"path": "games/roleplaying"}], True),
@@ -135,10 +162,244 @@ def test_listing_is_game(input_categories, expected_output):
 def test_process_listings_unavailable_api(fake_query):
     """Tests that when the API is not available, a reasonable response is still returned from the lambda."""
 
-    with patch('extract_epic.execute_query') as fake_execute:
+    with patch('extract_epic.execute_query_async') as fake_execute:
         fake_query.return_value = ""
         fake_execute.side_effect = TransportQueryError("Unavailable API.")
         listings = process_listings()
         needed_keys = ["platform", "listings"]
         assert all([key in listings for key in needed_keys])
         assert isinstance(listings['listings'], list)
+
+
+@pytest.fixture
+def stub_epic():
+    """Serves a stub of Epic's GraphQL API, yielding a function which sets
+    its listings and returns the bodies of the requests received."""
+    received = []
+
+    def serve(listings, with_total=True):
+        pages["/graphql"] = make_search_store(listings, with_total)
+        return received
+
+    pages = {}
+    with serve_pages(pages, received=received) as base_url:
+        with patch("extract_epic.EPIC_URL", f"{base_url}/graphql"):
+            yield serve
+
+
+@pytest.mark.parametrize("listing_count, page_size, with_total, requests_sent", [
+    (0, 30, True, 1), (10, 30, True, 1), (30, 30, True, 1), (31, 30, True, 2),
+    (95, 30, True, 4), (95, 30, False, 5), (60, 30, False, 3), (7, 2, True, 4)
+])
+def test_process_listings_fetches_every_page(stub_epic, listing_count, page_size, with_total,
+                                             requests_sent):
+    """Tests that days with more releases than fit on one page are not truncated."""
+    received = stub_epic([make_listing(i) for i in range(listing_count)], with_total)
+    listings = process_listings(day=datetime(2026, 10, 18), page_size=page_size)
+    assert [listing["title"] for listing in listings["listings"]] == [
+        f"Game {i}" for i in range(listing_count)]
+    assert len(received) == requests_sent
+
+
+def test_process_listings_filters_non_games_across_pages(stub_epic):
+    """Tests that DLCs are filtered out of every page."""
+    stub_epic([make_listing(i, category="games/addons" if i % 2 else "games/edition/base")
+               for i in range(7)])
+    listings = process_listings(day=datetime(2026, 10, 18), page_size=3)
+    assert [listing["title"] for listing in listings["listings"]] == [
+        "Game 0", "Game 2", "Game 4", "Game 6"]
+
+
+def test_watermarked_listings_are_not_parsed_again(stub_epic):
+    """Tests that only the listings released since the last run are returned."""
+    watermark = Watermark("epic")
+    stub_epic([make_listing(i) for i in range(3)])
+    process_listings(day=datetime(2026, 10, 18), watermark=watermark)
+    assert watermark.last_release == datetime(2026, 10, 18)
+
+    stub_epic([make_listing(i) for i in range(5)])
+    with patch("extract_epic.parse_listing", wraps=extract_epic.parse_listing) as parse:
+        listings = process_listings(day=datetime(2026, 10, 18), watermark=watermark)
+    assert [listing["title"] for listing in listings["listings"]] == ["Game 3", "Game 4"]
+    assert parse.call_count == 2
+    assert len(watermark.seen) == 5
+
+
+def test_fetch_listings_sends_offsets_and_release_date(stub_epic):
+    """Tests that each page is requested by offset, for the requested day."""
+    with patch("extract_epic.execute_query_async", wraps=extract_epic.execute_query_async) as spy:
+        stub_epic([make_listing(i) for i in range(5)])
+        listings = get_event_loop().run_until_complete(
+            fetch_listings(load_graph_ql_query(QUERY_FILE), datetime(2026, 10, 18), 2))
+        received = [call.args[1] for call in spy.call_args_list]
+    assert len(listings) == 5
+    assert [variables["start"] for variables in received] == [0, 2, 4]
+    assert {variables["count"] for variables in received} == {2}
+    assert {variables["releaseDate"] for variables in received} == {
+        "[2026-10-18T00:00:00.000Z,2026-10-18T18:00:00.000Z]"}
+
+
+def test_load_graph_ql_query_is_parsed_once():
+    """Tests that the query file is only read and parsed once per process."""
+    load_graph_ql_query.cache_clear()
+    with patch("extract_epic.gql", wraps=extract_epic.gql) as spy:
+        first = load_graph_ql_query(QUERY_FILE)
+        second = load_graph_ql_query(QUERY_FILE)
+    assert first is second
+    assert spy.call_count == 1
+
+
+def test_session_is_reused_across_invocations(stub_epic):
+    """Tests that warm invocations reuse the client's session rather than
+    connecting a new one."""
+    stub_epic([make_listing(i) for i in range(3)])
+    process_listings(day=datetime(2026, 10, 18))
+    session = extract_epic._session
+    with patch("extract_epic.Client", wraps=extract_epic.Client) as spy:
+        process_listings(day=datetime(2026, 10, 18))
+        process_listings(day=datetime(2026, 10, 18))
+    assert spy.call_count == 0
+    assert extract_epic._session is session
+
+
+def test_session_reconnects_when_the_url_changes(stub_epic):
+    """Tests that a session is not reused for another endpoint."""
+    stub_epic([make_listing(0)])
+    process_listings(day=datetime(2026, 10, 18))
+    with serve_pages({"/graphql": make_search_store([make_listing(1)])}) as base_url:
+        with patch("extract_epic.EPIC_URL", f"{base_url}/graphql"):
+            listings = process_listings(day=datetime(2026, 10, 18))
+    assert [listing["title"] for listing in listings["listings"]] == ["Game 1"]
+
+
+def test_responses_are_not_serialised(stub_epic):
+    """Tests that the responses are passed on as Python objects."""
+    stub_epic([make_listing(i) for i in range(3)])
+    with patch("extract_epic.dumps") as fake_dumps, patch("extract_epic.loads") as fake_loads:
+        listings = process_listings(day=datetime(2026, 10, 18))
+    assert len(listings["listings"]) == 3
+    fake_dumps.assert_not_called()
+    fake_loads.assert_not_called()
+
+
+def test_get_days():
+    assert get_days(datetime(2026, 10, 18)) == [datetime(2026, 10, 18)]
+    assert get_days(datetime(2026, 10, 30), datetime(2026, 11, 1)) == [
+        datetime(2026, 10, 30), datetime(2026, 10, 31), datetime(2026, 11, 1)]
+
+
+def test_days_are_queried_concurrently():
+    """Tests that each day's release window is queried at the same time,
+    and that the listings are still in the order of the days."""
+    days = get_days(datetime(2026, 10, 16), datetime(2026, 10, 19))
+    listings = {extract_epic.get_release_date_filter(day): [make_listing(10 * i + j) for j in range(2)]
+                for i, day in enumerate(days)}
+    with serve_pages({"/graphql": make_search_store(listings)}, latency=0.2) as base_url:
+        with patch("extract_epic.EPIC_URL", f"{base_url}/graphql"):
+            process_listings(day=days[0])
+            start = perf_counter()
+            result = process_listings(day=days[0], end_day=days[-1])
+            elapsed = perf_counter() - start
+    assert [listing["title"] for listing in result["listings"]] == [
+        f"Game {10 * i + j}" for i in range(4) for j in range(2)]
+    assert elapsed < 0.2 * len(days) * 0.75
+
+
+def test_fetch_listings_for_days_is_awaitable(stub_epic):
+    """Tests the async entry point on a caller's own event loop."""
+    stub_epic({extract_epic.get_release_date_filter(datetime(2026, 10, 18)): [make_listing(1)]})
+    extract_epic.close_session()
+
+    async def fetch():
+        try:
+            return await fetch_listings_for_days([datetime(2026, 10, 17), datetime(2026, 10, 18)])
+        finally:
+            await extract_epic.close_session_async()
+
+    listings = asyncio.run(fetch())
+    assert [listing["title"] for listing in listings] == ["Game 1"]
+
+
+def test_session_on_another_loop_is_closed(stub_epic):
+    """Tests that a session connected on the process-wide loop is closed
+    before another loop connects its own, rather than left open."""
+    stub_epic({extract_epic.get_release_date_filter(datetime(2026, 10, 18)): [make_listing(1)]})
+    process_listings(day=datetime(2026, 10, 18))
+    old_client = extract_epic._client
+
+    async def fetch():
+        try:
+            return await fetch_listings_for_days([datetime(2026, 10, 18)])
+        finally:
+            await extract_epic.close_session_async()
+
+    assert [listing["title"] for listing in asyncio.run(fetch())] == ["Game 1"]
+    assert extract_epic._client is not old_client
+    assert old_client.transport.session is None
+
+
+def test_iter_games_matches_process_listings(stub_epic):
+    """Tests that streaming gives the same games, in the order of the days."""
+    days = get_days(datetime(2026, 10, 16), datetime(2026, 10, 18))
+    stub_epic({extract_epic.get_release_date_filter(day): [make_listing(10 * i + j) for j in range(3)]
+               for i, day in enumerate(days)})
+    streamed = list(iter_games(day=days[0], end_day=days[-1], page_size=2))
+    assert streamed == process_listings(day=days[0], end_day=days[-1], page_size=2)["listings"]
+    assert [game["title"] for game in streamed] == [
+        f"Game {10 * i + j}" for i in range(3) for j in range(3)]
+
+
+def test_iter_games_fetches_pages_as_they_are_read(stub_epic):
+    """Tests that the games are yielded before every page is fetched."""
+    received = stub_epic([make_listing(i) for i in range(10)])
+    games = iter_games(day=datetime(2026, 10, 18), page_size=2)
+    assert next(games)["title"] == "Game 0"
+    assert len(received) < 5
+    games.close()
+
+
+def test_iter_games_runs_on_a_loop_in_another_thread(stub_epic):
+    """Tests that a worker thread can stream the games of a running loop."""
+    stub_epic([make_listing(i) for i in range(3)])
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.to_thread(
+                lambda: [game["title"] for game in iter_games(day=datetime(2026, 10, 18),
+                                                              loop=loop)])
+        finally:
+            await extract_epic.close_session_async()
+
+    assert asyncio.run(stream()) == ["Game 0", "Game 1", "Game 2"]
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    """Retries failed queries twice, with short backoffs, for a test."""
+    limiter = HostRateLimiter(0)
+    monkeypatch.setattr(retry, "_policy", RetryPolicy(max_retries=2, base_delay=0.01))
+    monkeypatch.setattr(retry, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(extract_epic, "get_rate_limiter", lambda: limiter)
+
+
+@pytest.mark.parametrize("faults, requests_sent", [
+    ([503], 2), ([429, 502], 3), ([RESET], 2)
+])
+def test_failed_queries_are_retried(fast_retries, faults, requests_sent):
+    """Tests that a failed page of listings is queried again on its own."""
+    received = []
+    pages = {"/graphql": make_search_store([make_listing(i) for i in range(3)])}
+    with serve_pages(pages, received=received, faults={"/graphql": faults}) as base_url:
+        with patch("extract_epic.EPIC_URL", f"{base_url}/graphql"):
+            listings = process_listings(day=datetime(2026, 10, 18))
+    assert len(listings["listings"]) == 3
+    assert len(received) == requests_sent
+
+
+def test_queries_fail_once_the_retries_run_out(fast_retries):
+    pages = {"/graphql": make_search_store([make_listing(0)])}
+    with serve_pages(pages, faults={"/graphql": [500] * 3}) as base_url:
+        with patch("extract_epic.EPIC_URL", f"{base_url}/graphql"):
+            with pytest.raises(TransportServerError):
+                process_listings(day=datetime(2026, 10, 18))
@@ -0,0 +1,65 @@
+"""Benchmarks reading a product page's details rows through a label index
+against scanning the rows once per field, over saved GOG product pages,
+for every installed HTML parser backend.
+
+Run with `PYTHONPATH=../shared python3 benchmark_extraction.py [directory of saved pages]`.
+Defaults to the pages in `fixtures/`."""
+
+from pathlib import Path
+from sys import argv
+from timeit import repeat
+
+from html_parsing import BACKENDS, HtmlNode, backend_is_installed, parse_html
+from scrape_gog_game import LABEL_CLASS, ITEM_CLASS, get_row_links, get_row_text, index_rows
+
+RUNS = 5
+ITERATIONS = 200
+DETAILS_ROWS = 'div[class="table__row details__row"]'
+RATING_ROWS = 'div[class="table__row details__rating details__row"]'
+
+
+def scan_rows(rows: list[HtmlNode], required_label: str, are_links: bool):
+    """The previous extraction: scans the rows until a label matches."""
+    for row in rows:
+        row_label = row.select_one(f'div[class="{LABEL_CLASS}"]').text
+        if required_label in row_label.lower():
+            if not are_links:
+                return row.select_one(f'div[class="{ITEM_CLASS}"]').text.strip()
+            return [link.text for link in row.select("a")]
+    return []
+
+
+def per_field_scans(page: HtmlNode) -> tuple:
+    """Reads the four row fields with one scan of the rows each."""
+    details_rows = page.select(DETAILS_ROWS)
+    rating_rows = page.select(RATING_ROWS)
+    return (scan_rows(details_rows, "genre", True), scan_rows(details_rows, "tag", True),
+            scan_rows(rating_rows, "works", False), scan_rows(rating_rows, "release", False))
+
+
+def indexed_lookups(page: HtmlNode) -> tuple:
+    """Reads the four row fields from one index of each set of rows."""
+    details = index_rows(page.select(DETAILS_ROWS))
+    ratings = index_rows(page.select(RATING_ROWS))
+    return (get_row_links(details, "genre"), get_row_links(details, "tag"),
+            get_row_text(ratings, "work"), get_row_text(ratings, "release"))
+
+
+def best_time_per_page(extract, page: HtmlNode) -> float:
+    """Returns the best time taken to extract one page, in milliseconds."""
+    return min(repeat(lambda: extract(page), number=ITERATIONS, repeat=RUNS)) / ITERATIONS * 1000
+
+
+if __name__ == "__main__":
+    page_directory = Path(argv[1]) if len(argv) > 1 else Path(__file__).parent / "fixtures"
+    backends = [backend for backend in BACKENDS if backend_is_installed(backend)]
+    print(f"{'page':<30} | {'backend':<11} | {'per-field':>9} | {'indexed':>8} | speed-up")
+    for path in sorted(page_directory.glob("game_*.html")):
+        for backend in backends:
+            page = parse_html(path.read_text(encoding="utf_8"), backend)
+            if per_field_scans(page) != indexed_lookups(page):
+                raise ValueError(f"The extractions disagree on {path.name} with {backend}.")
+            before = best_time_per_page(per_field_scans, page)
+            after = best_time_per_page(indexed_lookups, page)
+            print(f"{path.name:<30} | {backend:<11} | {before:>7.3f}ms | "
+                  f"{after:>6.3f}ms | {before / after:>7.1f}x")
@@ -0,0 +1,103 @@
+"""Reads GOG's games from its catalogue and product JSON APIs.
+
+One request to the catalogue API returns a page of games, newest first,
+with everything but their descriptions; one request to the product API then
+returns the descriptions of the whole page. This replaces downloading and
+parsing one product page per game."""
+
+from collections.abc import Iterator
+from datetime import datetime
+from itertools import count
+from json import loads
+
+from html_parsing import parse_html
+
+from scrape_gog_game import format_price, get_html
+
+GOG_CATALOG_URL = "https://catalog.gog.com/v1/catalog"
+GOG_PRODUCTS_URL = "https://api.gog.com/products"
+CATALOG_PAGE_SIZE = 48
+OPERATING_SYSTEMS = {
+    "windows": "Windows",
+    "osx": "Mac",
+    "linux": "Linux"
+}
+ADULT_AGE_RATING = 18
+
+
+def get_catalog_url(page_number: int, start_date: datetime, end_date: datetime) -> str:
+    """Returns the URL of a page of the catalogue API, newest first,
+    limited to the years between two dates."""
+    return (f"{GOG_CATALOG_URL}?limit={CATALOG_PAGE_SIZE}&order=desc:releaseDate"
+            f"&productType=in:game,pack&releaseDateRange={start_date.year},{end_date.year}"
+            f"&countryCode=GB&currencyCode=GBP&locale=en-GB&page={page_number}")
+
+
+def get_products_url(product_ids: list[str]) -> str:
+    """Returns the URL of the product API for a batch of games, with
+    their descriptions."""
+    return f"{GOG_PRODUCTS_URL}?ids={','.join(product_ids)}&expand=description&locale=en-GB"
+
+
+def get_json(url: str):
+    """Returns the parsed JSON body of a URL."""
+    return loads(get_html(url))
+
+
+def iter_catalog_products(start_date: datetime, end_date: datetime) -> Iterator[list[dict]]:
+    """Lazily yields each page of the catalogue between the years of two
+    dates, as a list of products, until the last page."""
+    for page_number in count(1):
+        catalog = get_json(get_catalog_url(page_number, start_date, end_date))
+        if not catalog["products"]:
+            return
+        yield catalog["products"]
+        if page_number >= catalog["pages"]:
+            return
+
+
+def get_descriptions(product_ids: list[str]) -> dict[str, str]:
+    """Returns the text of each game's description, by product ID, in one
+    request. Games the API has no description for are left out."""
+    descriptions = {}
+    for product in get_json(get_products_url(product_ids)):
+        full_description = (product.get("description") or {}).get("full")
+        if full_description:
+            descriptions[str(product["id"])] = parse_html(full_description).text.strip()
+    return descriptions
+
+
+def parse_release_date(product: dict) -> datetime:
+    """Returns the date a game was released."""
+    return datetime.strptime(product["releaseDate"], "%Y.%m.%d")
+
+
+def parse_operating_systems(product: dict) -> list[str]:
+    """Returns the operating systems a game runs on, in the same order as
+    `scrape_gog_game.format_os`."""
+    return [name for key, name in OPERATING_SYSTEMS.items() if key in product["operatingSystems"]]
+
+
+def is_adult_rated(product: dict) -> bool:
+    """Is a game rated for adults only by any of its age ratings? The
+    catalogue does not say whether GOG shows a game's "not appropriate for
+    all ages" warning, which the product pages are checked for instead, so
+    a game with the warning but no adult rating is not NSFW here."""
+    return any(str(rating.get("ageRating", "")).isdigit()
+               and int(rating["ageRating"]) >= ADULT_AGE_RATING
+               for rating in product.get("ratings") or [])
+
+
+def parse_product(product: dict, description: str) -> dict:
+    """Returns a game's details from its catalogue entry and its
+    description, in the same format as `scrape_gog_game.get_game_data_from_url`."""
+    return {"title": product["title"],
+            "description": description,
+            "img_url": product["coverHorizontal"],
+            "genres": [genre["name"] for genre in product["genres"]],
+            "is_nsfw": is_adult_rated(product),
+            "tags": [tag["name"] for tag in product["tags"]],
+            "operating_systems": parse_operating_systems(product),
+            "current_price": format_price(product["price"]["finalMoney"]["amount"]),
+            "release_date": parse_release_date(product),
+            "url": product["storeLink"]}
@@ -3,13 +3,43 @@
 from datetime import datetime
 from json import dumps
 
-from scrape_gog import get_games_for_the_day
+from http_client import get_connection_stats
+from listing_stream import is_streaming, stream_listings
+import page_cache
+import parse_memo
+from retry import get_retry_stats
+from watermark import load_watermark, stage_watermark
+from scrape_gog import get_games_for_the_day, iter_games
 
 
 def lambda_handler(event, context):  # pylint: disable=W0613
-    """The main Lambda function"""
-
-    games_list = dumps(get_games_for_the_day(datetime.today()))
+    """The main Lambda function. Scrapes today's releases, or backfills
+    every day between the optional 'start_date' and 'end_date' arguments
+    passed in the event, formatted as YYYY-MM-DD. When streaming, the
+    games are written to a file and only its location is returned. The
+    optional 'watermark' argument, 'use', 'ignore' or 'reset', says whether
+    games already scraped are skipped. The watermark is staged last, for the
+    loader to commit once the games are loaded."""
+    event = event or {}
+    start_date, end_date = datetime.today(), None
+    if event.get("start_date"):
+        start_date = datetime.fromisoformat(event["start_date"])
+        end_date = datetime.fromisoformat(event.get("end_date", event["start_date"]))
+    watermark = load_watermark("gog", event.get("watermark"))
+    if is_streaming():
+        games_list = dumps(stream_listings(
+            "gog", iter_games(start_date, end_date, watermark=watermark)))
+    else:
+        games_list = dumps(get_games_for_the_day(start_date, end_time=end_date,
+                                                 watermark=watermark))
+    page_cache.evict()
+    parse_memo.evict()
+    print(f"HTTP connections: {get_connection_stats()}")
+    print(f"Retries: {get_retry_stats()}")
+    print(f"Page cache: {page_cache.get_page_cache_stats()}")
+    print(f"Parse memo: {parse_memo.get_parse_memo_stats()}")
+    print(f"Watermark: {watermark.get_stats()}")
+    stage_watermark(watermark)
 
     return {
         "statusCode": 200,
@@ -1,44 +1,175 @@
 """Script to scrape the latest games from GOG."""
 
+from os import environ as ENV
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from datetime import datetime
+from itertools import count, islice
+from threading import Event
+import logging
 
-from bs4 import BeautifulSoup
+import requests as req
 
+from html_parsing import parse_html
+
+from watermark import Watermark
+
+from gog_api import get_descriptions, iter_catalog_products, parse_product, parse_release_date
 from scrape_gog_game import get_game_data_from_url, get_html
 
-BASE_URL = "https://www.gog.com/en/games?releaseStatuses=new-arrival&order=desc:releaseDate&hideDLCs=true&releaseDateRange=2024,2024&page="  # pylint: disable=C0301
+MAX_WORKERS = int(ENV.get("GOG_MAX_WORKERS", "8"))
+# The APIs have no field for the product pages' NSFW warning, so they can
+# mark games NSFW differently; the pages stay the default until they agree.
+DATA_SOURCE = ENV.get("GOG_DATA_SOURCE", "html")
+DATA_SOURCES = ["api", "html"]
+GOG_GAMES_URL = "https://www.gog.com/en/games"
+
+logger = logging.getLogger(__name__)
+
+
+def get_catalogue_url(page_number: int, start_date: datetime, end_date: datetime) -> str:
+    """Returns the URL of a page of the catalogue, newest first, limited
+    to the years between two dates."""
+    return (f"{GOG_GAMES_URL}?releaseStatuses=new-arrival&order=desc:releaseDate"
+            f"&hideDLCs=true&releaseDateRange={start_date.year},{end_date.year}"
+            f"&page={page_number}")
 
 
 def get_game_urls_from_page(page_html: str) -> list[str]:
     """Given a page, returns a list of all game URLs in that page."""
-    soup = BeautifulSoup(page_html, "html.parser")
-    links = soup.find_all("a", {"class": "product-tile"})
+    page = parse_html(page_html)
+    links = page.select("a.product-tile")
     return [link.get("href") for link in links]
 
 
-def get_games_for_the_day(day_time: datetime = datetime.today(),
-                          page_number: int = 1) -> dict:
-    """Get all of the details of the games for a given day."""
+def iter_game_urls(start_date: datetime, end_date: datetime) -> Iterator[str]:
+    """Lazily yields the URL of every game in the catalogue between the
+    years of two dates, newest first, downloading one page at a time. Stops
+    at the first page without any new games."""
+    seen = set()
+    for page_number in count(1):
+        page_urls = [url for url in get_game_urls_from_page(
+            get_html(get_catalogue_url(page_number, start_date, end_date))) if url not in seen]
+        if not page_urls:
+            return
+        seen.update(page_urls)
+        yield from page_urls
+
+
+def iter_game_details(game_urls: Iterable[str], max_workers: int = None) -> Iterator[dict]:
+    """Yields the details of each game, in listing order. The product pages
+    are fetched concurrently by `max_workers` threads, with one more queued
+    behind them; another is queued as each one is consumed. Closing the
+    iterator cancels the queued page, and no page not yet started is
+    fetched after that."""
+    max_workers = max_workers or MAX_WORKERS
+    game_urls = iter(game_urls)
+    stopped = Event()
 
-    day = day_time.date()
+    def fetch(game_url: str) -> dict:
+        if stopped.is_set():
+            return None
+        return get_game_data_from_url(game_url)
 
-    url = BASE_URL + str(page_number)
-    html = get_html(url)
-    game_urls = get_game_urls_from_page(html)
-    game_details_list = []
-    for game_url in game_urls:
-        game_details = get_game_data_from_url(game_url)
-        if game_details["release_date"].date() < day:
-            break
-        if game_details["release_date"].date() == day:
+    executor = ThreadPoolExecutor(max_workers)
+    try:
+        queued = deque(executor.submit(fetch, game_url)
+                       for game_url in islice(game_urls, max_workers + 1))
+        while queued:
+            game_details = queued.popleft().result()
+            queued.extend(executor.submit(fetch, game_url) for game_url in islice(game_urls, 1))
+            yield game_details
+    finally:
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_api_game_details(start_date: datetime, end_date: datetime,
+                          watermark: Watermark = None) -> Iterator[dict]:
+    """Yields the details of each game from GOG's catalogue and product
+    APIs, newest first, with two requests per page of the catalogue. Games
+    the product API has no description for have their product page scraped.
+    Games the watermark has already seen are skipped before their
+    descriptions are requested."""
+    for page in iter_catalog_products(start_date, end_date):
+        products = page
+        if watermark is not None:
+            products = [product for product in page
+                        if not watermark.has_seen(product["storeLink"])]
+            if not products:
+                if parse_release_date(page[-1]).date() < start_date.date():
+                    return
+                continue
+        descriptions = get_descriptions([str(product["id"]) for product in products])
+        for product in products:
+            description = descriptions.get(str(product["id"]))
+            if description is None:
+                yield get_game_data_from_url(product["storeLink"])
+            else:
+                yield parse_product(product, description)
+
+
+def iter_timely_games(games: Iterator[dict], start_date: datetime,
+                      end_date: datetime) -> Iterator[dict]:
+    """Yields the games released between two dates, inclusive, with their
+    release dates formatted. The games are newest first, so no more are
+    read once a game released before the start date is found."""
+    for game_details in games:
+        release_date = game_details["release_date"].date()
+        if release_date < start_date.date():
+            return
+        if release_date <= end_date.date():
             game_details["release_date"] = datetime.strftime(
                 game_details["release_date"],
                 "%d/%m/%Y")
-            game_details_list.append(game_details)
+            yield game_details
+
+
+def iter_games(start_date: datetime, end_date: datetime = None, max_workers: int = None,
+               source: str = None, watermark: Watermark = None) -> Iterator[dict]:
+    """Lazily yields the details of every game released between two dates,
+    inclusive, read from the chosen data source. If GOG's APIs fail, the
+    games not yet yielded are scraped from the product pages instead. Games
+    the watermark has already seen are skipped, and the rest recorded in it."""
+    end_date = end_date or start_date
+    source = source or DATA_SOURCE
+    if source not in DATA_SOURCES:
+        raise ValueError(f"Unknown GOG data source: {source}.")
+    yielded = set()
+    if source == "api":
+        try:
+            for game_details in iter_timely_games(
+                    iter_api_game_details(start_date, end_date, watermark),
+                    start_date, end_date):
+                yielded.add(game_details["url"])
+                if watermark is not None:
+                    watermark.record_game(game_details)
+                yield game_details
+            return
+        except (ConnectionError, req.RequestException, ValueError, KeyError, TypeError) as error:
+            logger.warning("GOG's APIs failed, scraping product pages instead: %s", error)
+    game_urls = iter_game_urls(start_date, end_date)
+    if watermark is not None:
+        game_urls = (game_url for game_url in game_urls if not watermark.has_seen(game_url))
+    with closing(iter_game_details(game_urls, max_workers)) as games:
+        for game_details in iter_timely_games(games, start_date, end_date):
+            if game_details["url"] not in yielded:
+                if watermark is not None:
+                    watermark.record_game(game_details)
+                yield game_details
+
 
+def get_games_for_the_day(day_time: datetime = None, max_workers: int = None,
+                          end_time: datetime = None, source: str = None,
+                          watermark: Watermark = None) -> dict:
+    """Get all of the details of the games for a given day, or for every
+    day up to `end_time` when backfilling."""
+    day_time = day_time or datetime.today()
     return {
         "platform": "gog",
-        "listings": game_details_list
+        "listings": list(iter_games(day_time, end_time, max_workers, source, watermark))
     }
 
 
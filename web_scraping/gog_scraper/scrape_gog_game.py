@@ -1,20 +1,27 @@
 """This script is for extracting all of the details of a single game on GOG."""
 
 from datetime import datetime
-from urllib.request import urlopen
 import logging
 
-from bs4 import BeautifulSoup
+import page_cache
+from html_parsing import HtmlNode, parse_html
+from parse_memo import memoized
+
+# Bump whenever the extracted details change, to invalidate memoized pages.
+EXTRACTOR_VERSION = 1
+LABEL_CLASS = "details__category table__row-label"
+ITEM_CLASS = "details__content table__row-content"
 
 logger = logging.getLogger(__name__)
 
 
 def get_html(url: str) -> str:
-    """Return the html file of a given url."""
-    with urlopen(url) as page:
-        html_bytes = page.read()
-        html = html_bytes.decode("utf_8")
-        return html
+    """Return the html file of a given url, from the page cache if it has
+    not changed."""
+    response = page_cache.get(url)
+    response.raise_for_status()
+    html = response.content.decode("utf_8")
+    return html
 
 
 def format_price(price_str: str) -> int:
@@ -24,12 +31,11 @@ def format_price(price_str: str) -> int:
     return int(float(price_str)*100)
 
 
-def find_price(price_div) -> int:
+def find_price(price_div: HtmlNode) -> int:
     """Given a div containing a game's price, finds said price."""
-    price_str = price_div.find("span", {"selenium-id": "ProductFinalPrice"})
+    price_str = price_div.select_one('span[selenium-id="ProductFinalPrice"]')
     if not price_str:
-        price_str = price_div.find("span", {"class":
-                                            "product-actions-price__final-amount"})
+        price_str = price_div.select_one("span.product-actions-price__final-amount")
     if not price_str:
         raise ValueError("The price is somewhere else!")
     return format_price(price_str.text)
@@ -46,25 +52,46 @@ def format_os(os_string: str) -> str:
     return operating_systems
 
 
-def extract_data_from_rows(rows: list[str], label_class: str, required_label: str,
-                           item_class: str = None, are_links: bool = False):
+def normalise_label(label: str) -> str:
+    """Reduces a row's label to the singular of its first word, in lower
+    case, so that 'Works on:' becomes 'work' and 'Tags:' becomes 'tag'."""
+    words = label.lower().replace(":", " ").split()
+    return words[0].removesuffix("s") if words else ""
+
+
+def index_rows(rows: list[HtmlNode], label_class: str = LABEL_CLASS) -> dict[str, HtmlNode]:
     """Given a list of rows, written in the weird style of GOG's HTML,
-        return only the items we're looking for."""
+        maps each row's normalised label to the row, in one pass.
+        The first row with a label wins, and rows without one are skipped."""
+    index = {}
     for row in rows:
-        row_label = row.find(
-            "div", {"class": label_class}).text
-        if required_label in row_label.lower():
-            if not are_links:
-                return row.find("div", {"class": item_class}).text.strip()
-            links = row.find_all("a")
-            return [link.text for link in links]
-    return []
+        label = row.select_one(f'div[class="{label_class}"]')
+        if label is None:
+            continue
+        index.setdefault(normalise_label(label.text), row)
+    return index
+
+
+def get_row_links(index: dict[str, HtmlNode], label: str) -> list[str]:
+    """Returns the text of every link in the row with a label."""
+    row = index.get(label)
+    if row is None:
+        return []
+    return [link.text for link in row.select("a")]
+
+
+def get_row_text(index: dict[str, HtmlNode], label: str, item_class: str = ITEM_CLASS):
+    """Returns the text of the content of the row with a label."""
+    row = index.get(label)
+    if row is None:
+        return []
+    return row.select_one(f'div[class="{item_class}"]').text.strip()
 
 
-def has_nsfw_warning(game_page) -> bool:
+def has_nsfw_warning(game_page: HtmlNode) -> bool:
     """Does this game have a NSFW warning?"""
 
-    modules = game_page.find_all("p", {"class": "module"})
+    modules = game_page.select("p.module")
 
     if len(modules) == 0:
         return False
@@ -80,42 +107,34 @@ def get_game_data_from_url(game_url: str) -> dict:
     """Given a game's URL, returns all of its relevant data.
         The only thing that needs processing afterwards is the release date."""
     logging.basicConfig(filename='myapp.log', level=logging.INFO)
-    soup = BeautifulSoup(get_html(game_url), "html.parser")
-    title = soup.find(
-        "h1", {"class": "productcard-basics__title"}).text.strip()
-    description = soup.find(
-        "div", {"class": "description"}).text.strip()
-    image_url = soup.find("img", {"class": "mobile-slider__image"}).get("src")
-    price_div = soup.find("div", {"selenium-id":
-                                  "ProductActionsBody"})
+    return {**get_game_data_from_html(get_html(game_url)), "url": game_url}
+
+
+@memoized("gog-game-page", EXTRACTOR_VERSION)
+def get_game_data_from_html(html: str) -> dict:
+    """Given a game's page, returns all of its relevant data but its URL.
+        A page identical to one already parsed is not parsed again."""
+    page = parse_html(html)
+    title = page.select_one(
+        "h1.productcard-basics__title").text.strip()
+    description = page.select_one(
+        "div.description").text.strip()
+    image_url = page.select_one("img.mobile-slider__image").get("src")
+    price_div = page.select_one('div[selenium-id="ProductActionsBody"]')
     current_price = find_price(price_div)
-    details_rows = soup.find_all("div", {"class": "table__row details__row"})
-    genres = extract_data_from_rows(details_rows,
-                                    label_class="details__category table__row-label",
-                                    required_label="genre", are_links=True)
-
-    is_nsfw = has_nsfw_warning(soup)
-    tags = extract_data_from_rows(details_rows,
-                                  label_class="details__category table__row-label",
-                                  required_label="tag", are_links=True)
-    rating_rows = soup.find_all(
-        "div", {"class": "table__row details__rating details__row"})
-    operating_systems = extract_data_from_rows(rows=rating_rows,
-                                               label_class="details__category table__row-label",
-                                               required_label="works",
-                                               item_class="details__content table__row-content",
-                                               are_links=False)
-    release_date = extract_data_from_rows(rows=rating_rows,
-                                          label_class="details__category table__row-label",
-                                          required_label="release",
-                                          item_class="details__content table__row-content",
-                                          are_links=False)
-    operating_systems = format_os(operating_systems)
+    details = index_rows(page.select('div[class="table__row details__row"]'))
+    genres = get_row_links(details, "genre")
+
+    is_nsfw = has_nsfw_warning(page)
+    tags = get_row_links(details, "tag")
+    ratings = index_rows(page.select('div[class="table__row details__rating details__row"]'))
+    operating_systems = format_os(get_row_text(ratings, "work"))
+    release_date = get_row_text(ratings, "release")
     try:
         release_date = datetime.strptime(release_date[3:13],
                                          "%Y-%m-%d")
     except TypeError:
-        logger.info(f"The input to strptime was {release_date}")
+        logger.info("The input to strptime was %s", release_date)
     return {"title": title,
             "description": description,
             "img_url": image_url,
@@ -124,5 +143,4 @@ def get_game_data_from_url(game_url: str) -> dict:
             "tags": tags,
             "operating_systems": operating_systems,
             "current_price": current_price,
-            "release_date": release_date,
-            "url": game_url}
+            "release_date": release_date}
@@ -1,9 +1,27 @@
 # pylint: skip-file
 
+from datetime import datetime
+from pathlib import Path
+from threading import Event, Lock
+from time import sleep
+from unittest import mock
+import json
+from urllib.parse import parse_qs, urlsplit
+
 import pytest
-from bs4 import BeautifulSoup
-from scrape_gog_game import format_os, format_price, find_price
-from scrape_gog import get_game_urls_from_page
+import requests
+import parse_memo
+import retry
+import scrape_gog_game
+from gog_api import GOG_CATALOG_URL, GOG_PRODUCTS_URL, get_catalog_url, is_adult_rated
+from html_parsing import parse_html
+from scrape_gog_game import (format_os, format_price, find_price, get_game_data_from_url,
+                             has_nsfw_warning, normalise_label, index_rows, get_row_links,
+                             get_row_text)
+from scrape_gog import (get_game_urls_from_page, get_games_for_the_day, get_catalogue_url,
+                        iter_game_details, iter_games, GOG_GAMES_URL)
+from stub_server import serve_pages
+from watermark import Watermark
 
 
 @pytest.mark.parametrize("html, expected", [
@@ -24,15 +42,14 @@ def test_get_game_urls_from_page(html, expected):
     ('<div><span class="product-actions-price__final-amount">1999.00</span></div>', 199900),
 ])
 def test_find_price(html, expected):
-    soup = BeautifulSoup(html, 'html.parser')
-    assert find_price(soup) == expected
+    page = parse_html(html)
+    assert find_price(page) == expected
 
 
 def test_find_price_raises_error():
-    soup = BeautifulSoup(
-        '<div><span class="no-price-here"></span></div>', 'html.parser')
+    page = parse_html('<div><span class="no-price-here"></span></div>')
     with pytest.raises(ValueError, match="The price is somewhere else!"):
-        find_price(soup)
+        find_price(page)
 
 
 @pytest.mark.parametrize("os_string,os",
@@ -54,3 +71,394 @@ def test_format_os(os_string, os):
                           ("1.00", 100)])
 def test_format_price(price_str, price):
     assert format_price(price_str) == price
+
+
+GAME_PAGE = """<h1 class="productcard-basics__title"> Game </h1>
+<div class="description"> A game. </div>
+<img class="mobile-slider__image" src="https://images.gog.com/game.jpg">
+<div selenium-id="ProductActionsBody"><span selenium-id="ProductFinalPrice">9.99</span></div>
+<div class="table__row details__row">
+  <div class="details__category table__row-label">Genre:</div>
+  <div class="details__content table__row-content"><a>Action</a></div>
+</div>
+<div class="table__row details__row">
+  <div class="details__category table__row-label">Tags:</div>
+  <div class="details__content table__row-content"><a>Indie</a><a>Retro</a></div>
+</div>
+<div class="table__row details__rating details__row">
+  <div class="details__category table__row-label">Works on:</div>
+  <div class="details__content table__row-content">Windows (10, 11), Linux</div>
+</div>
+<div class="table__row details__rating details__row">
+  <div class="details__category table__row-label">Release date:</div>
+  <div class="details__content table__row-content">\n  {{'2026-10-18T00:00:00+03:00' | date: 'longDate'}}</div>
+</div>"""
+
+
+@mock.patch("scrape_gog_game.get_html", return_value=GAME_PAGE)
+def test_get_game_data_from_url(mocked_get_html):
+    assert get_game_data_from_url("https://www.gog.com/en/game/game") == {
+        "title": "Game", "description": "A game.",
+        "img_url": "https://images.gog.com/game.jpg", "genres": ["Action"],
+        "is_nsfw": False, "tags": ["Indie", "Retro"],
+        "operating_systems": ["Windows", "Linux"], "current_price": 999,
+        "release_date": datetime(2026, 10, 18), "url": "https://www.gog.com/en/game/game"}
+
+
+def test_get_html_retries_throttled_pages(monkeypatch):
+    """Tests that a product page throttled by GOG is fetched again once
+    its Retry-After has passed."""
+    monkeypatch.setattr(retry, "_policy", retry.RetryPolicy(max_retries=2, base_delay=0.01))
+    received = []
+    faults = {"/en/game/game": [(429, {"Retry-After": "0"}), 502]}
+    with serve_pages({"/en/game/game": GAME_PAGE}, received=received, faults=faults) as base_url:
+        assert scrape_gog_game.get_html(f"{base_url}/en/game/game") == GAME_PAGE
+    assert len(received) == 3
+
+
+@mock.patch("scrape_gog_game.get_html", return_value=GAME_PAGE)
+def test_identical_pages_are_parsed_once(mocked_get_html, monkeypatch):
+    monkeypatch.setenv("PARSE_MEMO_BACKEND", "memory")
+    monkeypatch.setattr(parse_memo, "_memo", None)
+    before = parse_memo.get_parse_memo_stats()
+    first = get_game_data_from_url("https://www.gog.com/en/game/game")
+    with mock.patch("scrape_gog_game.parse_html") as mocked_parse_html:
+        second = get_game_data_from_url("https://www.gog.com/en/game/game")
+    after = parse_memo.get_parse_memo_stats()
+
+    assert first == second
+    mocked_parse_html.assert_not_called()
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+FIXTURE_DAY = datetime(2026, 10, 18)
+
+
+class RecordedGOG:
+    """Replays the saved GOG pages in `fixtures/`, after a delay, recording
+    which were requested and how many were being fetched at once."""
+
+    def __init__(self, latency: float = 0.01):
+        self.latency = latency
+        self.lock = Lock()
+        self.requested = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.games_in_flight = 0
+        self.most_games_in_flight = 0
+        self.products = json.loads((FIXTURES / "products.json").read_text(encoding="utf_8"))
+
+    def get_html(self, url: str) -> str:
+        is_game = url.startswith("https://www.gog.com/en/game/")
+        with self.lock:
+            self.requested.append(url)
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+            self.games_in_flight += is_game
+            self.most_games_in_flight = max(self.most_games_in_flight, self.games_in_flight)
+        sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+            self.games_in_flight -= is_game
+        query = parse_qs(urlsplit(url).query)
+        if url.startswith(GOG_CATALOG_URL):
+            return (FIXTURES / f"catalog_page_{query['page'][0]}.json").read_text(encoding="utf_8")
+        if url.startswith(GOG_PRODUCTS_URL):
+            ids = query["ids"][0].split(",")
+            return json.dumps([product for product in self.products if str(product["id"]) in ids])
+        if url.startswith(GOG_GAMES_URL):
+            page = FIXTURES / f"new_arrivals_page_{query['page'][0]}.html"
+            return page.read_text(encoding="utf_8") if page.exists() else "<html></html>"
+        return (FIXTURES / f"game_{url.rsplit('/', 1)[1]}.html").read_text(encoding="utf_8")
+
+
+    def game_requests(self) -> list[str]:
+        return [url for url in self.requested if url.startswith("https://www.gog.com/en/game/")]
+
+    def api_requests(self) -> list[str]:
+        return [url for url in self.requested if url.startswith((GOG_CATALOG_URL, GOG_PRODUCTS_URL))]
+
+    def catalogue_requests(self) -> list[str]:
+        return [url for url in self.requested if url.startswith(GOG_GAMES_URL)]
+
+
+def scrape_fixtures(max_workers: int, gog: RecordedGOG = None, day: datetime = FIXTURE_DAY,
+                    end_day: datetime = None, source: str = "html",
+                    watermark: Watermark = None) -> dict:
+    gog = gog or RecordedGOG()
+    with mock.patch("scrape_gog.get_html", gog.get_html), \
+            mock.patch("scrape_gog_game.get_html", gog.get_html), \
+            mock.patch("gog_api.get_html", gog.get_html):
+        return get_games_for_the_day(day, max_workers=max_workers, end_time=end_day, source=source,
+                                     watermark=watermark)
+
+
+def test_get_games_for_the_day_on_fixtures():
+    games = scrape_fixtures(max_workers=1)
+    assert games["platform"] == "gog"
+    assert [game["title"] for game in games["listings"]] == [
+        "The Long Harvest", "Crypt of Ash", "Paper Pilots"]
+    assert {game["release_date"] for game in games["listings"]} == {"18/10/2026"}
+
+
+@pytest.mark.parametrize("max_workers", [2, 3, 4, 8, 16])
+def test_concurrent_scrape_matches_sequential_output(max_workers):
+    assert scrape_fixtures(max_workers) == scrape_fixtures(max_workers=1)
+
+
+def test_product_pages_are_fetched_concurrently():
+    gog = RecordedGOG()
+    scrape_fixtures(4, gog)
+    assert gog.most_games_in_flight == 4
+
+
+@pytest.mark.parametrize("max_workers, last_started", [(1, 6), (2, 7), (4, 7), (8, 7)])
+def test_few_pages_are_started_after_an_older_game(max_workers, last_started):
+    """Tests that once the fifth game, the first older than the day, is
+    read, at most one page per worker has been started after it."""
+    gog = RecordedGOG()
+    scrape_fixtures(max_workers, gog)
+    game_urls = [f"https://www.gog.com/en/game/{slug}" for slug in
+                 ["starfall-tactics", "the-long-harvest", "crypt-of-ash", "paper-pilots",
+                  "iron-meridian", "lantern-keeper", "moonlit-atlas"]]
+    assert set(game_urls[:5]) <= set(gog.game_requests()) <= set(game_urls[:last_started])
+
+
+def test_closing_the_details_stops_queued_pages():
+    """Tests that pages queued behind busy workers are never fetched once
+    the details stop being read."""
+    started = []
+    release = Event()
+
+    def get_game_data(game_url):
+        started.append(game_url)
+        if game_url != "0":
+            release.wait(1)
+        return {"url": game_url}
+
+    with mock.patch("scrape_gog.get_game_data_from_url", get_game_data):
+        details = iter_game_details((str(i) for i in range(20)), max_workers=2)
+        assert next(details) == {"url": "0"}
+        sleep(0.05)
+        details.close()
+        release.set()
+        sleep(0.05)
+    assert sorted(started) == ["0", "1", "2"]
+
+
+@pytest.mark.parametrize("day, end_day, titles", [
+    (datetime(2026, 10, 16), datetime(2026, 10, 18),
+     ["The Long Harvest", "Crypt of Ash", "Paper Pilots", "Iron Meridian", "Lantern Keeper"]),
+    (datetime(2026, 10, 15), datetime(2026, 10, 15), ["Moonlit Atlas"]),
+    (datetime(2026, 10, 15), datetime(2026, 10, 30),
+     ["Starfall Tactics", "The Long Harvest", "Crypt of Ash", "Paper Pilots", "Iron Meridian",
+      "Lantern Keeper", "Moonlit Atlas"]),
+    (datetime(2026, 10, 1), None, [])
+])
+def test_backfill_covers_every_day_in_one_crawl(day, end_day, titles):
+    games = scrape_fixtures(4, day=day, end_day=end_day)
+    assert [game["title"] for game in games["listings"]] == titles
+
+
+def test_catalogue_pages_are_fetched_until_the_day_is_passed():
+    gog = RecordedGOG()
+    scrape_fixtures(1, gog, day=datetime(2026, 10, 17))
+    # Queueing another game once the day is passed reads on to the third
+    # page, which is empty.
+    assert [parse_qs(urlsplit(url).query)["page"] for url in gog.catalogue_requests()] == [
+        ["1"], ["2"], ["3"]]
+
+
+def test_crawl_stops_at_an_empty_page():
+    gog = RecordedGOG()
+    scrape_fixtures(1, gog, day=datetime(2026, 10, 1))
+    assert len(gog.catalogue_requests()) == 3
+    assert len(gog.game_requests()) == 7
+
+
+def test_iter_games_yields_games_one_at_a_time():
+    gog = RecordedGOG()
+    with mock.patch("scrape_gog.get_html", gog.get_html), \
+            mock.patch("scrape_gog_game.get_html", gog.get_html):
+        games = iter_games(FIXTURE_DAY, max_workers=1, source="html")
+        assert next(games)["title"] == "The Long Harvest"
+        assert len(gog.game_requests()) == 3
+        games.close()
+
+
+@pytest.mark.parametrize("start_date, end_date, years", [
+    (datetime(2026, 10, 18), datetime(2026, 10, 18), "2026,2026"),
+    (datetime(2025, 12, 30), datetime(2026, 1, 2), "2025,2026"),
+])
+def test_get_catalogue_url_derives_release_date_range(start_date, end_date, years):
+    query = parse_qs(urlsplit(get_catalogue_url(3, start_date, end_date)).query)
+    assert query["releaseDateRange"] == [years]
+    assert query["page"] == ["3"]
+    assert query["order"] == ["desc:releaseDate"]
+
+
+@pytest.mark.parametrize("day, end_day", [
+    (FIXTURE_DAY, None), (datetime(2026, 10, 16), FIXTURE_DAY),
+    (datetime(2026, 10, 15), datetime(2026, 10, 30)), (datetime(2026, 10, 1), None)
+])
+def test_api_source_matches_product_pages(day, end_day):
+    assert scrape_fixtures(4, day=day, end_day=end_day, source="api") == scrape_fixtures(
+        4, day=day, end_day=end_day, source="html")
+
+
+def test_default_source_keeps_the_page_nsfw_warning():
+    """Tests both sources on a game with the NSFW warning on its page but no
+    adult rating, and that the default source marks it as its page does."""
+    gog = RecordedGOG()
+    real_get_html = gog.get_html
+
+    def get_html(url):
+        page = real_get_html(url)
+        if not url.startswith(GOG_CATALOG_URL):
+            return page
+        catalog = json.loads(page)
+        for product in catalog["products"]:
+            if product["title"] == "Crypt of Ash":
+                product["ratings"] = [{"name": "PEGI", "ageRating": "16"}]
+        return json.dumps(catalog)
+
+    gog.get_html = get_html
+    is_nsfw = {source: {game["title"]: game["is_nsfw"]
+                        for game in scrape_fixtures(4, gog, source=source)["listings"]}
+               for source in ["api", "html", None]}
+    assert not is_nsfw["api"]["Crypt of Ash"]
+    assert is_nsfw["html"]["Crypt of Ash"]
+    assert is_nsfw[None] == is_nsfw["html"]
+
+
+def test_api_source_needs_two_requests_per_catalogue_page():
+    gog = RecordedGOG()
+    scrape_fixtures(4, gog, day=datetime(2026, 10, 16), source="api")
+    assert len(gog.api_requests()) == 4
+    assert gog.game_requests() == []
+
+
+def test_api_source_scrapes_games_without_a_description():
+    gog = RecordedGOG()
+    gog.products[2]["description"] = None
+    games = scrape_fixtures(4, gog, source="api")
+    assert [game["title"] for game in games["listings"]] == [
+        "The Long Harvest", "Crypt of Ash", "Paper Pilots"]
+    assert gog.game_requests() == ["https://www.gog.com/en/game/crypt-of-ash"]
+
+
+def test_api_failure_falls_back_to_product_pages():
+    gog = RecordedGOG()
+    real_get_html = gog.get_html
+
+    def get_html(url):
+        if url.startswith(GOG_CATALOG_URL) and "page=2" in url:
+            raise requests.HTTPError("503 Server Error")
+        return real_get_html(url)
+
+    gog.get_html = get_html
+    games = scrape_fixtures(4, gog, day=datetime(2026, 10, 16), source="api")
+    assert games == scrape_fixtures(4, day=datetime(2026, 10, 16), source="html")
+
+
+@pytest.mark.parametrize("source", ["html", "api"])
+def test_watermarked_games_are_not_fetched_again(source):
+    watermark = Watermark("gog")
+    first = scrape_fixtures(4, source=source, watermark=watermark)
+    assert set(watermark.seen) == {game["url"] for game in first["listings"]}
+    assert watermark.last_release == FIXTURE_DAY
+
+    gog = RecordedGOG()
+    second = scrape_fixtures(4, gog, source=source, watermark=watermark)
+    assert second["listings"] == []
+    assert not set(gog.game_requests()) & set(watermark.seen)
+    seen_ids = {str(product["id"]) for page in FIXTURES.glob("catalog_page_*.json")
+                for product in json.loads(page.read_text(encoding="utf_8"))["products"]
+                if product["storeLink"] in watermark.seen}
+    assert seen_ids
+    for url in gog.requested:
+        if url.startswith(GOG_PRODUCTS_URL):
+            assert not set(parse_qs(urlsplit(url).query)["ids"][0].split(",")) & seen_ids
+
+
+@pytest.mark.parametrize("source", ["html", "api"])
+def test_only_new_games_are_fetched_past_the_watermark(source):
+    watermark = Watermark("gog")
+    scrape_fixtures(4, source=source, watermark=watermark)
+    del watermark.seen["https://www.gog.com/en/game/crypt-of-ash"]
+
+    gog = RecordedGOG()
+    games = scrape_fixtures(4, gog, source=source, watermark=watermark)
+    assert [game["title"] for game in games["listings"]] == ["Crypt of Ash"]
+    assert set(gog.game_requests()) & set(watermark.seen) <= {
+        "https://www.gog.com/en/game/crypt-of-ash"}
+
+
+def test_ignored_watermark_scrapes_everything_again():
+    watermark = Watermark("gog")
+    first = scrape_fixtures(4, watermark=watermark)
+    watermark.skip_seen = False
+    assert scrape_fixtures(4, watermark=watermark) == first
+
+
+@pytest.mark.parametrize("ratings, expected", [
+    ([{"name": "PEGI", "ageRating": "18"}], True),
+    ([{"name": "PEGI", "ageRating": "16"}, {"name": "USK", "ageRating": "18"}], True),
+    ([{"name": "PEGI", "ageRating": "12"}], False),
+    ([{"name": "ESRB", "ageRating": "M"}], False),
+    ([], False), (None, False)
+])
+def test_is_adult_rated(ratings, expected):
+    assert is_adult_rated({"ratings": ratings}) == expected
+
+
+def test_nsfw_signals_differ_between_sources():
+    """Tests that the API only goes by age ratings: a game with GOG's
+    content warning but no adult rating is only NSFW from its product page."""
+    page = parse_html('<p class="module">This game contains content which is '
+                      'not appropriate for all ages.</p>')
+    assert has_nsfw_warning(page)
+    assert not is_adult_rated({"ratings": [{"name": "PEGI", "ageRating": "16"}]})
+
+
+def test_get_catalog_url_derives_release_date_range():
+    query = parse_qs(urlsplit(get_catalog_url(2, datetime(2025, 12, 30), datetime(2026, 1, 2))).query)
+    assert query["releaseDateRange"] == ["2025,2026"]
+    assert query["order"] == ["desc:releaseDate"]
+    assert query["page"] == ["2"]
+
+
+@pytest.mark.parametrize("label, normalised", [
+    ("Genre:", "genre"), ("Genres:", "genre"), ("Tags:", "tag"), (" Works on: ", "work"),
+    ("Release date:", "release"), ("Company:", "company"), ("", "")
+])
+def test_normalise_label(label, normalised):
+    assert normalise_label(label) == normalised
+
+
+def test_index_rows_keeps_first_row_per_label():
+    page = parse_html("""
+    <div class="row"><div class="details__category table__row-label">Tags:</div>
+      <div class="details__content table__row-content"><a>Indie</a></div></div>
+    <div class="row"><div class="details__category table__row-label">Tags:</div>
+      <div class="details__content table__row-content"><a>Retro</a></div></div>
+    <div class="row"><div class="details__category table__row-label">Works on:</div>
+      <div class="details__content table__row-content"> Windows </div></div>""")
+    index = index_rows(page.select("div.row"))
+    assert set(index) == {"tag", "work"}
+    assert get_row_links(index, "tag") == ["Indie"]
+    assert get_row_text(index, "work") == "Windows"
+    assert get_row_links(index, "genre") == []
+    assert get_row_text(index, "release") == []
+
+
+def test_index_rows_skips_unlabelled_rows():
+    page = parse_html("""
+    <div class="row"><div class="details__content table__row-content">No label</div></div>
+    <div class="row"><div class="details__category table__row-label">Genre:</div>
+      <div class="details__content table__row-content"><a>Action</a></div></div>""")
+    index = index_rows(page.select("div.row"))
+    assert set(index) == {"genre"}
+    assert get_row_links(index, "genre") == ["Action"]
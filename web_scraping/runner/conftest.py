@@ -0,0 +1,10 @@
+"""Makes the shared scraper modules and the scrapers themselves importable
+by the tests."""
+
+# pylint: skip-file
+
+import sys
+from pathlib import Path
+
+for folder in ["shared", "steam_scraper", "gog_scraper", "epic_games_scraper"]:
+    sys.path.insert(0, str(Path(__file__).parent.parent / folder))
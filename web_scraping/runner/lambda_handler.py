@@ -0,0 +1,36 @@
+"""Script for the AWS lambda handler."""
+
+from datetime import datetime
+
+from http_client import get_connection_stats
+import page_cache
+import parse_memo
+from retry import get_retry_stats
+from run_scrapers import run_scrapers
+
+# pylint: disable=W0613
+
+
+def lambda_handler(event, context):
+    """Scrapes today's releases on every platform, or backfills every day
+    between the optional 'start_date' and 'end_date' arguments passed in
+    the event, formatted as YYYY-MM-DD. Returns one response per platform,
+    as the transform and load Lambda expects. The optional 'watermark'
+    argument, 'use', 'ignore' or 'reset', says whether games already
+    scraped are skipped."""
+    event = event or {}
+    if event.get("start_date"):
+        start_date = datetime.fromisoformat(event["start_date"])
+        end_date = datetime.fromisoformat(event.get("end_date", event["start_date"]))
+        responses = run_scrapers(start_date, end_date, event.get("platforms"),
+                                 event.get("watermark"))
+    else:
+        responses = run_scrapers(datetime.now(), platforms=event.get("platforms"),
+                                 watermark_mode=event.get("watermark"))
+    page_cache.evict()
+    parse_memo.evict()
+    print(f"HTTP connections: {get_connection_stats()}")
+    print(f"Retries: {get_retry_stats()}")
+    print(f"Page cache: {page_cache.get_page_cache_stats()}")
+    print(f"Parse memo: {parse_memo.get_parse_memo_stats()}")
+    return responses
@@ -0,0 +1,127 @@
+"""Runs the Steam, GOG and Epic Games scrapers concurrently in one process.
+
+Steam and GOG are threaded, so each runs in a worker thread; Epic is async,
+so it runs on the event loop itself. Every request they make goes through
+the same process-wide HTTP session and waits on the same process-wide rate
+limiter. The output is the list of Lambda responses the Step Function's
+parallel scrape state would have produced, ready for the transform and
+load Lambda. With `SCRAPER_OUTPUT=ndjson`, each platform's listings are
+streamed to a file as they are scraped, and only its location is returned.
+Each platform's watermark is loaded before it is scraped and staged once
+every scraper has finished; the loader commits it once the listings are in
+the database."""
+
+from argparse import ArgumentParser
+from datetime import datetime
+from json import dumps, loads
+import asyncio
+
+from extract_epic import close_session_async, get_event_loop, process_listings_async
+from extract_epic import iter_games as iter_epic_games
+from listing_stream import is_streaming, stream_listings
+from scrape_gog import get_games_for_the_day
+from scrape_gog import iter_games as iter_gog_games
+from scrape_steam import collect_and_parse_games
+from scrape_steam import iter_games as iter_steam_games
+from watermark import WATERMARK_MODES, Watermark, load_watermark, stage_watermark
+
+PLATFORMS = ["steam", "gog", "epic"]
+
+
+async def scrape_steam(start_date: datetime, end_date: datetime = None,
+                       watermark: Watermark = None) -> dict:
+    """Scrapes the games released on Steam, in a worker thread."""
+    if is_streaming():
+        return await asyncio.to_thread(lambda: stream_listings(
+            "steam", iter_steam_games(start_date, end_date=end_date, watermark=watermark)))
+    return loads(await asyncio.to_thread(collect_and_parse_games, start_date,
+                                         end_date=end_date, watermark=watermark))
+
+
+async def scrape_gog(start_date: datetime, end_date: datetime = None,
+                     watermark: Watermark = None) -> dict:
+    """Scrapes the games released on GOG, in a worker thread."""
+    if is_streaming():
+        return await asyncio.to_thread(lambda: stream_listings(
+            "gog", iter_gog_games(start_date, end_date, watermark=watermark)))
+    return await asyncio.to_thread(get_games_for_the_day, start_date, end_time=end_date,
+                                   watermark=watermark)
+
+
+async def scrape_epic(start_date: datetime, end_date: datetime = None,
+                      watermark: Watermark = None) -> dict:
+    """Extracts the games released on Epic Games, on the event loop. When
+    streaming, they are written out by a worker thread as they arrive."""
+    if is_streaming():
+        games = iter_epic_games(start_date, end_day=end_date, watermark=watermark,
+                                loop=asyncio.get_running_loop())
+        return await asyncio.to_thread(stream_listings, "epic", games)
+    return await process_listings_async(start_date, end_day=end_date, watermark=watermark)
+
+
+SCRAPERS = {
+    "steam": scrape_steam,
+    "gog": scrape_gog,
+    "epic": scrape_epic
+}
+
+
+def make_response(listings: dict) -> dict:
+    """Returns a platform's listings as its scraper's Lambda would."""
+    return {"statusCode": 200,
+            "body": {
+                "data": dumps(listings)}
+            }
+
+
+async def run_scrapers_async(start_date: datetime = None, end_date: datetime = None,
+                             platforms: list[str] = None,
+                             watermark_mode: str = None) -> list[dict]:
+    """Scrapes the games released on every platform today, or between two
+    days, running the scrapers concurrently. The responses are in the same
+    order as the platforms. The watermark mode, 'use', 'ignore' or 'reset',
+    says whether games already scraped are skipped."""
+    start_date = start_date or datetime.now()
+    platforms = platforms or PLATFORMS
+    for platform in platforms:
+        if platform not in SCRAPERS:
+            raise ValueError(f"Unknown platform: {platform}.")
+    watermarks = [load_watermark(platform, watermark_mode) for platform in platforms]
+    results = await asyncio.gather(*(SCRAPERS[platform](start_date, end_date, watermark)
+                                     for platform, watermark in zip(platforms, watermarks)))
+    responses = [make_response(listings) for listings in results]
+    for watermark in watermarks:
+        stage_watermark(watermark)
+    return responses
+
+
+def run_scrapers(start_date: datetime = None, end_date: datetime = None,
+                 platforms: list[str] = None, watermark_mode: str = None) -> list[dict]:
+    """Runs the scrapers on the process-wide event loop, which Epic's
+    GraphQL session is kept on between runs."""
+    return get_event_loop().run_until_complete(
+        run_scrapers_async(start_date, end_date, platforms, watermark_mode))
+
+
+async def main(start_date: datetime, end_date: datetime, platforms: list[str],
+               watermark_mode: str = None) -> list[dict]:
+    """Runs the scrapers once, closing Epic's session afterwards."""
+    try:
+        return await run_scrapers_async(start_date, end_date, platforms, watermark_mode)
+    finally:
+        await close_session_async()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--start-date", type=datetime.fromisoformat,
+                        help="The first day to scrape, as YYYY-MM-DD (default today).")
+    parser.add_argument("--end-date", type=datetime.fromisoformat,
+                        help="The last day to scrape, as YYYY-MM-DD (default the first day).")
+    parser.add_argument("--platform", action="append", choices=PLATFORMS, dest="platforms",
+                        help="A platform to scrape; can be repeated (default all of them).")
+    parser.add_argument("--watermark", choices=WATERMARK_MODES, default="use",
+                        help="Whether to skip the games already scraped (default use).")
+    args = parser.parse_args()
+    print(dumps(asyncio.run(main(args.start_date, args.end_date, args.platforms,
+                                 args.watermark)), indent=4))
@@ -0,0 +1,127 @@
+"""Tests for the run_scrapers.py file."""
+
+# pylint: skip-file
+
+from datetime import datetime
+from json import dumps, loads
+from time import monotonic, sleep
+from unittest.mock import patch
+import asyncio
+
+import pytest
+
+import run_scrapers
+from lambda_handler import lambda_handler
+from run_scrapers import run_scrapers as run
+
+
+def listings(platform: str, *titles: str) -> dict:
+    return {"platform": platform, "listings": [{"title": title} for title in titles]}
+
+
+@pytest.fixture
+def fake_scrapers():
+    """Replaces each scraper with one taking 0.2s, recording the dates it
+    was called with."""
+    calls = {}
+
+    def steam(start_date, end_date=None, watermark=None):
+        calls["steam"] = (start_date, end_date)
+        sleep(0.2)
+        return dumps(listings("steam", "Steam Game"))
+
+    def gog(start_date, end_time=None, watermark=None):
+        calls["gog"] = (start_date, end_time)
+        sleep(0.2)
+        return listings("gog", "GOG Game")
+
+    async def epic(start_date, end_day=None, watermark=None):
+        calls["epic"] = (start_date, end_day)
+        await asyncio.sleep(0.2)
+        return listings("epic", "Epic Game")
+
+    with patch("run_scrapers.collect_and_parse_games", steam), \
+            patch("run_scrapers.get_games_for_the_day", gog), \
+            patch("run_scrapers.process_listings_async", epic):
+        yield calls
+
+
+def read_payload(event: list[dict]) -> list[dict]:
+    """Reads the responses the way the transform and load Lambda does."""
+    scraped_data = []
+    for output in event:
+        data = output["body"]["data"]
+        if not isinstance(data, dict):
+            data = loads(data)
+        scraped_data.append(data)
+    return scraped_data
+
+
+def test_platforms_are_scraped_concurrently(fake_scrapers):
+    """Tests that the three scrapers run at the same time, in one process."""
+    start = monotonic()
+    responses = run(datetime(2026, 10, 18))
+    assert monotonic() - start < 0.4
+    assert read_payload(responses) == [listings("steam", "Steam Game"),
+                                       listings("gog", "GOG Game"),
+                                       listings("epic", "Epic Game")]
+
+
+def test_responses_match_the_scraper_lambdas(fake_scrapers):
+    """Tests that each platform's response is shaped like its own Lambda's."""
+    for response in run(datetime(2026, 10, 18)):
+        assert response["statusCode"] == 200
+        assert isinstance(response["body"]["data"], str)
+
+
+def test_dates_are_passed_to_every_scraper(fake_scrapers):
+    run(datetime(2026, 10, 1), datetime(2026, 10, 7))
+    assert fake_scrapers == {platform: (datetime(2026, 10, 1), datetime(2026, 10, 7))
+                             for platform in ["steam", "gog", "epic"]}
+
+
+def test_platforms_can_be_chosen(fake_scrapers):
+    responses = run(datetime(2026, 10, 18), platforms=["epic", "steam"])
+    assert [data["platform"] for data in read_payload(responses)] == ["epic", "steam"]
+    assert set(fake_scrapers) == {"epic", "steam"}
+
+
+def test_unknown_platforms_are_rejected(fake_scrapers):
+    with pytest.raises(ValueError):
+        run(datetime(2026, 10, 18), platforms=["itch"])
+    assert fake_scrapers == {}
+
+
+def test_a_failing_scraper_fails_the_run(fake_scrapers):
+    """Tests that a failed scrape is not silently left out of the load."""
+    with patch("run_scrapers.get_games_for_the_day", side_effect=ConnectionError("GOG is down.")):
+        with pytest.raises(ConnectionError):
+            run(datetime(2026, 10, 18))
+
+
+def test_lambda_handler_backfills(fake_scrapers):
+    responses = lambda_handler({"start_date": "2026-10-01", "end_date": "2026-10-03"}, None)
+    assert len(responses) == 3
+    assert fake_scrapers["gog"] == (datetime(2026, 10, 1), datetime(2026, 10, 3))
+
+
+def test_lambda_handler_defaults_to_today(fake_scrapers):
+    responses = lambda_handler({}, None)
+    assert [data["platform"] for data in read_payload(responses)] == ["steam", "gog", "epic"]
+    assert fake_scrapers["steam"][0].date() == datetime.now().date()
+
+
+def test_listings_can_be_streamed(fake_scrapers, monkeypatch, tmp_path):
+    """Tests that, when streaming, each platform's listings are written to a
+    file and only its location is passed on."""
+    monkeypatch.setenv("SCRAPER_OUTPUT", "ndjson")
+    monkeypatch.delenv("SCRAPER_STREAM_BUCKET", raising=False)
+    monkeypatch.setenv("SCRAPER_STREAM_PATH", str(tmp_path))
+    with patch("run_scrapers.iter_steam_games", return_value=iter([{"title": "Steam Game"}])), \
+            patch("run_scrapers.iter_gog_games", return_value=iter([{"title": "GOG Game"}])), \
+            patch("run_scrapers.iter_epic_games", return_value=iter([{"title": "Epic Game"}])):
+        responses = run(datetime(2026, 10, 18))
+    for data, title in zip(read_payload(responses), ["Steam Game", "GOG Game", "Epic Game"]):
+        assert data["count"] == 1
+        with open(data["stream"], encoding="utf_8") as file:
+            assert [loads(line) for line in file] == [{"title": title}]
@@ -0,0 +1,58 @@
+"""Benchmarks each installed HTML parser backend over saved store pages,
+reporting the parse time and the peak memory used per page.
+
+Every page is parsed in a fresh process for each backend, so that the peak
+resident memory (which includes what the C parsers allocate) can be
+measured without the other backends' allocations in the way.
+
+Run with `python3 benchmark_html_parsing.py [directories of saved pages]`.
+Defaults to the saved pages in the scrapers' `fixtures/` folders."""
+
+from pathlib import Path
+from resource import getrusage, RUSAGE_SELF
+from subprocess import run
+from sys import argv, executable
+from timeit import repeat
+import json
+
+from html_parsing import BACKENDS, backend_is_installed, parse_html
+
+DEFAULT_PAGE_DIRECTORIES = [Path(__file__).parent.parent / "steam_scraper" / "fixtures",
+                            Path(__file__).parent.parent / "gog_scraper" / "fixtures"]
+RUNS = 5
+ITERATIONS = 20
+
+
+def measure(page_path: str, backend: str) -> dict:
+    """Parses a page with a backend, returning the best parse time and
+    the growth in peak resident memory while the parsed tree is held."""
+    html = Path(page_path).read_text(encoding="utf_8")
+    parse_html("<html></html>", backend)
+    baseline = getrusage(RUSAGE_SELF).ru_maxrss
+    tree = parse_html(html, backend)
+    peak = getrusage(RUSAGE_SELF).ru_maxrss - baseline
+    del tree
+    best = min(repeat(lambda: parse_html(html, backend), number=ITERATIONS, repeat=RUNS))
+    return {"milliseconds": best / ITERATIONS * 1000, "peak_kb": peak}
+
+
+def measure_in_subprocess(page_path: Path, backend: str) -> dict:
+    """Runs `measure` in a new Python process."""
+    result = run([executable, __file__, "--measure", str(page_path), backend],
+                 capture_output=True, text=True, check=True, cwd=Path(__file__).parent)
+    return json.loads(result.stdout)
+
+
+if __name__ == "__main__":
+    if argv[1:2] == ["--measure"]:
+        print(json.dumps(measure(argv[2], argv[3])))
+    else:
+        directories = [Path(arg) for arg in argv[1:]] or DEFAULT_PAGE_DIRECTORIES
+        pages = [page for directory in directories for page in sorted(directory.glob("*.html"))]
+        backends = [backend for backend in BACKENDS if backend_is_installed(backend)]
+        print(f"{'page':<30} | {'backend':<11} | {'parse time':>10} | peak memory")
+        for page in pages:
+            for backend in backends:
+                stats = measure_in_subprocess(page, backend)
+                print(f"{page.name:<30} | {backend:<11} | {stats['milliseconds']:>8.2f}ms | "
+                      f"{stats['peak_kb']:>8}KB")
@@ -0,0 +1,161 @@
+"""A small HTML parsing layer shared by the scrapers, so that the parser
+doing the work can be chosen with the `HTML_PARSER_BACKEND` environment
+variable.
+
+Every backend returns nodes with the same interface: CSS selection with
+`select`/`select_one`, the node's `text`, its attributes with `get`, and its
+`classes`. The text of <script> and <style> elements is never included,
+matching BeautifulSoup."""
+
+from os import environ as ENV
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from importlib.util import find_spec
+
+import bs4
+
+DEFAULT_BACKEND = "html.parser"
+BACKENDS = {
+    "html.parser": ["bs4"],
+    "lxml": ["lxml", "cssselect"],
+    "selectolax": ["selectolax"]
+}
+HIDDEN_TEXT_ELEMENTS = ["script", "style"]
+
+
+def get_backend() -> str:
+    """Returns the name of the backend chosen by the environment."""
+    backend = ENV.get("HTML_PARSER_BACKEND", DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {backend}.")
+    return backend
+
+
+def backend_is_installed(backend: str) -> bool:
+    """Returns True if every package a backend needs is installed."""
+    return all(find_spec(package) for package in BACKENDS[backend])
+
+
+class HtmlNode(ABC):
+    """An element of a parsed page."""
+
+    @abstractmethod
+    def select(self, selector: str) -> list["HtmlNode"]:
+        """Returns every descendant matching a CSS selector, in document order."""
+
+    @abstractmethod
+    def select_one(self, selector: str) -> "HtmlNode":
+        """Returns the first descendant matching a CSS selector, or None."""
+
+    @property
+    @abstractmethod
+    def text(self) -> str:
+        """Returns all of the text inside the element."""
+
+    @abstractmethod
+    def get(self, attribute: str, default: str = None) -> str:
+        """Returns the value of one of the element's attributes."""
+
+    @property
+    def classes(self) -> list[str]:
+        """Returns the element's classes, in order."""
+        return (self.get("class") or "").split()
+
+
+class SoupNode(HtmlNode):
+    """A node parsed by BeautifulSoup's pure-Python 'html.parser'."""
+
+    def __init__(self, tag: bs4.Tag):
+        self.tag = tag
+
+    def select(self, selector: str) -> list[HtmlNode]:
+        return [SoupNode(tag) for tag in self.tag.select(selector)]
+
+    def select_one(self, selector: str) -> HtmlNode:
+        tag = self.tag.select_one(selector)
+        return SoupNode(tag) if tag is not None else None
+
+    @property
+    def text(self) -> str:
+        return self.tag.text
+
+    def get(self, attribute: str, default: str = None) -> str:
+        value = self.tag.get(attribute, default)
+        return " ".join(value) if isinstance(value, list) else value
+
+
+@lru_cache(maxsize=None)
+def compile_css(selector: str):
+    """Compiles a CSS selector to XPath once per process."""
+    from lxml.cssselect import CSSSelector  # pylint: disable=C0415
+    return CSSSelector(selector)
+
+
+class LxmlNode(HtmlNode):
+    """A node parsed by lxml's C parser, selected with compiled XPath."""
+
+    def __init__(self, element):
+        self.element = element
+
+    def select(self, selector: str) -> list[HtmlNode]:
+        return [LxmlNode(element) for element in compile_css(selector)(self.element)]
+
+    def select_one(self, selector: str) -> HtmlNode:
+        elements = compile_css(selector)(self.element)
+        return LxmlNode(elements[0]) if elements else None
+
+    @property
+    def text(self) -> str:
+        return self.element.text_content()
+
+    def get(self, attribute: str, default: str = None) -> str:
+        return self.element.get(attribute, default)
+
+
+class SelectolaxNode(HtmlNode):
+    """A node parsed by selectolax's C parser, lexbor."""
+
+    def __init__(self, node):
+        self.node = node
+
+    def select(self, selector: str) -> list[HtmlNode]:
+        return [SelectolaxNode(node) for node in self.node.css(selector)]
+
+    def select_one(self, selector: str) -> HtmlNode:
+        node = self.node.css_first(selector)
+        return SelectolaxNode(node) if node is not None else None
+
+    @property
+    def text(self) -> str:
+        return self.node.text(deep=True)
+
+    def get(self, attribute: str, default: str = None) -> str:
+        value = self.node.attributes.get(attribute, default)
+        return "" if value is None and attribute in self.node.attributes else value
+
+
+def parse_with_lxml(html: str) -> HtmlNode:
+    """Parses a page with lxml."""
+    from lxml import etree, html as lxml_html  # pylint: disable=C0415
+    document = lxml_html.document_fromstring(html if html.strip() else "<html></html>")
+    etree.strip_elements(document, *HIDDEN_TEXT_ELEMENTS, with_tail=False)
+    return LxmlNode(document)
+
+
+def parse_with_selectolax(html: str) -> HtmlNode:
+    """Parses a page with selectolax."""
+    from selectolax.lexbor import LexborHTMLParser  # pylint: disable=C0415
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(HIDDEN_TEXT_ELEMENTS)
+    return SelectolaxNode(tree.root)
+
+
+def parse_html(html: str, backend: str = None) -> HtmlNode:
+    """Parses a page with the given backend, or the one chosen by the
+    environment, returning its root node."""
+    backend = backend or get_backend()
+    if backend == "lxml":
+        return parse_with_lxml(html)
+    if backend == "selectolax":
+        return parse_with_selectolax(html)
+    return SoupNode(bs4.BeautifulSoup(html, "html.parser"))
@@ -0,0 +1,158 @@
+"""A pooled HTTP client shared by the scrapers.
+
+Every request goes through one process-wide `requests` session, so
+connections to a store are kept alive and reused rather than paying for a
+new TCP and TLS handshake on every page. The session lives at module
+level, so a warm Lambda reuses the previous invocation's connections too.
+Failed requests are retried as the `retry` module decides."""
+
+from os import environ as ENV
+from importlib.util import find_spec
+from itertools import count
+from threading import Lock
+from time import sleep
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from rate_limiter import get_rate_limiter
+from retry import RETRY_STATUSES, parse_retry_after, schedule_retry
+
+POOL_SIZE = int(ENV.get("HTTP_POOL_SIZE", "16"))
+TIMEOUT = float(ENV.get("HTTP_TIMEOUT", "10"))
+USER_AGENT = "Mozilla/5.0 (compatible; GamesReleaseTracker/1.0)"
+
+
+def get_accepted_encodings() -> str:
+    """Returns the content encodings that responses can be decoded from.
+    Brotli is only accepted if a brotli decoder is installed."""
+    if find_spec("brotli") or find_spec("brotlicffi"):
+        return "gzip, deflate, br"
+    return "gzip, deflate"
+
+
+class PoolStats:
+    """Counts the connections opened by the pool and the requests sent
+    through it. Every request that did not open a connection reused one."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    def count_connection(self) -> None:
+        """Records that a new connection was opened."""
+        with self.lock:
+            self.connections_opened += 1
+
+    def count_request(self) -> None:
+        """Records that a request was sent."""
+        with self.lock:
+            self.requests_sent += 1
+
+    def as_dict(self) -> dict:
+        """Returns the counters."""
+        with self.lock:
+            return {
+                "requests_sent": self.requests_sent,
+                "connections_opened": self.connections_opened,
+                "connections_reused": max(self.requests_sent - self.connections_opened, 0)
+            }
+
+
+STATS = PoolStats()
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    """An HTTP connection pool which counts the connections it opens."""
+
+    def _new_conn(self):
+        STATS.count_connection()
+        return super()._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    """An HTTPS connection pool which counts the connections it opens."""
+
+    def _new_conn(self):
+        STATS.count_connection()
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    """Keeps up to `pool_size` connections open to each host, and counts
+    every request sent."""
+
+    def __init__(self, pool_size: int):
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool
+        }
+
+    def send(self, request, *args, **kwargs):  # pylint: disable=W0221
+        STATS.count_request()
+        return super().send(request, *args, **kwargs)
+
+
+def create_session(pool_size: int = None) -> requests.Session:
+    """Returns a new session with a connection pool of the given size."""
+    session = requests.Session()
+    adapter = PooledAdapter(pool_size or POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept-Encoding": get_accepted_encodings(),
+        "Connection": "keep-alive"
+    })
+    return session
+
+
+_session = None
+_session_lock = Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide session, creating it on first use."""
+    global _session  # pylint: disable=W0603
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def get(url: str, timeout: float = None, headers: dict = None) -> requests.Response:
+    """Sends a GET request through the shared session, once the
+    process-wide rate limiter allows it. Connection errors, timeouts and
+    retryable statuses are retried after a backoff; once the retries run
+    out, the error is raised or the last response returned."""
+    limiter = get_rate_limiter()
+    for attempt in count():
+        limiter.wait(url)
+        try:
+            response = get_session().get(url, timeout=timeout or TIMEOUT, headers=headers)
+        except (requests.ConnectionError, requests.Timeout):
+            delay = schedule_retry(url, attempt)
+            if delay is None:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                limiter.recover(url)
+                return response
+            delay = schedule_retry(url, attempt, response.status_code,
+                                   parse_retry_after(response.headers.get("Retry-After")))
+            if delay is None:
+                return response
+            response.close()
+        sleep(delay)
+
+
+def get_connection_stats() -> dict:
+    """Returns how many requests were sent, how many connections were
+    opened for them, and how many reused an already open connection."""
+    return STATS.as_dict()
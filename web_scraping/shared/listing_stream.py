@@ -0,0 +1,84 @@
+"""Streams a scraper's listings out as newline-delimited JSON, one listing
+per line, instead of returning them all in the Lambda's response.
+
+With `SCRAPER_OUTPUT=ndjson`, each scraper writes its listings to a file as
+it scrapes them and returns only where the file is, so neither the scraper
+nor the transform and load Lambda ever hold a whole backfill in memory, and
+the Step Function's payload stays small. The file is written under
+`SCRAPER_STREAM_PATH` locally, or uploaded to `s3://SCRAPER_STREAM_BUCKET/`
+under `SCRAPER_STREAM_PREFIX` when a bucket is set. The default output,
+`inline`, returns the listings in the response as before."""
+
+from os import environ as ENV
+from collections.abc import Iterable
+from datetime import datetime
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from uuid import uuid4
+import json
+
+OUTPUTS = ["inline", "ndjson"]
+DEFAULT_LOCAL_PATH = "/tmp/listing_streams"
+DEFAULT_S3_PREFIX = "listing-streams/"
+
+
+def is_streaming() -> bool:
+    """Is the scraper's output streamed to a file?"""
+    output = ENV.get("SCRAPER_OUTPUT", "inline")
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown scraper output: {output}.")
+    return output == "ndjson"
+
+
+def get_stream_name(platform: str) -> str:
+    """Returns a new, unique file name for a platform's listings."""
+    return f"{platform}/{datetime.now():%Y-%m-%dT%H-%M-%S}-{uuid4().hex[:8]}.ndjson"
+
+
+def write_lines(file, listings: Iterable[dict]) -> int:
+    """Writes each listing to a binary file as a line of JSON, returning
+    how many were written."""
+    count = 0
+    for listing in listings:
+        file.write(json.dumps(listing, ensure_ascii=False).encode("utf_8"))
+        file.write(b"\n")
+        count += 1
+    return count
+
+
+def write_local_stream(path: Path, listings: Iterable[dict]) -> int:
+    """Writes the listings to a local file, returning how many were written."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as file:
+        return write_lines(file, listings)
+
+
+def write_s3_stream(bucket: str, key: str, listings: Iterable[dict], s3_client=None) -> int:
+    """Writes the listings to a temporary file, then uploads it to S3,
+    returning how many were written. The upload is read from disk in parts,
+    so it never needs the whole file in memory."""
+    if s3_client is None:
+        from boto3 import client  # pylint: disable=C0415
+        s3_client = client("s3")
+    with NamedTemporaryFile(suffix=".ndjson") as file:
+        count = write_lines(file, listings)
+        file.flush()
+        s3_client.upload_file(file.name, bucket, key)
+    return count
+
+
+def stream_listings(platform: str, listings: Iterable[dict], s3_client=None) -> dict:
+    """Writes a platform's listings out as newline-delimited JSON, consuming
+    them one at a time. Returns the scraper's output: its platform, where
+    its listings are, and how many there are."""
+    name = get_stream_name(platform)
+    bucket = ENV.get("SCRAPER_STREAM_BUCKET")
+    if bucket:
+        key = ENV.get("SCRAPER_STREAM_PREFIX", DEFAULT_S3_PREFIX) + name
+        count = write_s3_stream(bucket, key, listings, s3_client)
+        location = f"s3://{bucket}/{key}"
+    else:
+        path = Path(ENV.get("SCRAPER_STREAM_PATH", DEFAULT_LOCAL_PATH)) / name
+        count = write_local_stream(path, listings)
+        location = str(path)
+    return {"platform": platform, "stream": location, "count": count}
@@ -0,0 +1,403 @@
+"""A persistent conditional-GET cache for the store pages the scrapers download.
+
+Every page fetched through `get` is stored along with its ETag, its
+Last-Modified date and a hash of its body. The next time the page is
+requested, those validators are sent back as `If-None-Match` and
+`If-Modified-Since`, and a 304 Not Modified response is answered from the
+cache, so unchanged pages are not downloaded again.
+
+The store is chosen with the `PAGE_CACHE_BACKEND` environment variable:
+`none` (the default) turns the cache off, `memory` keeps pages for the life
+of the process, `sqlite` keeps pages in a local SQLite file, and `s3` keeps
+them in an S3 bucket. Every store evicts the least recently used pages once
+it holds more than `PAGE_CACHE_MAX_BYTES`."""
+
+from os import environ as ENV
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from hashlib import sha256
+from io import BytesIO
+from threading import Lock
+from time import time
+from urllib.parse import quote, unquote
+import sqlite3
+import zlib
+
+import requests
+
+import http_client
+
+PAGE_CACHE_BACKENDS = ["none", "memory", "sqlite", "s3"]
+DEFAULT_SQLITE_PATH = "/tmp/page_cache.sqlite3"
+DEFAULT_S3_PREFIX = "page-cache/"
+MAX_BYTES = int(ENV.get("PAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_STATUS_HEADER = "X-Page-Cache"
+
+
+def hash_body(body: bytes) -> str:
+    """Returns the SHA-256 hash of a page's body."""
+    return sha256(body).hexdigest()
+
+
+class PageStore(ABC):
+    """Somewhere to keep cached pages. An entry is a dict of the page's
+    `etag`, `last_modified`, `body_hash`, `encoding`, `content_type` and
+    `body`."""
+
+    @abstractmethod
+    def get(self, url: str) -> dict:
+        """Returns the entry stored for a URL, or None."""
+
+    @abstractmethod
+    def put(self, url: str, entry: dict) -> None:
+        """Stores the entry for a URL, replacing any entry already there."""
+
+    @abstractmethod
+    def touch(self, url: str, entry: dict) -> None:
+        """Marks the entry for a URL as just used."""
+
+    @abstractmethod
+    def evict(self) -> None:
+        """Removes the least recently used entries until the store fits
+        within its size limit."""
+
+
+class MemoryPageStore(PageStore):
+    """Keeps cached pages in memory, in order of use, for the life of the
+    process. Entries are evicted as soon as their bodies outgrow `max_bytes`."""
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes if max_bytes is not None else MAX_BYTES
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.total = 0
+
+    def get(self, url: str) -> dict:
+        with self.lock:
+            return self.entries.get(url)
+
+    def put(self, url: str, entry: dict) -> None:
+        with self.lock:
+            if url in self.entries:
+                self.total -= len(self.entries.pop(url)["body"])
+            self.entries[url] = entry
+            self.total += len(entry["body"])
+        self.evict()
+
+    def touch(self, url: str, entry: dict) -> None:
+        with self.lock:
+            if url in self.entries:
+                self.entries.move_to_end(url)
+
+    def evict(self) -> None:
+        with self.lock:
+            while self.total > self.max_bytes and self.entries:
+                _, entry = self.entries.popitem(last=False)
+                self.total -= len(entry["body"])
+
+    def size(self) -> int:
+        """Returns the total size of the stored bodies, in bytes."""
+        with self.lock:
+            return self.total
+
+
+class SqlitePageStore(PageStore):
+    """Keeps cached pages in a local SQLite file, with their bodies
+    compressed. Entries are evicted as soon as the file's pages outgrow
+    `max_bytes`."""
+
+    def __init__(self, path: str, max_bytes: int = None):
+        self.max_bytes = max_bytes if max_bytes is not None else MAX_BYTES
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS page (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT NOT NULL,
+                encoding TEXT,
+                content_type TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self.connection.commit()
+
+    def get(self, url: str) -> dict:
+        with self.lock:
+            row = self.connection.execute(
+                """SELECT etag, last_modified, body_hash, encoding, content_type, body
+                FROM page WHERE url = ?""", (url,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "body_hash": row[2],
+            "encoding": row[3],
+            "content_type": row[4],
+            "body": zlib.decompress(row[5])
+        }
+
+    def put(self, url: str, entry: dict) -> None:
+        body = zlib.compress(entry["body"])
+        with self.lock:
+            self.connection.execute(
+                """INSERT OR REPLACE INTO page
+                (url, etag, last_modified, body_hash, encoding, content_type, body, size, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (url, entry["etag"], entry["last_modified"], entry["body_hash"],
+                 entry["encoding"], entry["content_type"], body, len(body), time()))
+            self.connection.commit()
+        self.evict()
+
+    def touch(self, url: str, entry: dict) -> None:
+        with self.lock:
+            self.connection.execute("UPDATE page SET last_used = ? WHERE url = ?", (time(), url))
+            self.connection.commit()
+
+    def evict(self) -> None:
+        with self.lock:
+            total = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM page").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = []
+            for url, size in self.connection.execute(
+                    "SELECT url, size FROM page ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                evicted.append((url,))
+                total -= size
+            self.connection.executemany("DELETE FROM page WHERE url = ?", evicted)
+            self.connection.commit()
+
+    def size(self) -> int:
+        """Returns the total size of the stored bodies, in bytes."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM page").fetchone()[0]
+
+
+class S3PageStore(PageStore):
+    """Keeps cached pages as compressed objects in an S3 bucket, one per URL,
+    with the validators in the object's metadata. An object's last-modified
+    time is its last use: using an entry copies the object onto itself with
+    new metadata. Eviction lists the whole prefix, so it is run once per
+    scrape with `evict` rather than on every write."""
+
+    def __init__(self, bucket: str, prefix: str = DEFAULT_S3_PREFIX,
+                 max_bytes: int = None, s3_client=None):
+        if s3_client is None:
+            from boto3 import client  # pylint: disable=C0415
+            s3_client = client("s3")
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.max_bytes = max_bytes if max_bytes is not None else MAX_BYTES
+
+    def get_key(self, url: str) -> str:
+        """Returns the object key of a URL's entry."""
+        return self.prefix + sha256(url.encode("utf_8")).hexdigest()
+
+    def get(self, url: str) -> dict:
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.get_key(url))
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        metadata = {key: unquote(value) for key, value in response["Metadata"].items()}
+        return {
+            "etag": metadata.get("etag") or None,
+            "last_modified": metadata.get("last-modified") or None,
+            "body_hash": metadata["body-hash"],
+            "encoding": metadata.get("encoding") or None,
+            "content_type": metadata.get("content-type") or None,
+            "body": zlib.decompress(response["Body"].read())
+        }
+
+    @staticmethod
+    def get_metadata(url: str, entry: dict) -> dict:
+        """Returns the object metadata for an entry. S3 metadata must be
+        ASCII, so the values are percent-encoded."""
+        return {
+            "url": quote(url),
+            "etag": quote(entry["etag"] or ""),
+            "last-modified": quote(entry["last_modified"] or ""),
+            "body-hash": entry["body_hash"],
+            "encoding": quote(entry["encoding"] or ""),
+            "content-type": quote(entry["content_type"] or ""),
+            "last-used": str(time())
+        }
+
+    def put(self, url: str, entry: dict) -> None:
+        self.s3.put_object(Bucket=self.bucket, Key=self.get_key(url),
+                           Body=zlib.compress(entry["body"]),
+                           Metadata=self.get_metadata(url, entry))
+
+    def touch(self, url: str, entry: dict) -> None:
+        key = self.get_key(url)
+        self.s3.copy_object(Bucket=self.bucket, Key=key,
+                            CopySource={"Bucket": self.bucket, "Key": key},
+                            Metadata=self.get_metadata(url, entry),
+                            MetadataDirective="REPLACE")
+
+    def evict(self) -> None:
+        objects = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            objects.extend(page.get("Contents", []))
+        total = sum(obj["Size"] for obj in objects)
+        evicted = []
+        for obj in sorted(objects, key=lambda obj: obj["LastModified"]):
+            if total <= self.max_bytes:
+                break
+            evicted.append({"Key": obj["Key"]})
+            total -= obj["Size"]
+        for start in range(0, len(evicted), 1000):
+            self.s3.delete_objects(Bucket=self.bucket,
+                                   Delete={"Objects": evicted[start:start + 1000]})
+
+
+class CacheStats:
+    """Counts how the cached pages were served: answered from the cache
+    after a 304, downloaded again unchanged, or downloaded and changed."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counts = {"not_modified": 0, "unchanged": 0, "downloaded": 0}
+
+    def count(self, outcome: str) -> None:
+        """Records the outcome of one request."""
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def as_dict(self) -> dict:
+        """Returns the counters."""
+        with self.lock:
+            return dict(self.counts)
+
+
+STATS = CacheStats()
+
+
+def get_validators(entry: dict) -> dict:
+    """Returns the conditional request headers for a cached entry."""
+    headers = {}
+    if entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def build_cached_response(url: str, entry: dict) -> requests.Response:
+    """Returns a 200 response holding a cached page."""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.raw = BytesIO(entry["body"])
+    response.encoding = entry["encoding"]
+    if entry["content_type"]:
+        response.headers["Content-Type"] = entry["content_type"]
+    response.headers[CACHE_STATUS_HEADER] = "HIT"
+    return response
+
+
+class PageCache:
+    """Fetches pages through the shared HTTP client, revalidating the ones
+    already in its store instead of downloading them again."""
+
+    def __init__(self, store: PageStore):
+        self.store = store
+
+    def get(self, url: str, timeout: float = None) -> requests.Response:
+        """Returns the page at a URL, from the cache if it has not changed."""
+        entry = self.store.get(url)
+        headers = get_validators(entry) if entry else None
+        response = http_client.get(url, timeout=timeout, headers=headers or None)
+
+        if response.status_code == 304 and entry:
+            self.store.touch(url, entry)
+            STATS.count("not_modified")
+            return build_cached_response(url, entry)
+        if response.status_code != 200:
+            return response
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        body_hash = hash_body(response.content)
+        if entry and entry["body_hash"] == body_hash and (etag, last_modified) == (
+                entry["etag"], entry["last_modified"]):
+            self.store.touch(url, entry)
+            STATS.count("unchanged")
+        elif etag or last_modified:
+            self.store.put(url, {
+                "etag": etag,
+                "last_modified": last_modified,
+                "body_hash": body_hash,
+                "encoding": response.encoding,
+                "content_type": response.headers.get("Content-Type"),
+                "body": response.content
+            })
+            STATS.count("downloaded")
+        return response
+
+    def evict(self) -> None:
+        """Trims the store down to its size limit."""
+        self.store.evict()
+
+
+def create_store(backend: str) -> PageStore:
+    """Returns the page store for a backend, configured by the environment."""
+    if backend == "memory":
+        return MemoryPageStore()
+    if backend == "sqlite":
+        return SqlitePageStore(ENV.get("PAGE_CACHE_PATH", DEFAULT_SQLITE_PATH))
+    if backend == "s3":
+        return S3PageStore(ENV["PAGE_CACHE_BUCKET"],
+                           ENV.get("PAGE_CACHE_PREFIX", DEFAULT_S3_PREFIX))
+    raise ValueError(f"Unknown page cache backend: {backend}.")
+
+
+_cache = None
+_cache_backend = None
+_cache_lock = Lock()
+
+
+def get_page_cache() -> PageCache:
+    """Returns the process-wide page cache chosen by the environment, or
+    None if caching is turned off."""
+    global _cache, _cache_backend  # pylint: disable=W0603
+    backend = ENV.get("PAGE_CACHE_BACKEND", "none")
+    if backend not in PAGE_CACHE_BACKENDS:
+        raise ValueError(f"Unknown page cache backend: {backend}.")
+    if backend == "none":
+        return None
+    with _cache_lock:
+        if _cache is None or _cache_backend != backend:
+            _cache = PageCache(create_store(backend))
+            _cache_backend = backend
+        return _cache
+
+
+def get(url: str, timeout: float = None) -> requests.Response:
+    """Sends a GET request for a page, through the page cache if one is
+    turned on."""
+    cache = get_page_cache()
+    if cache is None:
+        return http_client.get(url, timeout=timeout)
+    return cache.get(url, timeout=timeout)
+
+
+def evict() -> None:
+    """Trims the page cache down to its size limit, if one is turned on."""
+    cache = get_page_cache()
+    if cache is not None:
+        cache.evict()
+
+
+def get_page_cache_stats() -> dict:
+    """Returns how many pages were served from the cache, downloaded again
+    unchanged, and downloaded because they had changed."""
+    return STATS.as_dict()
@@ -0,0 +1,166 @@
+"""Memoizes what the scrapers parse out of a page, keyed by a hash of the
+page's body, the version of the extractor that parsed it and the HTML parser
+backend it parsed with.
+
+A page that is byte-identical to one parsed before is not parsed again: its
+details are read back from the memo instead. Every extractor declares a
+version, which is part of the key, so bumping the version whenever the
+extractor's output changes invalidates everything it parsed before. The
+backends do not always agree on malformed markup, so a page parsed with one
+is parsed again with another.
+
+The memo is kept in one of the page cache's stores, chosen with the
+`PARSE_MEMO_BACKEND` environment variable: `none` (the default) turns it
+off, `memory` keeps parsed pages for the life of the process, `sqlite` keeps
+them in a local SQLite file (`PARSE_MEMO_PATH`), and `s3` keeps them in the
+page cache's bucket under `PARSE_MEMO_PREFIX`. The memo never holds more
+than `PARSE_MEMO_MAX_BYTES` of parsed details."""
+
+from os import environ as ENV
+from datetime import datetime
+from functools import wraps
+from threading import Lock
+import json
+
+from html_parsing import get_backend
+from page_cache import (MemoryPageStore, PageStore, S3PageStore, SqlitePageStore,
+                        hash_body)
+
+PARSE_MEMO_BACKENDS = ["none", "memory", "sqlite", "s3"]
+DEFAULT_SQLITE_PATH = "/tmp/parse_memo.sqlite3"
+DEFAULT_S3_PREFIX = "parsed/"
+MAX_BYTES = int(ENV.get("PARSE_MEMO_MAX_BYTES", str(32 * 1024 * 1024)))
+DATETIME_KEY = "$datetime"
+
+
+def encode_value(value):
+    """Encodes the values JSON cannot hold, for `json.dumps`."""
+    if isinstance(value, datetime):
+        return {DATETIME_KEY: value.isoformat()}
+    raise TypeError(f"Cannot memoize a {type(value).__name__}.")
+
+
+def decode_value(value: dict):
+    """Decodes the values encoded by `encode_value`, for `json.loads`."""
+    if DATETIME_KEY in value and len(value) == 1:
+        return datetime.fromisoformat(value[DATETIME_KEY])
+    return value
+
+
+class MemoStats:
+    """Counts the parses answered from the memo and the parses run."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counts = {"hits": 0, "misses": 0}
+
+    def count(self, outcome: str) -> None:
+        """Records one lookup."""
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def as_dict(self) -> dict:
+        """Returns the counters."""
+        with self.lock:
+            return dict(self.counts)
+
+
+STATS = MemoStats()
+
+
+class ParseMemo:
+    """Remembers the output of extractors, keyed by what they parsed."""
+
+    def __init__(self, store: PageStore):
+        self.store = store
+
+    @staticmethod
+    def get_key(extractor: str, version: int, body: str) -> str:
+        """Returns the key of an extractor's output for a page body."""
+        return f"{extractor}/v{version}/{hash_body(body.encode('utf_8'))}"
+
+    def get(self, extractor: str, version: int, body: str, parse):
+        """Returns `parse(body)`, parsing the body only if this version of
+        the extractor has not already parsed it."""
+        key = self.get_key(extractor, version, body)
+        entry = self.store.get(key)
+        if entry is not None:
+            self.store.touch(key, entry)
+            STATS.count("hits")
+            return json.loads(entry["body"], object_hook=decode_value)
+        STATS.count("misses")
+        result = parse(body)
+        self.store.put(key, {
+            "etag": None,
+            "last_modified": None,
+            "body_hash": key.rsplit("/", 1)[1],
+            "encoding": "utf-8",
+            "content_type": "application/json",
+            "body": json.dumps(result, default=encode_value).encode("utf_8")
+        })
+        return result
+
+    def evict(self) -> None:
+        """Trims the store down to its size limit."""
+        self.store.evict()
+
+
+def create_store(backend: str) -> PageStore:
+    """Returns the store for a backend, configured by the environment."""
+    if backend == "memory":
+        return MemoryPageStore(MAX_BYTES)
+    if backend == "sqlite":
+        return SqlitePageStore(ENV.get("PARSE_MEMO_PATH", DEFAULT_SQLITE_PATH), MAX_BYTES)
+    if backend == "s3":
+        return S3PageStore(ENV["PAGE_CACHE_BUCKET"],
+                           ENV.get("PARSE_MEMO_PREFIX", DEFAULT_S3_PREFIX), MAX_BYTES)
+    raise ValueError(f"Unknown parse memo backend: {backend}.")
+
+
+_memo = None
+_memo_backend = None
+_memo_lock = Lock()
+
+
+def get_parse_memo() -> ParseMemo:
+    """Returns the process-wide memo chosen by the environment, or None if
+    memoization is turned off."""
+    global _memo, _memo_backend  # pylint: disable=W0603
+    backend = ENV.get("PARSE_MEMO_BACKEND", "none")
+    if backend not in PARSE_MEMO_BACKENDS:
+        raise ValueError(f"Unknown parse memo backend: {backend}.")
+    if backend == "none":
+        return None
+    with _memo_lock:
+        if _memo is None or _memo_backend != backend:
+            _memo = ParseMemo(create_store(backend))
+            _memo_backend = backend
+        return _memo
+
+
+def memoized(extractor: str, version: int):
+    """Decorates a function parsing a page body, its only argument, so that
+    its output is memoized for the HTML parser backend in use. The output
+    must be made of JSON values and datetimes."""
+    def decorator(parse):
+        @wraps(parse)
+        def wrapper(body: str):
+            memo = get_parse_memo()
+            if memo is None:
+                return parse(body)
+            return memo.get(f"{extractor}/{get_backend()}", version, body, parse)
+        return wrapper
+    return decorator
+
+
+def evict() -> None:
+    """Trims the memo down to its size limit, if it is turned on."""
+    memo = get_parse_memo()
+    if memo is not None:
+        memo.evict()
+
+
+def get_parse_memo_stats() -> dict:
+    """Returns how many parses were answered from the memo, and how many
+    had to be run."""
+    return STATS.as_dict()
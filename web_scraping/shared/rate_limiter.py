@@ -0,0 +1,128 @@
+"""Spaces out the requests the scrapers make to each host.
+
+A limiter is a token bucket per host: each host's bucket holds up to `burst`
+tokens, refilled at `requests_per_second`, and every request takes one,
+waiting for it if the bucket is empty. Threads wait with `wait`, coroutines
+with `wait_async`, so the threaded scrapers and the async one can share a
+limiter when they run in the same process.
+
+The limiter adapts to the hosts it is throttled by. When a host answers
+429 or 503, `throttle` pauses every request to it for the delay the retry
+scheduler chose, and halves its rate; each successful request then wins
+back a little of the rate, up to the configured one.
+
+Every request sent through `http_client` and Epic's GraphQL client waits on
+the process-wide limiter, set with `HTTP_REQUESTS_PER_SECOND` (per host) and
+`HTTP_BURST`. The rate defaults to `0`, which turns the bucket off; hosts
+are still paused when they throttle the scrapers. A scraper can give its
+store's host a rate of its own with `set_host_rate`."""
+
+from os import environ as ENV
+from threading import Lock
+from time import monotonic, sleep
+from urllib.parse import urlparse
+import asyncio
+
+MAX_SLOWDOWN = 16
+RECOVERY = 0.9
+
+
+class HostRateLimiter:
+    """Spaces out the requests made to each host, so that no more than
+    `requests_per_second` are started against a single host, after an
+    initial burst of up to `burst` requests."""
+
+    def __init__(self, requests_per_second: float, burst: int = 1):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.burst = max(burst, 1)
+        self.next_slots = {}
+        self.host_intervals = {}
+        self.intervals = {}
+        self.paused_until = {}
+        self.lock = Lock()
+
+    def set_host_rate(self, url: str, requests_per_second: float) -> None:
+        """Allows the URL's host `requests_per_second` instead of the
+        limiter's own rate, or no limit if it is `0`."""
+        host = urlparse(url).netloc
+        with self.lock:
+            self.host_intervals[host] = 1 / requests_per_second \
+                if requests_per_second > 0 else 0
+
+    def base_interval(self, host: str) -> float:
+        """Returns the interval configured for a host."""
+        return self.host_intervals.get(host, self.interval)
+
+    def reserve(self, url: str) -> float:
+        """Takes a token for a request to the URL's host, returning how
+        many seconds are left until it may be sent."""
+        host = urlparse(url).netloc
+        with self.lock:
+            now = monotonic()
+            slot = max(now, self.paused_until.get(host, now))
+            interval = self.intervals.get(host, self.base_interval(host))
+            if interval:
+                # The bucket is full when the next slot is `burst` intervals
+                # away or less; every request moves it one interval further.
+                next_slot = max(now, self.next_slots.get(host, now))
+                slot = max(slot, next_slot - (self.burst - 1) * interval)
+                self.next_slots[host] = max(next_slot, slot) + interval
+        return slot - now
+
+    def throttle(self, url: str, delay: float) -> None:
+        """Pauses every request to the URL's host for `delay` seconds, and
+        halves the rate allowed to it."""
+        host = urlparse(url).netloc
+        with self.lock:
+            self.paused_until[host] = max(self.paused_until.get(host, 0), monotonic() + delay)
+            base = self.base_interval(host)
+            if base:
+                self.intervals[host] = min(self.intervals.get(host, base) * 2,
+                                           base * MAX_SLOWDOWN)
+
+    def recover(self, url: str) -> None:
+        """Wins back some of the rate a throttled host lost, after a
+        successful request to it."""
+        host = urlparse(url).netloc
+        with self.lock:
+            if host in self.intervals:
+                interval = self.intervals[host] * RECOVERY
+                if interval <= self.base_interval(host):
+                    del self.intervals[host]
+                else:
+                    self.intervals[host] = interval
+
+    def wait(self, url: str) -> None:
+        """Blocks until a request to the URL's host is allowed."""
+        delay = self.reserve(url)
+        if delay > 0:
+            sleep(delay)
+
+    async def wait_async(self, url: str) -> None:
+        """Waits, without blocking the event loop, until a request to the
+        URL's host is allowed."""
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_limiter = None
+_limiter_lock = Lock()
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """Returns the process-wide limiter, creating it on first use."""
+    global _limiter  # pylint: disable=W0603
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = HostRateLimiter(float(ENV.get("HTTP_REQUESTS_PER_SECOND", "0")),
+                                       int(ENV.get("HTTP_BURST", "1")))
+        return _limiter
+
+
+def set_rate_limit(requests_per_second: float, burst: int = 1) -> HostRateLimiter:
+    """Replaces the process-wide limiter with one allowing a new rate."""
+    global _limiter  # pylint: disable=W0603
+    with _limiter_lock:
+        _limiter = HostRateLimiter(requests_per_second, burst)
+        return _limiter
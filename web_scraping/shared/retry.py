@@ -0,0 +1,121 @@
+"""Decides when a failed request to a store is retried, and after how long.
+
+A request failing with a connection error, a timeout or a status in
+`RETRY_STATUSES` is retried up to `HTTP_MAX_RETRIES` times, so that one
+failed page is fetched again on its own rather than the Step Function
+re-running the whole scrape. The delays grow exponentially from
+`HTTP_BACKOFF_BASE` seconds, with full jitter so that the scraper's threads
+do not retry in lockstep, up to `HTTP_BACKOFF_MAX`. A 429 or 503 sent with a
+`Retry-After` header is retried after exactly that long instead, unless it
+is longer than `HTTP_BACKOFF_MAX`, in which case the request fails.
+
+A host answering 429 or 503 is throttling the scrapers, so rather than
+only the failed request waiting, every request to the host is paused on the
+process-wide rate limiter for the delay, and the host's rate is lowered."""
+
+from os import environ as ENV
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from threading import Lock
+import random
+
+from rate_limiter import get_rate_limiter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+def parse_retry_after(value: str) -> float:
+    """Returns the seconds a `Retry-After` header asks to wait, given as
+    seconds or as an HTTP date, or None if there is no usable header."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+class RetryPolicy:
+    """How many times a request is retried, and how long to wait first."""
+
+    def __init__(self, max_retries: int = None, base_delay: float = None,
+                 max_delay: float = None):
+        self.max_retries = int(ENV.get("HTTP_MAX_RETRIES", "3")) \
+            if max_retries is None else max_retries
+        self.base_delay = float(ENV.get("HTTP_BACKOFF_BASE", "0.5")) \
+            if base_delay is None else base_delay
+        self.max_delay = float(ENV.get("HTTP_BACKOFF_MAX", "30")) \
+            if max_delay is None else max_delay
+
+    def get_delay(self, attempt: int, retry_after: float = None) -> float:
+        """Returns how long to wait before retrying a request which failed
+        `attempt + 1` times, or None if it should not be retried."""
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class RetryStats:
+    """Counts the requests retried and the requests given up on."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counts = {"retries": 0, "throttled": 0, "gave_up": 0}
+
+    def count(self, outcome: str) -> None:
+        """Records one retry decision."""
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def as_dict(self) -> dict:
+        """Returns the counters."""
+        with self.lock:
+            return dict(self.counts)
+
+
+STATS = RetryStats()
+
+_policy = None
+_policy_lock = Lock()
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Returns the process-wide policy, configured by the environment."""
+    global _policy  # pylint: disable=W0603
+    with _policy_lock:
+        if _policy is None:
+            _policy = RetryPolicy()
+        return _policy
+
+
+def schedule_retry(url: str, attempt: int, status: int = None,
+                   retry_after: float = None) -> float:
+    """Decides whether a request which failed `attempt + 1` times, with a
+    status or with a connection error if there is none, is retried.
+    Returns how long the caller should sleep before retrying, or None if
+    it should give up. A throttling host is paused on the rate limiter, so
+    no sleep is needed before waiting on it again."""
+    delay = get_retry_policy().get_delay(attempt, retry_after)
+    if delay is None:
+        STATS.count("gave_up")
+        return None
+    STATS.count("retries")
+    if status in THROTTLE_STATUSES:
+        STATS.count("throttled")
+        get_rate_limiter().throttle(url, delay)
+        return 0
+    return delay
+
+
+def get_retry_stats() -> dict:
+    """Returns how many requests were retried, how many of those retries
+    were asked for by a throttling host, and how many requests failed
+    after running out of retries."""
+    return STATS.as_dict()
@@ -0,0 +1,126 @@
+"""A local stub HTTP server, used by the scrapers' tests and benchmarks to
+stand in for the stores."""
+
+from contextlib import contextmanager
+from hashlib import sha1
+from json import loads
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socket import SHUT_RDWR
+from threading import Lock, Thread
+from time import sleep
+from urllib.parse import urlsplit, parse_qs
+
+RESET = "reset"
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """Serves the pages registered on the server, after an artificial delay.
+    A page is looked up by its full path first, then by its path without the
+    query string. Pages can also be functions of the parsed query string,
+    or, for POST requests, of the parsed JSON body.
+    Connections are kept alive between requests. If the server sends
+    validators, every page has an ETag and a 304 is sent back when the
+    request's `If-None-Match` matches it.
+    Faults can be injected per path: each request to the path takes the
+    next of its faults, if any are left, and gets it instead of the page.
+    A fault is a status, a status with its headers, or `RESET` to close the
+    connection without responding."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # pylint: disable=C0103
+        """Responds with the page registered at the requested path."""
+        url = urlsplit(self.path)
+        self.respond(lambda page: page(parse_qs(url.query)))
+
+    def do_POST(self):  # pylint: disable=C0103
+        """Responds with the page registered at the requested path, given
+        the request's JSON body."""
+        request_body = loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or "null")
+        self.respond(lambda page: page(request_body))
+
+    def respond(self, call_page) -> None:
+        """Sends the page at the requested path, calling it with
+        `call_page` if it is a function."""
+        sleep(self.server.latency)
+        if self.server.received is not None:
+            self.server.received.append((self.path, dict(self.headers)))
+        url = urlsplit(self.path)
+        fault = self.take_fault(url.path)
+        if fault is not None:
+            self.send_fault(fault)
+            return
+        body = self.server.pages.get(self.path, self.server.pages.get(url.path))
+        if callable(body):
+            body = call_page(body)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        encoded = body.encode("utf_8")
+        content_type = "application/json" if body[:1] in "{[" else "text/html"
+        if self.server.validators:
+            etag = f'"{sha1(encoded).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        if self.server.validators:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def take_fault(self, path: str):
+        """Returns the next fault to inject at a path, or None."""
+        with self.server.faults_lock:
+            for key in (self.path, path):
+                if self.server.faults.get(key):
+                    return self.server.faults[key].pop(0)
+        return None
+
+    def send_fault(self, fault) -> None:
+        """Responds with an injected fault."""
+        if fault == RESET:
+            self.close_connection = True
+            self.connection.shutdown(SHUT_RDWR)
+            return
+        status, headers = fault if isinstance(fault, tuple) else (fault, {})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        """Keeps the test output quiet."""
+
+
+@contextmanager
+def serve_pages(pages: dict[str, str], latency: float = 0, received: list = None,
+                validators: bool = False, faults: dict[str, list] = None):
+    """Serves a map of paths to HTML bodies from a local server,
+    yielding the server's base URL. If given a list, the path and headers
+    of every request received are appended to it. With `validators`, the
+    server answers conditional requests. `faults` maps paths to the faults
+    to inject before serving them; the lists are consumed as they are."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRequestHandler)
+    server.daemon_threads = True
+    server.pages = pages
+    server.latency = latency
+    server.received = received
+    server.validators = validators
+    server.faults = faults if faults is not None else {}
+    server.faults_lock = Lock()
+    thread = Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,118 @@
+"""Tests for the http_client.py file."""
+
+# pylint: skip-file
+
+from time import monotonic
+
+import pytest
+import requests
+
+import http_client
+import retry
+from http_client import create_session, get, get_connection_stats, get_session
+from rate_limiter import HostRateLimiter
+from retry import RetryPolicy, get_retry_stats
+from stub_server import RESET, serve_pages
+
+
+@pytest.fixture
+def retries(monkeypatch):
+    """Retries failed requests twice, with short backoffs, for a test."""
+    limiter = HostRateLimiter(0)
+    monkeypatch.setattr(retry, "_policy", RetryPolicy(max_retries=2, base_delay=0.01,
+                                                      max_delay=1))
+    monkeypatch.setattr(retry, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(http_client, "get_rate_limiter", lambda: limiter)
+    return limiter
+
+
+def test_get_session_is_shared():
+    """Tests that every caller in the process gets the same session."""
+    assert get_session() is get_session()
+
+
+def test_connections_are_reused():
+    """Tests that consecutive requests to a host reuse one kept-alive connection."""
+    before = get_connection_stats()
+    with serve_pages({f"/{i}": f"<p>{i}</p>" for i in range(5)}) as base_url:
+        bodies = [get(f"{base_url}/{i}").text for i in range(5)]
+    after = get_connection_stats()
+
+    assert bodies == [f"<p>{i}</p>" for i in range(5)]
+    assert after["requests_sent"] - before["requests_sent"] == 5
+    assert after["connections_opened"] - before["connections_opened"] == 1
+    assert after["connections_reused"] - before["connections_reused"] == 4
+
+
+def test_compression_and_keep_alive_are_requested():
+    """Tests that the session asks for compressed responses over a kept-alive connection."""
+    received = []
+    with serve_pages({"/": "<p></p>"}, received=received) as base_url:
+        create_session().get(base_url + "/", timeout=1)
+    headers = received[0][1]
+    assert "gzip" in headers["Accept-Encoding"]
+    assert headers["Connection"] == "keep-alive"
+
+
+def test_requests_time_out(monkeypatch):
+    """Tests that every request has a timeout."""
+    monkeypatch.setattr(retry, "_policy", RetryPolicy(max_retries=0))
+    with serve_pages({"/": "<p></p>"}, latency=0.5) as base_url:
+        with pytest.raises(requests.Timeout):
+            get(base_url + "/", timeout=0.1)
+
+
+def test_pool_size_is_configurable():
+    """Tests that the session keeps as many connections per host as asked."""
+    adapter = create_session(pool_size=3).get_adapter("https://store.steampowered.com")
+    assert adapter._pool_maxsize == 3
+
+
+@pytest.mark.parametrize("fault", [500, 502, 504, RESET])
+def test_failed_requests_are_retried(retries, fault):
+    """Tests that a page failing once is fetched again on its own."""
+    received = []
+    with serve_pages({"/": "<p></p>"}, received=received, faults={"/": [fault]}) as base_url:
+        response = get(base_url + "/")
+    assert response.status_code == 200
+    assert len(received) == 2
+
+
+def test_retry_after_is_honoured(retries):
+    """Tests that a throttled host is only asked again once its Retry-After
+    has passed, and that every request to it waited for it too."""
+    before = get_retry_stats()
+    with serve_pages({"/": "<p></p>"}, faults={"/": [(429, {"Retry-After": "1"})]}) as base_url:
+        start = monotonic()
+        assert get(base_url + "/").status_code == 200
+        assert monotonic() - start >= 0.95
+        assert retries.paused_until[base_url.split("//")[1]] - start >= 0.95
+    after = get_retry_stats()
+    assert after["retries"] - before["retries"] == 1
+    assert after["throttled"] - before["throttled"] == 1
+
+
+def test_retries_run_out(retries):
+    """Tests that the last response is returned once the retries run out."""
+    received = []
+    before = get_retry_stats()
+    with serve_pages({"/": "<p></p>"}, received=received, faults={"/": [500] * 5}) as base_url:
+        assert get(base_url + "/").status_code == 500
+    assert len(received) == 3
+    assert get_retry_stats()["gave_up"] - before["gave_up"] == 1
+
+
+def test_too_long_retry_after_is_not_waited_for(retries):
+    """Tests that a Retry-After longer than the longest backoff fails straight away."""
+    received = []
+    with serve_pages({"/": "<p></p>"}, received=received,
+                     faults={"/": [(429, {"Retry-After": "120"})]}) as base_url:
+        assert get(base_url + "/").status_code == 429
+    assert len(received) == 1
+
+
+def test_client_errors_are_not_retried(retries):
+    received = []
+    with serve_pages({}, received=received) as base_url:
+        assert get(base_url + "/missing").status_code == 404
+    assert len(received) == 1
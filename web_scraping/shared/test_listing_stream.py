@@ -0,0 +1,87 @@
+"""Tests for the listing_stream.py file."""
+
+# pylint: skip-file
+
+from json import loads
+from unittest import mock
+import gc
+import weakref
+
+import pytest
+
+from listing_stream import is_streaming, stream_listings
+
+
+def make_listings(count: int):
+    """Lazily yields some listings."""
+    for i in range(count):
+        yield {"title": f"Game {i}", "description": "é" * 100, "release_date": "18/10/2026",
+               "genres": ["Action"], "url": f"https://store/{i}"}
+
+
+def test_output_is_inline_by_default(monkeypatch):
+    monkeypatch.delenv("SCRAPER_OUTPUT", raising=False)
+    assert not is_streaming()
+    monkeypatch.setenv("SCRAPER_OUTPUT", "ndjson")
+    assert is_streaming()
+    monkeypatch.setenv("SCRAPER_OUTPUT", "xml")
+    with pytest.raises(ValueError):
+        is_streaming()
+
+
+def test_listings_are_written_one_per_line(monkeypatch, tmp_path):
+    monkeypatch.delenv("SCRAPER_STREAM_BUCKET", raising=False)
+    monkeypatch.setenv("SCRAPER_STREAM_PATH", str(tmp_path))
+    output = stream_listings("gog", make_listings(3))
+    assert output["platform"] == "gog"
+    assert output["count"] == 3
+    assert output["stream"].startswith(str(tmp_path / "gog"))
+    with open(output["stream"], encoding="utf_8") as file:
+        assert [loads(line) for line in file] == list(make_listings(3))
+
+
+def test_each_stream_has_its_own_file(monkeypatch, tmp_path):
+    monkeypatch.delenv("SCRAPER_STREAM_BUCKET", raising=False)
+    monkeypatch.setenv("SCRAPER_STREAM_PATH", str(tmp_path))
+    assert stream_listings("gog", [])["stream"] != stream_listings("gog", [])["stream"]
+
+
+def test_streams_are_uploaded_to_s3(monkeypatch):
+    monkeypatch.setenv("SCRAPER_STREAM_BUCKET", "bucket")
+    monkeypatch.setenv("SCRAPER_STREAM_PREFIX", "streams/")
+    s3 = mock.MagicMock()
+    uploaded = []
+    s3.upload_file.side_effect = lambda path, bucket, key: uploaded.append(
+        open(path, encoding="utf_8").read())
+    output = stream_listings("steam", make_listings(2), s3_client=s3)
+    bucket, key = s3.upload_file.call_args.args[1:]
+    assert bucket == "bucket"
+    assert key.startswith("streams/steam/") and key.endswith(".ndjson")
+    assert output["stream"] == f"s3://bucket/{key}"
+    assert [loads(line) for line in uploaded[0].splitlines()] == list(make_listings(2))
+
+
+class Listing(dict):
+    """A listing which can be weakly referenced."""
+
+
+def test_listings_are_not_held_in_memory(monkeypatch, tmp_path):
+    """Tests that the listings are written as they come, not gathered
+    first: once the listings run out, only the last one written is still
+    in memory."""
+    monkeypatch.delenv("SCRAPER_STREAM_BUCKET", raising=False)
+    monkeypatch.setenv("SCRAPER_STREAM_PATH", str(tmp_path))
+    yielded = []
+    alive = []
+
+    def watched_listings():
+        for listing in make_listings(1_000):
+            listing = Listing(listing)
+            yielded.append(weakref.ref(listing))
+            yield listing
+            del listing
+        gc.collect()
+        alive.append(sum(ref() is not None for ref in yielded))
+
+    assert stream_listings("epic", watched_listings())["count"] == 1_000
+    assert alive == [1]
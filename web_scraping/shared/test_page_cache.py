@@ -0,0 +1,159 @@
+"""Tests for the page_cache.py file."""
+
+# pylint: skip-file
+
+from datetime import datetime, timedelta
+from unittest import mock
+import zlib
+
+import pytest
+
+import page_cache
+from page_cache import (PageCache, S3PageStore, SqlitePageStore, get_page_cache,
+                        get_page_cache_stats, hash_body)
+from stub_server import serve_pages
+
+
+def make_entry(body: bytes, etag: str = '"v1"') -> dict:
+    """Returns a cache entry for a body."""
+    return {"etag": etag, "last_modified": None, "body_hash": hash_body(body),
+            "encoding": "utf-8", "content_type": "text/html; charset=utf-8", "body": body}
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A page store in a temporary SQLite file."""
+    return SqlitePageStore(str(tmp_path / "pages.sqlite3"))
+
+
+def test_unchanged_pages_are_served_from_the_cache(store):
+    """Tests that a page with a matching ETag is answered with a 304 and served from the cache."""
+    received = []
+    cache = PageCache(store)
+    before = get_page_cache_stats()
+    with serve_pages({"/app/1/": "<p>Game</p>"}, received=received, validators=True) as url:
+        first = cache.get(f"{url}/app/1/")
+        second = cache.get(f"{url}/app/1/")
+    after = get_page_cache_stats()
+
+    assert first.text == second.text == "<p>Game</p>"
+    assert second.headers["X-Page-Cache"] == "HIT"
+    assert "If-None-Match" not in received[0][1]
+    assert received[1][1]["If-None-Match"] == first.headers["ETag"]
+    assert after["downloaded"] - before["downloaded"] == 1
+    assert after["not_modified"] - before["not_modified"] == 1
+
+
+def test_changed_pages_replace_the_cached_copy(store):
+    """Tests that a page whose ETag no longer matches is downloaded and stored again."""
+    pages = {"/app/1/": "<p>Old</p>"}
+    cache = PageCache(store)
+    with serve_pages(pages, validators=True) as url:
+        cache.get(f"{url}/app/1/")
+        pages["/app/1/"] = "<p>New</p>"
+        response = cache.get(f"{url}/app/1/")
+        assert "X-Page-Cache" not in response.headers
+
+    assert response.text == "<p>New</p>"
+    assert store.get(f"{url}/app/1/")["body"] == b"<p>New</p>"
+
+
+def test_pages_without_validators_are_not_stored(store):
+    """Tests that pages which cannot be revalidated are not cached."""
+    cache = PageCache(store)
+    with serve_pages({"/": "<p></p>"}) as url:
+        cache.get(f"{url}/")
+    assert store.get(f"{url}/") is None
+
+
+def test_missing_pages_are_not_stored(store):
+    """Tests that error responses are passed through without being cached."""
+    cache = PageCache(store)
+    with serve_pages({}, validators=True) as url:
+        assert cache.get(f"{url}/missing").status_code == 404
+    assert store.get(f"{url}/missing") is None
+
+
+def test_sqlite_store_evicts_least_recently_used(tmp_path):
+    """Tests that the least recently used pages are evicted once the store is over its size limit."""
+    bodies = {name: name.encode() * 200 for name in ["a", "b", "c"]}
+    entry_size = len(zlib.compress(bodies["a"]))
+    store = SqlitePageStore(str(tmp_path / "pages.sqlite3"), max_bytes=entry_size * 2)
+
+    store.put("a", make_entry(bodies["a"]))
+    store.put("b", make_entry(bodies["b"]))
+    store.touch("a", None)
+    store.put("c", make_entry(bodies["c"]))
+
+    assert store.get("a")["body"] == bodies["a"]
+    assert store.get("b") is None
+    assert store.get("c")["body"] == bodies["c"]
+    assert store.size() <= entry_size * 2
+
+
+def test_sqlite_store_persists_between_connections(tmp_path):
+    """Tests that pages cached by one run are available to the next."""
+    path = str(tmp_path / "pages.sqlite3")
+    SqlitePageStore(path).put("a", make_entry(b"<p>a</p>"))
+    assert SqlitePageStore(path).get("a") == make_entry(b"<p>a</p>")
+
+
+def test_s3_store_round_trips_entries():
+    """Tests that an entry written to S3 is read back unchanged."""
+    s3 = mock.MagicMock()
+    store = S3PageStore("bucket", s3_client=s3)
+    entry = make_entry("<p>Café</p>".encode(), etag='W/"é1"')
+    store.put("https://store/app/1/", entry)
+
+    put = s3.put_object.call_args.kwargs
+    assert put["Key"].startswith("page-cache/")
+    assert all(value.isascii() for value in put["Metadata"].values())
+    s3.get_object.return_value = {"Metadata": put["Metadata"],
+                                  "Body": mock.MagicMock(read=lambda: put["Body"])}
+    assert store.get("https://store/app/1/") == entry
+
+
+def test_s3_store_evicts_oldest_objects():
+    """Tests that eviction deletes the least recently used objects over the size limit."""
+    s3 = mock.MagicMock()
+    now = datetime(2026, 10, 18)
+    s3.get_paginator.return_value.paginate.return_value = [{"Contents": [
+        {"Key": "page-cache/new", "Size": 60, "LastModified": now},
+        {"Key": "page-cache/old", "Size": 60, "LastModified": now - timedelta(days=2)},
+        {"Key": "page-cache/mid", "Size": 60, "LastModified": now - timedelta(days=1)}
+    ]}]
+    S3PageStore("bucket", max_bytes=100, s3_client=s3).evict()
+    s3.delete_objects.assert_called_once_with(Bucket="bucket", Delete={"Objects": [
+        {"Key": "page-cache/old"}, {"Key": "page-cache/mid"}]})
+
+
+def test_s3_store_touch_rewrites_metadata():
+    """Tests that using an S3 entry copies it onto itself, as S3 requires new metadata to do so."""
+    s3 = mock.MagicMock()
+    S3PageStore("bucket", s3_client=s3).touch("https://store/app/1/", make_entry(b"<p></p>"))
+    copy = s3.copy_object.call_args.kwargs
+    assert copy["CopySource"] == {"Bucket": "bucket", "Key": copy["Key"]}
+    assert copy["MetadataDirective"] == "REPLACE"
+
+
+def test_cache_is_off_by_default(monkeypatch):
+    """Tests that no cache is used unless one is chosen."""
+    monkeypatch.delenv("PAGE_CACHE_BACKEND", raising=False)
+    assert get_page_cache() is None
+
+
+def test_unknown_backend_raises_error(monkeypatch):
+    """Tests that an unknown cache backend is refused."""
+    monkeypatch.setenv("PAGE_CACHE_BACKEND", "memcached")
+    with pytest.raises(ValueError):
+        get_page_cache()
+
+
+def test_get_uses_configured_sqlite_cache(monkeypatch, tmp_path):
+    """Tests that the module-level get goes through the cache chosen by the environment."""
+    monkeypatch.setenv("PAGE_CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("PAGE_CACHE_PATH", str(tmp_path / "pages.sqlite3"))
+    monkeypatch.setattr(page_cache, "_cache", None)
+    with serve_pages({"/": "<p></p>"}, validators=True) as url:
+        page_cache.get(f"{url}/")
+        assert page_cache.get(f"{url}/").headers["X-Page-Cache"] == "HIT"
@@ -0,0 +1,102 @@
+"""Tests for the parse_memo.py file."""
+
+# pylint: skip-file
+
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+import parse_memo
+from page_cache import MemoryPageStore
+from parse_memo import ParseMemo, get_parse_memo, get_parse_memo_stats, memoized
+
+
+@pytest.fixture
+def memo(monkeypatch):
+    """Turns on an in-memory memo for a test."""
+    monkeypatch.setenv("PARSE_MEMO_BACKEND", "memory")
+    monkeypatch.setattr(parse_memo, "_memo", None)
+    return get_parse_memo()
+
+
+def test_identical_bodies_are_parsed_once(memo):
+    """Tests that a body already parsed by an extractor is answered from the memo."""
+    parse = mock.Mock(return_value={"title": "Game", "tags": ["Indie"]})
+    before = get_parse_memo_stats()
+    assert memo.get("extractor", 1, "<p>Game</p>", parse) == {"title": "Game", "tags": ["Indie"]}
+    assert memo.get("extractor", 1, "<p>Game</p>", parse) == {"title": "Game", "tags": ["Indie"]}
+    after = get_parse_memo_stats()
+
+    parse.assert_called_once_with("<p>Game</p>")
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+
+
+def test_changed_bodies_are_parsed_again(memo):
+    """Tests that a body differing by a single byte is parsed again."""
+    parse = mock.Mock(side_effect=lambda body: {"body": body})
+    memo.get("extractor", 1, "<p>Game</p>", parse)
+    assert memo.get("extractor", 1, "<p>Game!</p>", parse) == {"body": "<p>Game!</p>"}
+    assert parse.call_count == 2
+
+
+def test_bumping_the_version_invalidates_the_memo(memo):
+    """Tests that a new extractor version does not reuse what the old one parsed."""
+    memo.get("extractor", 1, "<p>Game</p>", lambda body: {"version": 1})
+    assert memo.get("extractor", 2, "<p>Game</p>", lambda body: {"version": 2}) == {"version": 2}
+    assert memo.get("extractor", 1, "<p>Game</p>", lambda body: {"version": 2}) == {"version": 1}
+
+
+def test_datetimes_are_memoized():
+    """Tests that datetimes in the parsed details are read back as datetimes."""
+    memo = ParseMemo(MemoryPageStore())
+    parsed = {"release_date": datetime(2026, 10, 18), "tags": []}
+    memo.get("extractor", 1, "<p></p>", lambda body: parsed)
+    assert memo.get("extractor", 1, "<p></p>", lambda body: None) == parsed
+
+
+def test_memo_size_is_bounded():
+    """Tests that the least recently used parses are evicted past the size limit."""
+    memo = ParseMemo(MemoryPageStore(max_bytes=100))
+    for i in range(20):
+        memo.get("extractor", 1, f"<p>{i}</p>", lambda body: {"body": body})
+    assert memo.store.size() <= 100
+    assert len(memo.store.entries) < 20
+
+
+def test_memoized_is_a_no_op_when_turned_off(monkeypatch):
+    """Tests that the decorated function is always run when memoization is off."""
+    monkeypatch.delenv("PARSE_MEMO_BACKEND", raising=False)
+    parse = mock.Mock(return_value={})
+    memoized_parse = memoized("extractor", 1)(parse)
+    memoized_parse("<p></p>")
+    memoized_parse("<p></p>")
+    assert parse.call_count == 2
+
+
+def test_memoized_persists_with_sqlite(monkeypatch, tmp_path):
+    """Tests that a parse memoized in SQLite is reused by a later process."""
+    monkeypatch.setenv("PARSE_MEMO_BACKEND", "sqlite")
+    monkeypatch.setenv("PARSE_MEMO_PATH", str(tmp_path / "parsed.sqlite3"))
+    monkeypatch.setattr(parse_memo, "_memo", None)
+    memoized("extractor", 1)(lambda body: {"title": "Game"})("<p></p>")
+
+    monkeypatch.setattr(parse_memo, "_memo", None)
+    parse = mock.Mock()
+    assert memoized("extractor", 1)(parse)("<p></p>") == {"title": "Game"}
+    parse.assert_not_called()
+
+
+def test_memoized_is_keyed_by_the_html_backend(memo, monkeypatch):
+    """Tests that a page parsed with one HTML backend is parsed again with another."""
+    monkeypatch.setenv("HTML_PARSER_BACKEND", "html.parser")
+    memoized("extractor", 1)(lambda body: {"backend": "html.parser"})("<p></p>")
+
+    monkeypatch.setenv("HTML_PARSER_BACKEND", "lxml")
+    parse = mock.Mock(return_value={"backend": "lxml"})
+    assert memoized("extractor", 1)(parse)("<p></p>") == {"backend": "lxml"}
+    parse.assert_called_once_with("<p></p>")
+
+    monkeypatch.setenv("HTML_PARSER_BACKEND", "html.parser")
+    assert memoized("extractor", 1)(parse)("<p></p>") == {"backend": "html.parser"}
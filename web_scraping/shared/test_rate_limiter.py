@@ -0,0 +1,109 @@
+"""Tests for the rate_limiter.py file."""
+
+# pylint: skip-file
+
+import asyncio
+from time import monotonic
+
+import pytest
+
+import rate_limiter
+from rate_limiter import HostRateLimiter, get_rate_limiter, set_rate_limit
+
+
+def test_requests_to_the_same_host_are_spaced_out():
+    """Tests that the limiter never lets a host exceed its request rate."""
+    limiter = HostRateLimiter(requests_per_second=50)
+    start = monotonic()
+    for _ in range(6):
+        limiter.wait("https://store.steampowered.com/app/1/")
+    assert monotonic() - start >= 0.1
+
+
+def test_hosts_are_limited_separately():
+    """Tests that a request to one host does not wait for another's slot."""
+    limiter = HostRateLimiter(requests_per_second=1)
+    assert limiter.reserve("https://store.steampowered.com/") == 0
+    assert limiter.reserve("https://www.gog.com/") == 0
+    assert limiter.reserve("https://store.steampowered.com/") > 0.9
+
+
+def test_no_rate_never_waits():
+    limiter = HostRateLimiter(requests_per_second=0)
+    assert all(limiter.reserve("https://www.gog.com/") == 0 for _ in range(100))
+
+
+def test_host_rates_override_the_limiter_rate():
+    """Tests that a host given a rate of its own is limited by it, while
+    other hosts keep the limiter's rate."""
+    limiter = HostRateLimiter(requests_per_second=0)
+    limiter.set_host_rate("https://store.steampowered.com/", 1)
+    assert limiter.reserve("https://store.steampowered.com/app/1/") == 0
+    assert limiter.reserve("https://store.steampowered.com/app/2/") > 0.9
+    assert limiter.reserve("https://www.gog.com/") == 0
+    assert limiter.reserve("https://www.gog.com/") == 0
+
+
+def test_throttling_slows_a_host_from_its_own_rate():
+    limiter = HostRateLimiter(requests_per_second=0)
+    limiter.set_host_rate("https://store.steampowered.com/", 10)
+    limiter.throttle("https://store.steampowered.com/", 0)
+    assert limiter.intervals["store.steampowered.com"] == pytest.approx(0.2)
+    for _ in range(10):
+        limiter.recover("https://store.steampowered.com/")
+    assert "store.steampowered.com" not in limiter.intervals
+
+
+def test_threads_and_coroutines_share_slots():
+    """Tests that coroutines wait for the slots taken by threads, without
+    blocking each other."""
+    limiter = HostRateLimiter(requests_per_second=20)
+    limiter.wait("https://graphql.epicgames.com/graphql")
+
+    async def wait_for_slots():
+        await asyncio.gather(*(limiter.wait_async("https://graphql.epicgames.com/graphql")
+                               for _ in range(3)))
+
+    start = monotonic()
+    asyncio.run(wait_for_slots())
+    assert 0.14 <= monotonic() - start < 0.3
+
+
+def test_rate_limiter_is_process_wide(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiter", None)
+    monkeypatch.setenv("HTTP_REQUESTS_PER_SECOND", "4")
+    assert get_rate_limiter() is get_rate_limiter()
+    assert get_rate_limiter().interval == 0.25
+    limiter = set_rate_limit(2)
+    assert get_rate_limiter() is limiter
+    assert limiter.interval == 0.5
+
+
+def test_bursts_are_allowed_up_to_the_bucket_size():
+    """Tests that a full bucket lets `burst` requests through at once, then
+    spaces out the rest."""
+    limiter = HostRateLimiter(requests_per_second=1, burst=3)
+    delays = [limiter.reserve("https://www.gog.com/") for _ in range(5)]
+    assert delays[:3] == [0, 0, 0]
+    assert 0.9 < delays[3] <= 1
+    assert 1.9 < delays[4] <= 2
+
+
+def test_throttled_host_is_paused_for_every_request():
+    """Tests that a throttling host is paused for every caller, even with no
+    rate limit, and that other hosts are not."""
+    limiter = HostRateLimiter(requests_per_second=0)
+    limiter.throttle("https://store.steampowered.com/app/1/", 0.5)
+    assert limiter.reserve("https://store.steampowered.com/app/2/") > 0.4
+    assert limiter.reserve("https://www.gog.com/") == 0
+
+
+def test_throttled_host_rate_is_halved_then_recovered():
+    """Tests that a throttling host's rate drops, and climbs back with each success."""
+    limiter = HostRateLimiter(requests_per_second=10)
+    limiter.throttle("https://www.gog.com/", 0)
+    limiter.throttle("https://www.gog.com/", 0)
+    assert limiter.intervals["www.gog.com"] == pytest.approx(0.4)
+    for _ in range(20):
+        limiter.recover("https://www.gog.com/")
+    assert "www.gog.com" not in limiter.intervals
@@ -0,0 +1,58 @@
+"""Tests for the retry.py file."""
+
+# pylint: skip-file
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import retry
+from rate_limiter import HostRateLimiter
+from retry import RetryPolicy, parse_retry_after, schedule_retry
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("0", 0), ("7", 7), (" 30 ", 30), (None, None), ("", None), ("soon", None)
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=20)
+    assert 18 <= parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 20
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+def test_backoff_is_jittered_and_grows_exponentially():
+    """Tests that each delay is drawn from zero up to an exponentially growing cap."""
+    policy = RetryPolicy(max_retries=10, base_delay=1, max_delay=5)
+    for attempt, cap in [(0, 1), (1, 2), (2, 4), (3, 5), (8, 5)]:
+        delays = [policy.get_delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap / 2
+        assert len(set(delays)) > 1
+
+
+def test_retry_after_replaces_the_backoff():
+    policy = RetryPolicy(max_retries=3, base_delay=1, max_delay=30)
+    assert policy.get_delay(0, retry_after=12) == 12
+    assert policy.get_delay(0, retry_after=31) is None
+
+
+def test_retries_run_out():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.get_delay(1) is not None
+    assert policy.get_delay(2) is None
+
+
+def test_throttling_hosts_are_paused_on_the_rate_limiter(monkeypatch):
+    """Tests that a 429 or 503 pauses the host instead of only the caller."""
+    limiter = HostRateLimiter(0)
+    monkeypatch.setattr(retry, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(retry, "_policy", RetryPolicy(max_retries=3, base_delay=1))
+    assert schedule_retry("https://www.gog.com/game/1", 0, 429, retry_after=2) == 0
+    assert limiter.reserve("https://www.gog.com/game/2") > 1.9
+    assert 0 <= schedule_retry("https://store.steampowered.com/app/1/", 0, 500) <= 1
+    assert limiter.reserve("https://store.steampowered.com/app/2/") == 0
@@ -0,0 +1,171 @@
+"""Tests for the watermark.py file."""
+
+# pylint: skip-file
+
+from datetime import datetime
+from unittest import mock
+import json
+
+import pytest
+
+import watermark
+from watermark import (S3WatermarkStore, SqliteWatermarkStore, Watermark, commit_watermark,
+                       load_watermark, stage_watermark)
+
+GAMES = [{"url": "https://store/game/1", "release_date": "18/10/2026"},
+         {"url": "https://store/game/2", "release_date": "20/10/2026"},
+         {"url": "https://store/game/3", "release_date": "17/10/2026"}]
+
+
+def save_watermark(mark):
+    """Stages a run's watermark and commits it, as once its games are loaded."""
+    stage_watermark(mark)
+    commit_watermark(mark.platform)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Keeps the watermarks in memory for a test."""
+    monkeypatch.setenv("WATERMARK_BACKEND", "memory")
+    monkeypatch.setattr(watermark, "_store", None)
+    return watermark.get_watermark_store()
+
+
+def test_tracked_games_are_seen():
+    """Tests that every game yielded is recorded, with the latest release date."""
+    mark = Watermark("steam")
+    assert list(mark.track(iter(GAMES))) == GAMES
+    assert mark.has_seen("https://store/game/1")
+    assert not mark.has_seen("https://store/game/4")
+    assert mark.last_release == datetime(2026, 10, 20)
+    assert mark.get_stats() == {"skipped": 1, "recorded": 3, "held": 3,
+                                "last_release": "2026-10-20"}
+
+
+def test_ignored_watermark_skips_nothing():
+    """Tests that a watermark not skipping seen games still records them."""
+    mark = Watermark("steam", skip_seen=False)
+    mark.record_game(GAMES[0])
+    assert not mark.has_seen("https://store/game/1")
+    assert "https://store/game/1" in mark.seen
+
+
+def test_prune_forgets_games_older_than_the_retention():
+    """Tests that only the games released close to the latest one are kept."""
+    mark = Watermark("steam")
+    mark.record("https://store/game/old", datetime(2026, 9, 1))
+    mark.record("https://store/game/new", datetime(2026, 10, 18))
+    mark.prune(retention_days=14)
+    assert set(mark.seen) == {"https://store/game/new"}
+
+
+def test_watermark_is_off_by_default(monkeypatch):
+    """Tests that without a backend, every run starts from an empty watermark."""
+    monkeypatch.delenv("WATERMARK_BACKEND", raising=False)
+    mark = load_watermark("steam")
+    mark.record_game(GAMES[0])
+    save_watermark(mark)
+    assert load_watermark("steam").seen == {}
+
+
+def test_saved_watermark_is_used_by_the_next_run(store):
+    """Tests that the games recorded by one run are skipped by the next."""
+    mark = load_watermark("gog")
+    list(mark.track(GAMES))
+    save_watermark(mark)
+
+    next_run = load_watermark("gog")
+    assert next_run.has_seen("https://store/game/3")
+    assert next_run.last_release == datetime(2026, 10, 20)
+    assert load_watermark("epic").seen == {}
+
+
+def test_staged_watermark_is_only_used_once_committed(store):
+    """Tests that the games of a run which failed before they were loaded
+    are scraped again by the next run."""
+    mark = load_watermark("gog")
+    list(mark.track(GAMES[:1]))
+    save_watermark(mark)
+
+    failed_run = load_watermark("gog")
+    list(failed_run.track(GAMES[1:]))
+    stage_watermark(failed_run)
+    assert not load_watermark("gog").has_seen("https://store/game/2")
+    assert load_watermark("gog").has_seen("https://store/game/1")
+
+    commit_watermark("gog")
+    assert load_watermark("gog").has_seen("https://store/game/2")
+    assert store.get("gog.pending") is None
+
+
+def test_committing_without_a_staged_watermark_keeps_it(store):
+    mark = load_watermark("gog")
+    list(mark.track(GAMES))
+    save_watermark(mark)
+    commit_watermark("gog")
+    assert load_watermark("gog").has_seen("https://store/game/1")
+
+
+def test_ignore_mode_keeps_the_watermark(store):
+    """Tests that an ignoring run scrapes seen games without forgetting them."""
+    mark = load_watermark("gog")
+    list(mark.track(GAMES))
+    save_watermark(mark)
+
+    ignoring = load_watermark("gog", "ignore")
+    assert not ignoring.has_seen("https://store/game/1")
+    save_watermark(ignoring)
+    assert load_watermark("gog").has_seen("https://store/game/1")
+
+
+def test_reset_mode_forgets_the_watermark(store):
+    """Tests that a reset run starts from scratch, for a backfill."""
+    mark = load_watermark("gog")
+    list(mark.track(GAMES))
+    save_watermark(mark)
+
+    stage_watermark(mark)
+
+    assert load_watermark("gog", "reset").seen == {}
+    assert store.get("gog") is None
+    assert store.get("gog.pending") is None
+
+
+def test_unknown_mode_raises_error(store):
+    with pytest.raises(ValueError, match="Unknown watermark mode"):
+        load_watermark("gog", "forget")
+
+
+def test_unknown_backend_raises_error(monkeypatch):
+    monkeypatch.setenv("WATERMARK_BACKEND", "redis")
+    with pytest.raises(ValueError, match="Unknown watermark backend"):
+        load_watermark("gog")
+
+
+def test_sqlite_store_persists_between_connections(tmp_path):
+    """Tests that a watermark saved in SQLite is read back by a later process."""
+    mark = Watermark("steam")
+    list(mark.track(GAMES))
+    SqliteWatermarkStore(str(tmp_path / "watermark.sqlite3")).put("steam", mark.as_dict())
+
+    data = SqliteWatermarkStore(str(tmp_path / "watermark.sqlite3")).get("steam")
+    assert Watermark.from_dict(data).seen == mark.seen
+
+
+def test_s3_store_round_trips_watermarks():
+    """Tests that a watermark written to S3 is read back unchanged, and that
+    a platform without one has none."""
+    s3 = mock.MagicMock()
+    s3.exceptions.NoSuchKey = KeyError
+    store = S3WatermarkStore("bucket", s3_client=s3)
+    mark = Watermark("epic")
+    list(mark.track(GAMES))
+    store.put("epic", mark.as_dict())
+
+    put = s3.put_object.call_args.kwargs
+    assert put["Key"] == "watermarks/epic.json"
+    s3.get_object.return_value = {"Body": mock.Mock(read=lambda: put["Body"])}
+    assert store.get("epic") == json.loads(json.dumps(mark.as_dict()))
+
+    s3.get_object.side_effect = KeyError
+    assert store.get("steam") is None
@@ -0,0 +1,282 @@
+"""A persisted high-water mark of the games each platform's scraper has
+already scraped, so that they are not fetched or parsed again.
+
+A platform's watermark holds the latest release date it has scraped and the
+URL of every game it scraped released within `WATERMARK_RETENTION_DAYS` of
+it. The scrapers check a game's URL against it before fetching any of the
+game's details, and record every game they yield. Older URLs are dropped
+when the watermark is saved: the scrapers never walk back that far unless
+backfilling, and the loader still drops duplicates.
+
+A scraper only stages its watermark, as the last step of its run. The
+loader commits it once the games the run scraped are in the database, so a
+run which fails anywhere before then, scraping or loading, leaves the
+previous watermark in place and its games are scraped again next time.
+
+Each run chooses how to use the watermark: `use` (the default) skips the
+games it holds, `ignore` scrapes every game but still records them, and
+`reset` forgets everything recorded so far first, for backfills.
+
+The watermarks are kept in a store chosen with `WATERMARK_BACKEND`: `none`
+(the default) keeps nothing between runs, `memory` keeps them for the life
+of the process, `sqlite` keeps them in a local SQLite file
+(`WATERMARK_PATH`), and `s3` keeps one JSON object per platform in the page
+cache's bucket, under `WATERMARK_PREFIX`."""
+
+from os import environ as ENV
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta
+from threading import Lock
+import json
+import sqlite3
+
+WATERMARK_BACKENDS = ["none", "memory", "sqlite", "s3"]
+WATERMARK_MODES = ["use", "ignore", "reset"]
+DEFAULT_SQLITE_PATH = "/tmp/watermark.sqlite3"
+DEFAULT_S3_PREFIX = "watermarks/"
+RETENTION_DAYS = int(ENV.get("WATERMARK_RETENTION_DAYS", "14"))
+GAME_DATE_FORMAT = "%d/%m/%Y"
+PENDING_SUFFIX = ".pending"
+
+
+class Watermark:
+    """The games a platform's scraper has already scraped, by URL, with
+    their release dates."""
+
+    def __init__(self, platform: str, last_release: datetime = None, seen: dict = None,
+                 skip_seen: bool = True):
+        self.platform = platform
+        self.last_release = last_release
+        self.seen = dict(seen or {})
+        self.skip_seen = skip_seen
+        self.lock = Lock()
+        self.counts = {"skipped": 0, "recorded": 0}
+
+    def has_seen(self, url: str) -> bool:
+        """Should the game at a URL be skipped, as it was already scraped?"""
+        if not self.skip_seen or url not in self.seen:
+            return False
+        with self.lock:
+            self.counts["skipped"] += 1
+        return True
+
+    def record(self, url: str, release_date: datetime) -> None:
+        """Records that a game was scraped."""
+        with self.lock:
+            self.seen[url] = release_date.date().isoformat()
+            if self.last_release is None or release_date > self.last_release:
+                self.last_release = release_date
+            self.counts["recorded"] += 1
+
+    def record_game(self, game: dict) -> None:
+        """Records a scraped game, in the scrapers' output format."""
+        self.record(game["url"], datetime.strptime(game["release_date"], GAME_DATE_FORMAT))
+
+    def track(self, games: Iterable[dict]) -> Iterator[dict]:
+        """Yields each game, recording it as it goes."""
+        for game in games:
+            self.record_game(game)
+            yield game
+
+    def prune(self, retention_days: int = None) -> None:
+        """Forgets the games released long enough before the latest one."""
+        if self.last_release is None:
+            return
+        retention_days = RETENTION_DAYS if retention_days is None else retention_days
+        oldest = (self.last_release - timedelta(days=retention_days)).date().isoformat()
+        with self.lock:
+            self.seen = {url: day for url, day in self.seen.items() if day >= oldest}
+
+    def as_dict(self) -> dict:
+        """Returns the watermark as JSON values."""
+        return {"platform": self.platform,
+                "last_release": self.last_release.isoformat() if self.last_release else None,
+                "seen": self.seen}
+
+    @classmethod
+    def from_dict(cls, data: dict, skip_seen: bool = True) -> "Watermark":
+        """Returns the watermark stored by `as_dict`."""
+        last_release = data.get("last_release")
+        return cls(data["platform"], datetime.fromisoformat(last_release) if last_release else None,
+                   data.get("seen"), skip_seen)
+
+    def get_stats(self) -> dict:
+        """Returns how many games were skipped and recorded this run."""
+        with self.lock:
+            return {**self.counts, "held": len(self.seen),
+                    "last_release": self.last_release.date().isoformat()
+                    if self.last_release else None}
+
+
+class WatermarkStore(ABC):
+    """Keeps each platform's watermark, as JSON values."""
+
+    @abstractmethod
+    def get(self, platform: str) -> dict:
+        """Returns a platform's watermark, or None if it has none."""
+
+    @abstractmethod
+    def put(self, platform: str, data: dict) -> None:
+        """Stores a platform's watermark."""
+
+    @abstractmethod
+    def delete(self, platform: str) -> None:
+        """Forgets a platform's watermark."""
+
+
+class MemoryWatermarkStore(WatermarkStore):
+    """Keeps watermarks for the life of the process."""
+
+    def __init__(self):
+        self.watermarks = {}
+
+    def get(self, platform: str) -> dict:
+        return self.watermarks.get(platform)
+
+    def put(self, platform: str, data: dict) -> None:
+        self.watermarks[platform] = data
+
+    def delete(self, platform: str) -> None:
+        self.watermarks.pop(platform, None)
+
+
+class SqliteWatermarkStore(WatermarkStore):
+    """Keeps watermarks in a local SQLite file, one row per platform."""
+
+    def __init__(self, path: str):
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS watermark (
+                platform TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            )""")
+        self.connection.commit()
+
+    def get(self, platform: str) -> dict:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM watermark WHERE platform = ?", (platform,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, platform: str, data: dict) -> None:
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO watermark (platform, data) VALUES (?, ?)",
+                                    (platform, json.dumps(data)))
+            self.connection.commit()
+
+    def delete(self, platform: str) -> None:
+        with self.lock:
+            self.connection.execute("DELETE FROM watermark WHERE platform = ?", (platform,))
+            self.connection.commit()
+
+
+class S3WatermarkStore(WatermarkStore):
+    """Keeps watermarks as JSON objects in an S3 bucket, one per platform."""
+
+    def __init__(self, bucket: str, prefix: str = DEFAULT_S3_PREFIX, s3_client=None):
+        if s3_client is None:
+            from boto3 import client  # pylint: disable=C0415
+            s3_client = client("s3")
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get_key(self, platform: str) -> str:
+        """Returns the object key of a platform's watermark."""
+        return f"{self.prefix}{platform}.json"
+
+    def get(self, platform: str) -> dict:
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.get_key(platform))
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(response["Body"].read())
+
+    def put(self, platform: str, data: dict) -> None:
+        self.s3.put_object(Bucket=self.bucket, Key=self.get_key(platform),
+                           Body=json.dumps(data).encode("utf_8"),
+                           ContentType="application/json")
+
+    def delete(self, platform: str) -> None:
+        self.s3.delete_object(Bucket=self.bucket, Key=self.get_key(platform))
+
+
+def create_store(backend: str) -> WatermarkStore:
+    """Returns the watermark store for a backend, configured by the environment."""
+    if backend == "memory":
+        return MemoryWatermarkStore()
+    if backend == "sqlite":
+        return SqliteWatermarkStore(ENV.get("WATERMARK_PATH", DEFAULT_SQLITE_PATH))
+    if backend == "s3":
+        return S3WatermarkStore(ENV["PAGE_CACHE_BUCKET"],
+                                ENV.get("WATERMARK_PREFIX", DEFAULT_S3_PREFIX))
+    raise ValueError(f"Unknown watermark backend: {backend}.")
+
+
+_store = None
+_store_backend = None
+_store_lock = Lock()
+
+
+def get_watermark_store() -> WatermarkStore:
+    """Returns the process-wide store chosen by the environment, or None if
+    watermarks are not kept between runs."""
+    global _store, _store_backend  # pylint: disable=W0603
+    backend = ENV.get("WATERMARK_BACKEND", "none")
+    if backend not in WATERMARK_BACKENDS:
+        raise ValueError(f"Unknown watermark backend: {backend}.")
+    if backend == "none":
+        return None
+    with _store_lock:
+        if _store is None or _store_backend != backend:
+            _store = create_store(backend)
+            _store_backend = backend
+        return _store
+
+
+def load_watermark(platform: str, mode: str = None) -> Watermark:
+    """Returns a platform's watermark for a run, used as the mode says.
+    Without a store, the watermark starts empty and is not kept."""
+    mode = mode or "use"
+    if mode not in WATERMARK_MODES:
+        raise ValueError(f"Unknown watermark mode: {mode}.")
+    store = get_watermark_store()
+    if store is None:
+        return Watermark(platform)
+    if mode == "reset":
+        store.delete(platform)
+        store.delete(get_pending_key(platform))
+        return Watermark(platform)
+    data = store.get(platform)
+    if data is None:
+        return Watermark(platform)
+    return Watermark.from_dict(data, skip_seen=mode == "use")
+
+
+def get_pending_key(platform: str) -> str:
+    """Returns the key a platform's staged watermark is stored under."""
+    return f"{platform}{PENDING_SUFFIX}"
+
+
+def stage_watermark(watermark: Watermark) -> None:
+    """Stores a platform's watermark once its run has finished, forgetting
+    the games too old to be scraped again. Later runs only skip its games
+    once it is committed."""
+    store = get_watermark_store()
+    if store is not None:
+        watermark.prune()
+        store.put(get_pending_key(watermark.platform), watermark.as_dict())
+
+
+def commit_watermark(platform: str) -> None:
+    """Makes a platform's staged watermark the one later runs use, once the
+    games its run scraped have been loaded. Does nothing if none is staged."""
+    store = get_watermark_store()
+    if store is None:
+        return
+    data = store.get(get_pending_key(platform))
+    if data is not None:
+        store.put(platform, data)
+        store.delete(get_pending_key(platform))
@@ -0,0 +1,130 @@
+"""A single-pass extractor for the details on a Steam app page.
+
+Reads every field that the `scrape_game_*` functions in `scrape_steam.py`
+look for in one walk over the page's HTML, without building a tree. Open
+and closing tags are matched the same way as BeautifulSoup's 'html.parser'
+builder, so the extracted details are identical."""
+
+from html.parser import HTMLParser
+
+# Bump whenever the extracted details change, to invalidate memoized pages.
+EXTRACTOR_VERSION = 1
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+                 'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont',
+                 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'}
+HIDDEN_TEXT_ELEMENTS = {'script', 'style', 'template', 'rt', 'rp'}
+PLATFORM_MAPPING = {
+    'win': 'Windows',
+    'mac': 'Mac',
+    'linux': 'Linux'
+}
+
+
+class AppPageExtractor(HTMLParser):
+    """Collects the text of the elements holding a game's details, as the
+    page is parsed. Each open element is kept on a stack along with the
+    buffer its text is collected into, if it is one of the elements needed."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.open_elements = []
+        self.capturing = 0
+        self.hidden = 0
+        self.in_genres_section = 0
+        self.description = None
+        self.genres_section_found = False
+        self.tags = []
+        self.headings = []
+        self.genres = []
+        self.platforms = []
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        classes = (attributes.get('class') or '').split()
+        buffer = None
+
+        if tag == 'div':
+            if self.description is None and 'game_description_snippet' in classes:
+                buffer = self.description = []
+            elif not self.genres_section_found and attributes.get('id') == 'genresAndManufacturer':
+                self.genres_section_found = True
+                self.in_genres_section += 1
+                self.open_elements.append((tag, None, True))
+                return
+        elif tag == 'a':
+            if 'app_tag' in classes:
+                buffer = []
+                self.tags.append(buffer)
+            if self.in_genres_section and 'href' in attributes:
+                genre_buffer = []
+                self.genres.append(((attributes['href'] or ''), genre_buffer))
+                buffer = (buffer, genre_buffer) if buffer is not None else genre_buffer
+        elif tag == 'h2':
+            buffer = []
+            self.headings.append(buffer)
+        elif tag == 'span' and 'platform_img' in classes and len(classes) > 1:
+            if classes[1] in PLATFORM_MAPPING:
+                self.platforms.append(PLATFORM_MAPPING[classes[1]])
+
+        if tag in VOID_ELEMENTS:
+            return
+        if tag in HIDDEN_TEXT_ELEMENTS:
+            self.hidden += 1
+        if buffer is not None:
+            self.capturing += 1
+        self.open_elements.append((tag, buffer, False))
+
+    def handle_endtag(self, tag):
+        for depth in range(len(self.open_elements) - 1, -1, -1):
+            if self.open_elements[depth][0] == tag:
+                for _ in range(len(self.open_elements) - depth):
+                    self.close_element()
+                return
+
+    def close_element(self):
+        """Closes the most recently opened element."""
+        tag, buffer, is_genres_section = self.open_elements.pop()
+        if tag in HIDDEN_TEXT_ELEMENTS:
+            self.hidden -= 1
+        if buffer is not None:
+            self.capturing -= 1
+        if is_genres_section:
+            self.in_genres_section -= 1
+
+    def handle_data(self, data):
+        if not self.capturing or self.hidden:
+            return
+        for _, buffer, _ in self.open_elements:
+            if isinstance(buffer, tuple):
+                for inner_buffer in buffer:
+                    inner_buffer.append(data)
+            elif buffer is not None:
+                buffer.append(data)
+
+    def unknown_decl(self, data):
+        if data.startswith('CDATA['):
+            self.handle_data(data[len('CDATA['):])
+
+    def get_details(self) -> dict:
+        """Returns the details found on the page, in the same format as
+        `scrape_steam.scrape_app_page_details`."""
+        description = "No description available."
+        if self.description is not None:
+            description = ''.join(self.description).strip()
+        return {
+            'description': description,
+            'operating_systems': list(set(self.platforms)) if self.platforms else [],
+            'genres': [''.join(buffer).strip()
+                       for href, buffer in self.genres if 'genre' in href],
+            'is_nsfw': any('mature content' in ''.join(buffer).lower()
+                           for buffer in self.headings),
+            'tags': [''.join(buffer).strip() for buffer in self.tags],
+        }
+
+
+def extract_app_page_details(steam_app_page_source: str) -> dict:
+    """Extracts the details of a game from its Steam app page in one pass."""
+    extractor = AppPageExtractor()
+    extractor.feed(steam_app_page_source)
+    extractor.close()
+    return extractor.get_details()
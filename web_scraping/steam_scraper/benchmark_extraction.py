@@ -0,0 +1,39 @@
+"""Benchmarks the single-pass app page extractor against building a soup and
+walking it once per field, over saved Steam app pages.
+
+Run with `PYTHONPATH=../shared python3 benchmark_extraction.py [directory of saved pages]`.
+Defaults to the pages in `fixtures/`."""
+
+from pathlib import Path
+from sys import argv
+from timeit import repeat
+
+from app_page_extractor import extract_app_page_details
+from html_parsing import parse_html
+from scrape_steam import scrape_app_tree_details
+
+RUNS = 5
+ITERATIONS = 50
+
+
+def multi_walk(html: str) -> dict:
+    """The previous extraction: one soup, then one walk per field."""
+    return scrape_app_tree_details(parse_html(html, 'html.parser'))
+
+
+def best_time_per_page(extract, html: str) -> float:
+    """Returns the best time taken to extract one page, in milliseconds."""
+    return min(repeat(lambda: extract(html), number=ITERATIONS, repeat=RUNS)) / ITERATIONS * 1000
+
+
+if __name__ == "__main__":
+    page_directory = Path(argv[1]) if len(argv) > 1 else Path(__file__).parent / "fixtures"
+    print(f"{'page':<30} | {'size':>8} | {'multi-walk':>10} | {'single-pass':>11} | speed-up")
+    for page in sorted(page_directory.glob("*.html")):
+        html = page.read_text(encoding="utf_8")
+        if multi_walk(html) != extract_app_page_details(html):
+            raise ValueError(f"The extractors disagree on {page.name}.")
+        before = best_time_per_page(multi_walk, html)
+        after = best_time_per_page(extract_app_page_details, html)
+        print(f"{page.name:<30} | {len(html) // 1024:>6}KB | {before:>8.2f}ms | "
+              f"{after:>9.2f}ms | {before / after:>7.1f}x")
@@ -0,0 +1,48 @@
+"""Benchmarks sequential against concurrent app-page fetching, using a local
+stub of the Steam store that adds a fixed latency to every response.
+
+Run with `PYTHONPATH=../shared python3 benchmark_fetching.py`."""
+
+from datetime import datetime
+from time import perf_counter
+from unittest import mock
+
+import scrape_steam
+from stub_server import serve_pages
+from stub_steam import make_search_results, make_search_row, make_app_page
+
+LISTING_COUNTS = [5, 10, 25, 50, 100]
+LATENCY = 0.05
+WORKER_COUNTS = [1, 4, 8, 16]
+
+
+def build_pages(listing_count: int) -> dict[str, str]:
+    """Returns a stub store with a search page of `listing_count` games."""
+    rows = [make_search_row(i, f"Game {i}", "18 Oct, 2026")
+            for i in range(listing_count)]
+    pages = {"/search/results/": lambda query: make_search_results(
+        rows[int(query["start"][0]):int(query["start"][0]) + int(query["count"][0])],
+        int(query["start"][0]), listing_count)}
+    for i in range(listing_count):
+        pages[f"/app/{i}/"] = make_app_page(f"Game {i}.", tags=["Indie", "Action"],
+                                            genres=["Action"], platforms=["win"])
+    return pages
+
+
+def time_scrape(base_url: str, workers: int) -> float:
+    """Returns the wall-clock time of one full scrape of the stub store."""
+    with mock.patch.multiple(scrape_steam, STEAM_SEARCH_RESULTS_URL=f"{base_url}/search/results/",
+                             STEAM_APP_URL=f"{base_url}/app/", REQUESTS_PER_SECOND=0,
+                             DETAIL_PROVIDER="html"):
+        start = perf_counter()
+        scrape_steam.collect_and_parse_games(datetime(2026, 10, 18), max_workers=workers)
+        return perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"Latency per request: {LATENCY * 1000:.0f}ms")
+    print("listings | " + " | ".join(f"{w:>2} worker(s)" for w in WORKER_COUNTS))
+    for count in LISTING_COUNTS:
+        with serve_pages(build_pages(count), latency=LATENCY) as url:
+            timings = [time_scrape(url, workers) for workers in WORKER_COUNTS]
+        print(f"{count:>8} | " + " | ".join(f"{t:>11.2f}s" for t in timings))
@@ -0,0 +1,68 @@
+"""Benchmarks parsing the release dates of Steam's search results with the
+memoized parser, once per listing, against trying every format in turn,
+twice per listing, as the scraper used to.
+
+Run with `python3 benchmark_release_dates.py [number of listings]`.
+Defaults to 50,000 listings, released over the last two years."""
+
+from datetime import datetime, timedelta
+from random import Random
+from sys import argv
+from timeit import repeat
+
+from release_dates import DATE_FORMATS, ReleaseDateParser
+
+RUNS = 5
+DAYS = 730
+# Most dates are shown abbreviated; a few listings only show a month, or
+# no date at all.
+SHOWN_FORMATS = [('%d %b, %Y', 90), ('%d %B, %Y', 5), ('%B %Y', 3), (None, 2)]
+
+
+def make_release_dates(count: int, seed: int = 0) -> list[str]:
+    """Returns the release date strings of a synthetic search, newest first."""
+    random = Random(seed)
+    formats, weights = zip(*SHOWN_FORMATS)
+    today = datetime(2026, 10, 18)
+    days = sorted((random.randrange(DAYS) for _ in range(count)))
+    return [(today - timedelta(days=day)).strftime(fmt) if fmt else "Coming soon"
+            for day, fmt in zip(days, random.choices(formats, weights, k=count))]
+
+
+def try_every_format(release_date_str: str) -> datetime:
+    """The previous parser: tries each format in order, every time."""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(release_date_str, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def parse_twice_uncached(release_dates: list[str]) -> list[datetime]:
+    """Parses each date when filtering its listing, then again when building its game."""
+    return [try_every_format(date) for date in release_dates
+            if try_every_format(date) is not None]
+
+
+def parse_once_memoized(release_dates: list[str]) -> list[datetime]:
+    """Parses each date once, with a fresh memoized parser."""
+    parse = ReleaseDateParser().parse
+    return [parsed for parsed in map(parse, release_dates) if parsed is not None]
+
+
+def best_time_per_listing(parse_all, release_dates: list[str]) -> float:
+    """Returns the best time taken to parse one listing's date, in microseconds."""
+    return (min(repeat(lambda: parse_all(release_dates), number=1, repeat=RUNS))
+            / len(release_dates) * 1_000_000)
+
+
+if __name__ == "__main__":
+    dates = make_release_dates(int(argv[1]) if len(argv) > 1 else 50_000)
+    if parse_twice_uncached(dates) != parse_once_memoized(dates):
+        raise ValueError("The parsers disagree.")
+    before = best_time_per_listing(parse_twice_uncached, dates)
+    after = best_time_per_listing(parse_once_memoized, dates)
+    print(f"{len(dates):,} listings, {len(set(dates)):,} distinct dates")
+    print(f"{'twice, every format':>19} | {'once, memoized':>14} | speed-up")
+    print(f"{before:>17.2f}µs | {after:>12.2f}µs | {before / after:>7.1f}x")
@@ -0,0 +1,22 @@
+"""Makes the shared scraper modules importable by the tests, and runs every
+test against each installed HTML parser backend."""
+
+# pylint: skip-file
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "shared"))
+
+from html_parsing import BACKENDS, backend_is_installed
+
+
+@pytest.fixture(autouse=True, params=list(BACKENDS))
+def html_parser_backend(request, monkeypatch):
+    """Chooses the HTML parser backend for a test."""
+    if not backend_is_installed(request.param):
+        pytest.skip(f"The {request.param} backend is not installed.")
+    monkeypatch.setenv("HTML_PARSER_BACKEND", request.param)
+    return request.param
@@ -1,17 +1,46 @@
 """Script for the AWS lambda handler."""
 
 from datetime import datetime
+from json import dumps
 
-from scrape_steam import collect_and_parse_games
+from http_client import get_connection_stats
+from listing_stream import is_streaming, stream_listings
+import page_cache
+import parse_memo
+from retry import get_retry_stats
+from watermark import load_watermark, stage_watermark
+from scrape_steam import collect_and_parse_games, iter_games
 
 # pylint: disable=W0613
 
 
 def lambda_handler(event, context):
-    """Triggered with the lambda. Optional time argument can be
-    passed in event: 'time'."""
-    time_arg = datetime.now()
-    listings = collect_and_parse_games(time_arg)
+    """Triggered with the lambda. Scrapes today's releases, or backfills
+    every day between the optional 'start_date' and 'end_date' arguments
+    passed in the event, formatted as YYYY-MM-DD. When streaming, the
+    listings are written to a file and only its location is returned. The
+    optional 'watermark' argument, 'use', 'ignore' or 'reset', says whether
+    games already scraped are skipped. The watermark is staged last, for the
+    loader to commit once the games are loaded."""
+    event = event or {}
+    start_date, end_date = datetime.now(), None
+    if event.get("start_date"):
+        start_date = datetime.fromisoformat(event["start_date"])
+        end_date = datetime.fromisoformat(event.get("end_date", event["start_date"]))
+    watermark = load_watermark("steam", event.get("watermark"))
+    if is_streaming():
+        listings = dumps(stream_listings(
+            "steam", iter_games(start_date, end_date=end_date, watermark=watermark)))
+    else:
+        listings = collect_and_parse_games(start_date, end_date=end_date, watermark=watermark)
+    page_cache.evict()
+    parse_memo.evict()
+    print(f"HTTP connections: {get_connection_stats()}")
+    print(f"Retries: {get_retry_stats()}")
+    print(f"Page cache: {page_cache.get_page_cache_stats()}")
+    print(f"Parse memo: {parse_memo.get_parse_memo_stats()}")
+    print(f"Watermark: {watermark.get_stats()}")
+    stage_watermark(watermark)
     return {
         'statusCode': 200,
         'body': {
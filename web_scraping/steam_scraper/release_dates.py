@@ -0,0 +1,54 @@
+"""Parses the release dates shown on Steam's search results.
+
+Steam shows release dates in a handful of formats. They are tried in turn,
+starting with the one that last succeeded, as a page of results almost
+always uses a single one. Each distinct string is only parsed once: a search
+shows a few hundred distinct dates at most, so the parsed dates are memoized."""
+
+from datetime import datetime
+from functools import lru_cache
+
+DATE_FORMATS = [
+    '%d %B, %Y',
+    '%B %Y',
+    '%d %b, %Y',
+    '%Y-%m-%d'
+]
+CACHE_SIZE = 4096
+
+
+class ReleaseDateParser:
+    """Parses release date strings, remembering every string it has parsed
+    and the format that last matched."""
+
+    def __init__(self, date_formats: list[str] = None):
+        self.date_formats = list(date_formats or DATE_FORMATS)
+        self.last_format = self.date_formats[0]
+        self.parse = lru_cache(maxsize=CACHE_SIZE)(self.parse_uncached)
+
+    def get_formats(self) -> list[str]:
+        """Returns the formats in the order to try them."""
+        last_format = self.last_format
+        return [last_format] + [fmt for fmt in self.date_formats if fmt != last_format]
+
+    def parse_uncached(self, release_date_str: str) -> datetime:
+        """Returns the date a string shows, or None if it matches no format."""
+        for fmt in self.get_formats():
+            try:
+                release_date = datetime.strptime(release_date_str, fmt)
+            except ValueError:
+                continue
+            self.last_format = fmt
+            return release_date
+        return None
+
+
+PARSER = ReleaseDateParser()
+
+
+def parse_date(release_date_str: str) -> datetime:
+    """Returns the date a release date string shows, or None if it is empty
+    or not a date."""
+    if not release_date_str:
+        return None
+    return PARSER.parse(release_date_str)
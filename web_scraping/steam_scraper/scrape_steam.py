@@ -1,15 +1,43 @@
 """Script to web scrape the Steam new-releases page for new games."""
 
-from json import dumps
+from os import environ as ENV
+from json import dumps, loads
 from datetime import datetime
+from collections.abc import Iterator
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from html import unescape
 import re
 
 import requests as req
-import bs4
+
+import page_cache
+from html_parsing import HtmlNode, parse_html
+from rate_limiter import get_rate_limiter
+from app_page_extractor import EXTRACTOR_VERSION, extract_app_page_details
+from release_dates import parse_date
+from parse_memo import memoized
+from watermark import Watermark
 
 STEAM_NEW_RELEASE_URL = "https://store.steampowered.com/search/?sort_by=Released_DESC&category1=998"
+STEAM_SEARCH_RESULTS_URL = "https://store.steampowered.com/search/results/"
 STEAM_APP_URL = "https://store.steampowered.com/app/"
+STEAM_APP_DETAILS_URL = "https://store.steampowered.com/api/appdetails"
+STEAM_TAG_NAMES_URL = "https://store.steampowered.com/tagdata/populartags/english"
 TIMEOUT = 10
+SEARCH_PAGE_SIZE = 50
+MAX_WORKERS = int(ENV.get("STEAM_MAX_WORKERS", "8"))
+REQUESTS_PER_SECOND = float(ENV.get("STEAM_REQUESTS_PER_SECOND", "10"))
+DETAIL_PROVIDER = ENV.get("STEAM_DETAIL_PROVIDER", "api")
+APP_DETAILS_BATCH_SIZE = int(ENV.get("STEAM_APP_DETAILS_BATCH_SIZE", "1"))
+# A search result row lists at most this many of its game's tags.
+SEARCH_ROW_MAX_TAGS = 5
+OPERATING_SYSTEMS = {
+    'windows': 'Windows',
+    'mac': 'Mac',
+    'linux': 'Linux'
+}
 
 
 def format_price(price_str: str) -> int:
@@ -20,22 +48,88 @@ def format_price(price_str: str) -> int:
     return int(float(price_decimal) * 100)
 
 
+def limit_steam_requests() -> None:
+    """Gives the store's host `STEAM_REQUESTS_PER_SECOND` on the
+    process-wide rate limiter, so every request to Steam in the process,
+    from any batch or thread, shares one bucket."""
+    get_rate_limiter().set_host_rate(STEAM_APP_URL, REQUESTS_PER_SECOND)
+
+
 def load_page_source(url: str) -> str:
-    """Returns the raw HTML string of a web-page's content."""
-    response = req.get(url, timeout=TIMEOUT)
+    """Returns the raw HTML string of a web-page's content. Pages that have
+    not changed since they were cached are not downloaded again."""
+    limit_steam_requests()
+    response = page_cache.get(url, timeout=TIMEOUT)
     if response.status_code != 200:
         raise ConnectionError(f"Failed to connect to {url}.")
     return response.text
 
 
-def get_page_listings(page_source: str) -> list[bs4.Tag]:
+def load_page_sources(urls: list[str], max_workers: int = None) -> list[str]:
+    """Returns the raw HTML of several web-pages, fetched concurrently
+    by at most `max_workers` threads. The pages are returned in the same
+    order as their URLs."""
+    if max_workers is None:
+        max_workers = MAX_WORKERS
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        return list(executor.map(load_page_source, urls))
+
+
+def get_page_listings(page_source: str) -> list[HtmlNode]:
     """Returns a list of Steam game listing objects released on a certain date."""
-    page_soup = bs4.BeautifulSoup(page_source, 'html.parser')
-    search_result_rows = page_soup.find_all('a', class_='search_result_row')
+    page = parse_html(page_source)
+    search_result_rows = page.select('a.search_result_row')
     return search_result_rows
 
 
-def filter_timely_listings(listings: list[bs4.Tag], filter_date: datetime) -> list[bs4.Tag]:
+def load_search_results_page(start: int, count: int = SEARCH_PAGE_SIZE) -> dict:
+    """Returns one page of the new-releases search results from Steam's
+    infinite-scroll endpoint, starting at the `start`-th result."""
+    url = (f"{STEAM_SEARCH_RESULTS_URL}?sort_by=Released_DESC&category1=998"
+           f"&infinite=1&start={start}&count={count}")
+    return loads(load_page_source(url))
+
+
+def iter_search_listings(page_size: int = SEARCH_PAGE_SIZE) -> Iterator[HtmlNode]:
+    """Lazily yields every listing of the new-releases search results, newest
+    first. A page is only downloaded once the previous one is used up."""
+    start = 0
+    while True:
+        page = load_search_results_page(start, page_size)
+        listings = get_page_listings(page.get("results_html", ""))
+        if not listings:
+            return
+        yield from listings
+        start += len(listings)
+        if start >= page.get("total_count", 0):
+            return
+
+
+def iter_dated_listings(start_date: datetime, end_date: datetime = None,
+                        page_size: int = SEARCH_PAGE_SIZE) -> Iterator[tuple[HtmlNode, datetime]]:
+    """Lazily yields the listings released between two dates, inclusive,
+    each with its release date. The search is newest first, so no more pages
+    are downloaded once the release dates fall before the start date."""
+    end_date = end_date or start_date
+    for listing in iter_search_listings(page_size):
+        release_date = parse_release_date(listing)
+        if not release_date:
+            continue
+        if release_date.date() < start_date.date():
+            return
+        if release_date.date() <= end_date.date():
+            yield listing, release_date
+
+
+def iter_timely_listings(start_date: datetime, end_date: datetime = None,
+                         page_size: int = SEARCH_PAGE_SIZE) -> Iterator[HtmlNode]:
+    """Lazily yields the listings released between two dates, inclusive."""
+    for listing, _ in iter_dated_listings(start_date, end_date, page_size):
+        yield listing
+
+
+def filter_timely_listings(listings: list[HtmlNode], filter_date: datetime) -> list[HtmlNode]:
     """Filters game release listings to match a given date."""
     timely_listings = []
     for listing in listings:
@@ -46,51 +140,37 @@ def filter_timely_listings(listings: list[bs4.Tag], filter_date: datetime) -> li
     return timely_listings
 
 
-def parse_game_url(game_listing: bs4.Tag) -> str:
+def parse_game_url(game_listing: HtmlNode) -> str:
     """Extracts the URL from the game listing."""
     return game_listing.get('href')
 
 
-def parse_app_id(game_listing: bs4.Tag) -> str:
+def parse_app_id(game_listing: HtmlNode) -> str:
     """Extracts the App ID from the game listing."""
     return game_listing.get('data-ds-appid')
 
 
-def parse_image_url(game_listing: bs4.Tag) -> str:
+def parse_image_url(game_listing: HtmlNode) -> str:
     """Extracts the image URL from the game listing."""
-    img_tag = game_listing.find('img')
+    img_tag = game_listing.select_one('img')
     return img_tag.get('src') if img_tag else None
 
 
-def parse_title(game_listing: bs4.Tag) -> str:
+def parse_title(game_listing: HtmlNode) -> str:
     """Extracts the title from the game listing."""
-    title_tag = game_listing.find('span', class_='title')
+    title_tag = game_listing.select_one('span.title')
     return title_tag.text if title_tag else None
 
 
-def parse_release_date(game_listing: bs4.Tag) -> datetime:
+def parse_release_date(game_listing: HtmlNode) -> datetime:
     """Extracts the release date from the game listing."""
-    release_tag = game_listing.find('div', class_='search_released')
-    release_date_str = release_tag.text.strip() if release_tag else None
-    date_formats = [
-        '%d %B, %Y',
-        '%B %Y',
-        '%d %b, %Y',
-        '%Y-%m-%d'
-    ]
-
-    if release_date_str:
-        for fmt in date_formats:
-            try:
-                return datetime.strptime(release_date_str, fmt)
-            except ValueError:
-                pass
-    return None
-
-
-def parse_price(game_listing: bs4.Tag) -> str:
+    release_tag = game_listing.select_one('div.search_released')
+    return parse_date(release_tag.text.strip() if release_tag else None)
+
+
+def parse_price(game_listing: HtmlNode) -> str:
     """Extracts the price from the game listing and formats it."""
-    price_tag = game_listing.find('div', class_='discount_final_price')
+    price_tag = game_listing.select_one('div.discount_final_price')
     price = price_tag.text if price_tag else None
     return format_price(price)
 
@@ -100,40 +180,40 @@ def get_steam_app_url(app_id: str) -> str:
     return f"{STEAM_APP_URL}{app_id}/"
 
 
-def scrape_game_description(app_soup: bs4.BeautifulSoup) -> str:
+def scrape_game_description(app_page: HtmlNode) -> str:
     """Scrapes a game's Steam app page for description information."""
-    description_tag = app_soup.find('div', class_='game_description_snippet')
+    description_tag = app_page.select_one('div.game_description_snippet')
     if description_tag:
         return description_tag.text.strip()
     return "No description available."
 
 
-def scrape_game_tags(app_soup: bs4.BeautifulSoup) -> list[str]:
+def scrape_game_tags(app_page: HtmlNode) -> list[str]:
     """Scrapes a game's Steam app page for tags."""
-    tag_elements = app_soup.find_all('a', class_='app_tag')
+    tag_elements = app_page.select('a.app_tag')
     tags = [tag.text.strip() for tag in tag_elements]
     return tags if tags else []
 
 
-def scrape_game_nsfw(app_soup: bs4.BeautifulSoup) -> bool:
+def scrape_game_nsfw(app_page: HtmlNode) -> bool:
     """Returns True if a game is tagged as NSFW."""
-    headings = [heading.text.lower() for heading in app_soup.find_all('h2')]
+    headings = [heading.text.lower() for heading in app_page.select('h2')]
     return any('mature content' in heading for heading in headings)
 
 
-def scrape_game_genres(app_soup: bs4.BeautifulSoup) -> list[str]:
+def scrape_game_genres(app_page: HtmlNode) -> list[str]:
     """Scrapes a game's Steam app page for genres."""
-    genres_section = app_soup.find('div', id='genresAndManufacturer')
+    genres_section = app_page.select_one('div#genresAndManufacturer')
     if genres_section:
-        genre_elements = genres_section.find_all('a', href=True)
+        genre_elements = genres_section.select('a[href]')
         genres = [genre.text.strip()
-                  for genre in genre_elements if "genre" in genre['href']]
+                  for genre in genre_elements if "genre" in genre.get('href')]
     else:
         genres = []
     return genres
 
 
-def scrape_game_operating_systems(app_soup: bs4.BeautifulSoup) -> list[str]:
+def scrape_game_operating_systems(app_page: HtmlNode) -> list[str]:
     """Scrapes a game's Steam app page for supported operating systems."""
     platform_mapping = {
         'win': 'Windows',
@@ -141,47 +221,208 @@ def scrape_game_operating_systems(app_soup: bs4.BeautifulSoup) -> list[str]:
         'linux': 'Linux'
     }
     platforms = []
-    platform_elements = app_soup.find_all('span', class_='platform_img')
+    platform_elements = app_page.select('span.platform_img')
 
     for platform in platform_elements:
-        if 'class' in platform.attrs and len(platform['class']) > 1:
-            platform_class = platform['class'][1]
+        if len(platform.classes) > 1:
+            platform_class = platform.classes[1]
             if platform_class in platform_mapping:
                 platforms.append(platform_mapping[platform_class])
 
     return list(set(platforms)) if platforms else []
 
 
-def parse_game_listing(game_listing: bs4.Tag) -> dict:
-    """Parses game information from a game listing div."""
-    app_id = parse_app_id(game_listing)
-    steam_app = get_steam_app_url(app_id)
-    steam_app_page_source = load_page_source(steam_app)
-    app_soup = bs4.BeautifulSoup(steam_app_page_source, 'html.parser')
+def scrape_app_tree_details(app_page: HtmlNode) -> dict:
+    """Scrapes the details of a game from the parsed tree of its Steam app
+    page, walking the tree once for each field."""
+    return {
+        'description': scrape_game_description(app_page),
+        'operating_systems': scrape_game_operating_systems(app_page),
+        'genres': scrape_game_genres(app_page),
+        'is_nsfw': scrape_game_nsfw(app_page),
+        'tags': scrape_game_tags(app_page),
+    }
+
+
+@memoized("steam-app-page", EXTRACTOR_VERSION)
+def scrape_app_page_details(steam_app_page_source: str) -> dict:
+    """Scrapes the details of a game from its Steam app page, in a single
+    pass over the page's HTML. Returns the same details as
+    `scrape_app_tree_details` with the 'html.parser' backend. A page
+    identical to one already scraped is not parsed again."""
+    return extract_app_page_details(steam_app_page_source)
+
 
+def parse_tag_ids(game_listing: HtmlNode) -> list[int]:
+    """Extracts the IDs of the game's tags from the game listing, or None
+    if the listing has none or may only have some of them: a row lists at
+    most `SEARCH_ROW_MAX_TAGS`, while the app page lists them all."""
+    tag_ids = game_listing.get('data-ds-tagids')
+    tag_ids = loads(tag_ids) if tag_ids else None
+    if tag_ids is None or len(tag_ids) >= SEARCH_ROW_MAX_TAGS:
+        return None
+    return tag_ids
+
+
+def get_app_details_url(app_ids: list[str]) -> str:
+    """Formats the app details API url for a batch of apps."""
+    return f"{STEAM_APP_DETAILS_URL}?appids={','.join(app_ids)}&l=english"
+
+
+@lru_cache(maxsize=1)
+def get_tag_names() -> dict[int, str]:
+    """Returns a map of every Steam tag ID to its name. Only downloaded
+    once per process."""
+    tags = loads(load_page_source(STEAM_TAG_NAMES_URL))
+    return {tag['tagid']: tag['name'] for tag in tags}
+
+
+def parse_app_details(app_details: dict, tag_ids: list[int], tag_names: dict) -> dict:
+    """Formats an app's entry in the app details API, returning None if any
+    of the fields needed are missing."""
+    if not app_details or not app_details.get('success'):
+        return None
+    data = app_details.get('data', {})
+    required_fields = ['short_description', 'genres', 'platforms', 'content_descriptors']
+    if tag_ids is None or any(field not in data for field in required_fields):
+        return None
+    if any(tag_id not in tag_names for tag_id in tag_ids):
+        return None
+
+    return {
+        'description': unescape(data['short_description']).strip(),
+        'operating_systems': [name for platform, name in OPERATING_SYSTEMS.items()
+                              if data['platforms'].get(platform)],
+        'genres': [genre['description'] for genre in data['genres']],
+        'is_nsfw': bool(data['content_descriptors'].get('notes')),
+        'tags': [tag_names[tag_id] for tag_id in tag_ids],
+    }
+
+
+def get_details_from_app_pages(listings: list[HtmlNode], max_workers: int = None) -> list[dict]:
+    """Detail provider which scrapes every listing's Steam app page,
+    downloading the pages concurrently."""
+    app_urls = [get_steam_app_url(parse_app_id(x)) for x in listings]
+    return [scrape_app_page_details(source)
+            for source in load_page_sources(app_urls, max_workers)]
+
+
+def get_details_from_api(listings: list[HtmlNode], max_workers: int = None) -> list[dict]:
+    """Detail provider which reads listings' details from Steam's app
+    details API, in batches of `APP_DETAILS_BATCH_SIZE` apps. The tags are
+    taken from the listing itself. A listing's details are None when the
+    API does not have all of them, or the listing may not hold all of its
+    tags, so that its app page is scraped instead; the API is not asked
+    about those listings at all."""
+    tag_ids = [parse_tag_ids(x) for x in listings]
+    app_ids = [parse_app_id(x) for x, ids in zip(listings, tag_ids) if ids is not None]
+    if not app_ids:
+        return [None for _ in listings]
+    batch_urls = [get_app_details_url(app_ids[i:i + APP_DETAILS_BATCH_SIZE])
+                  for i in range(0, len(app_ids), APP_DETAILS_BATCH_SIZE)]
+    try:
+        tag_names = get_tag_names()
+        app_details = {}
+        for source in load_page_sources(batch_urls, max_workers):
+            app_details.update(loads(source) or {})
+    except (ConnectionError, req.RequestException, ValueError):
+        return [None for _ in listings]
+
+    return [parse_app_details(app_details.get(parse_app_id(listing)), ids, tag_names)
+            if ids is not None else None
+            for listing, ids in zip(listings, tag_ids)]
+
+
+DETAIL_PROVIDERS = {
+    'api': get_details_from_api,
+    'html': get_details_from_app_pages
+}
+
+
+def get_app_details(listings: list[HtmlNode], max_workers: int = None,
+                    provider: str = None) -> list[dict]:
+    """Returns the details of every listing's app from the chosen detail
+    provider. Listings the provider has no complete details for fall back
+    to having their app pages scraped."""
+    details = DETAIL_PROVIDERS[provider or DETAIL_PROVIDER](listings, max_workers)
+    missing = [i for i, app_details in enumerate(details) if app_details is None]
+    if missing:
+        scraped = get_details_from_app_pages([listings[i] for i in missing], max_workers)
+        for i, app_details in zip(missing, scraped):
+            details[i] = app_details
+    return details
+
+
+def build_game(game_listing: HtmlNode, app_details: dict, release_date: datetime = None) -> dict:
+    """Combines a game listing with the details of its app. The listing's
+    release date is parsed unless it is passed in."""
+    release_date = release_date or parse_release_date(game_listing)
     return {
         'title': parse_title(game_listing),
-        'description': scrape_game_description(app_soup),
-        'release_date': datetime.strftime(parse_release_date(game_listing), '%d/%m/%Y'),
-        'operating_systems': scrape_game_operating_systems(app_soup),
-        'genres': scrape_game_genres(app_soup),
-        'is_nsfw': scrape_game_nsfw(app_soup),
-        'tags': scrape_game_tags(app_soup),
+        'description': app_details['description'],
+        'release_date': datetime.strftime(release_date, '%d/%m/%Y'),
+        'operating_systems': app_details['operating_systems'],
+        'genres': app_details['genres'],
+        'is_nsfw': app_details['is_nsfw'],
+        'tags': app_details['tags'],
         'current_price': parse_price(game_listing),
         'url': parse_game_url(game_listing),
         'img_url': parse_image_url(game_listing),
     }
 
 
-def collect_and_parse_games(scrape_date: datetime = None) -> str:
+def parse_game_listing(game_listing: HtmlNode, steam_app_page_source: str = None) -> dict:
+    """Parses game information from a game listing div and its app page.
+    The game's app page is downloaded unless its source is passed in."""
+    if steam_app_page_source is None:
+        app_id = parse_app_id(game_listing)
+        steam_app_page_source = load_page_source(get_steam_app_url(app_id))
+    return build_game(game_listing, scrape_app_page_details(steam_app_page_source))
+
+
+def parse_game_listings(listings: list[HtmlNode], max_workers: int = None,
+                        release_dates: list[datetime] = None) -> list[dict]:
+    """Parses several game listings, fetching their details concurrently.
+    The listings' release dates are parsed unless they are passed in."""
+    release_dates = release_dates or [None] * len(listings)
+    return [build_game(listing, app_details, release_date)
+            for listing, app_details, release_date
+            in zip(listings, get_app_details(listings, max_workers), release_dates)]
+
+
+def iter_games(scrape_date: datetime = None, max_workers: int = None,
+               end_date: datetime = None, watermark: Watermark = None) -> Iterator[dict]:
+    """Lazily yields the parsed games, a page of the search results at a
+    time. Given a date, every page of the search results released on that
+    date is crawled; given an end date too, every day up to it is backfilled.
+    The app pages of each page's listings are downloaded concurrently, and
+    each listing's release date is only parsed once. Listings the watermark
+    has already seen are skipped before their details are downloaded, and
+    the rest recorded in it."""
+    if scrape_date:
+        listings = iter_dated_listings(scrape_date, end_date)
+    else:
+        listings = ((listing, None) for listing in
+                    get_page_listings(load_page_source(STEAM_NEW_RELEASE_URL)))
+
+    if watermark is not None:
+        listings = ((listing, release_date) for listing, release_date in listings
+                    if not watermark.has_seen(parse_game_url(listing)))
+
+    while batch := list(islice(listings, SEARCH_PAGE_SIZE)):
+        batch_listings, release_dates = zip(*batch)
+        games = parse_game_listings(list(batch_listings), max_workers, list(release_dates))
+        if watermark is not None:
+            games = watermark.track(games)
+        yield from games
+
+
+def collect_and_parse_games(scrape_date: datetime = None, max_workers: int = None,
+                            end_date: datetime = None, watermark: Watermark = None) -> str:
     """Collects the listings and parses them for information, adding them
     to an overall dictionary which is returned a JSON string for the lambda."""
-    source = load_page_source(STEAM_NEW_RELEASE_URL)
-    listings = get_page_listings(source)
-    if scrape_date:
-        listings = filter_timely_listings(listings, scrape_date)
     listings_dict = {
         "platform": "steam",
-        "listings": [parse_game_listing(x) for x in listings]
+        "listings": list(iter_games(scrape_date, max_workers, end_date, watermark))
     }
     return dumps(listings_dict)
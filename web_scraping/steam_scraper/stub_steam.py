@@ -0,0 +1,74 @@
+"""Pages of a local stub of the Steam store, used by the tests and benchmarks
+with `stub_server.serve_pages`."""
+
+from json import dumps
+
+
+def make_search_row(app_id: int, title: str, release_date: str, price: str = "£9.99",
+                    tag_ids: list[int] = None) -> str:
+    """Returns the HTML of a single row of the Steam search results."""
+    tag_ids_attr = f'data-ds-tagids="{dumps(tag_ids)}"' if tag_ids is not None else ""
+    return f"""
+    <a href="https://store.steampowered.com/app/{app_id}/{title.replace(' ', '_')}/"
+       data-ds-appid="{app_id}" {tag_ids_attr} class="search_result_row ds_collapse_flag">
+        <div class="col search_capsule"><img src="https://cdn.steam.com/{app_id}.jpg"></div>
+        <div class="responsive_search_name_combined">
+            <div class="col search_name ellipsis"><span class="title">{title}</span></div>
+            <div class="col search_released responsive_secondrow">{release_date}</div>
+            <div class="discount_final_price">{price}</div>
+        </div>
+    </a>"""
+
+
+def make_search_page(rows: list[str]) -> str:
+    """Returns a Steam search results page containing the given rows."""
+    return f"""<html><body><div id="search_resultsRows">{''.join(rows)}</div></body></html>"""
+
+
+def make_app_page(description: str = "A game.", tags: list[str] = None,
+                  genres: list[str] = None, platforms: list[str] = None,
+                  is_nsfw: bool = False) -> str:
+    """Returns a Steam app page containing the given details."""
+    tags = tags or []
+    genres = genres or []
+    platforms = platforms or []
+    tag_html = "".join(f'<a class="app_tag" href="/tags/{tag}"> {tag} </a>'
+                       for tag in tags)
+    genre_html = "".join(f'<a href="https://store.steampowered.com/genre/{genre}/">{genre}</a>, '
+                         for genre in genres)
+    platform_html = "".join(f'<span class="platform_img {platform}"></span>'
+                            for platform in platforms)
+    mature_html = "<h2>Mature Content Description</h2>" if is_nsfw else ""
+    return f"""<html><head><script>var g_AppTags = [];</script></head><body>
+        <div class="game_description_snippet"> {description} </div>
+        <div class="glance_tags popular_tags">{tag_html}</div>
+        <h2>About This Game</h2>{mature_html}
+        <div id="genresAndManufacturer"><b>Genre:</b> <span>{genre_html}</span>
+            <a href="https://store.steampowered.com/developer/someone">Someone</a></div>
+        <div class="game_area_purchase_platform">{platform_html}</div>
+        </body></html>"""
+
+
+def make_app_details(description: str = "A game.", genres: list[str] = None,
+                     platforms: list[str] = None, is_nsfw: bool = False) -> dict:
+    """Returns the entry of an app in a response of Steam's app details API."""
+    return {
+        "success": True,
+        "data": {
+            "type": "game",
+            "short_description": description,
+            "genres": [{"id": str(i), "description": genre}
+                       for i, genre in enumerate(genres or [])],
+            "platforms": {platform: platform in (platforms or [])
+                          for platform in ("windows", "mac", "linux")},
+            "content_descriptors": {"ids": [5] if is_nsfw else [],
+                                    "notes": "Violence." if is_nsfw else None}
+        }
+    }
+
+
+def make_search_results(rows: list[str], start: int, total_count: int) -> str:
+    """Returns a page of the Steam search results, as returned by the
+    infinite-scroll endpoint."""
+    return dumps({"success": 1, "results_html": "".join(rows),
+                  "total_count": total_count, "start": start})
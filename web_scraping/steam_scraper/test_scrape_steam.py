@@ -2,15 +2,33 @@
 
 # pylint: skip-file
 
+from contextlib import ExitStack
+from pathlib import Path
+from json import loads, dumps
 from unittest import mock
-from bs4 import BeautifulSoup
 from datetime import datetime
+from time import monotonic
 
 import pytest
 
+import page_cache
+import parse_memo
+import rate_limiter
+import retry
+import scrape_steam
+from release_dates import ReleaseDateParser
 from scrape_steam import (load_page_source, format_price, get_steam_app_url, parse_release_date,
                           scrape_game_description, scrape_game_tags, scrape_game_nsfw, scrape_game_genres,
-                          scrape_game_operating_systems)
+                          scrape_game_operating_systems, load_page_sources,
+                          collect_and_parse_games, iter_search_listings, iter_timely_listings,
+                          parse_title, parse_app_details, get_app_details, get_tag_names,
+                          get_page_listings, scrape_app_tree_details, scrape_app_page_details)
+from app_page_extractor import extract_app_page_details
+from html_parsing import parse_html
+from stub_server import RESET, serve_pages
+from stub_steam import (make_search_page, make_search_row, make_app_page,
+                         make_search_results, make_app_details)
+from watermark import Watermark
 
 
 @pytest.mark.parametrize("html, expected", [
@@ -26,8 +44,8 @@ from scrape_steam import (load_page_source, format_price, get_steam_app_url, par
     ('', [])
 ])
 def test_scrape_game_operating_systems(html, expected):
-    soup = BeautifulSoup(html, 'html.parser')
-    assert sorted(scrape_game_operating_systems(soup)) == sorted(expected)
+    page = parse_html(html)
+    assert sorted(scrape_game_operating_systems(page)) == sorted(expected)
 
 
 @pytest.mark.parametrize("html, expected", [
@@ -40,8 +58,8 @@ def test_scrape_game_operating_systems(html, expected):
     ('<div id="genresAndManufacturer"></div>', [])
 ])
 def test_scrape_game_genres(html, expected):
-    soup = BeautifulSoup(html, 'html.parser')
-    assert scrape_game_genres(soup) == expected
+    page = parse_html(html)
+    assert scrape_game_genres(page) == expected
 
 
 @pytest.mark.parametrize("html, expected", [
@@ -53,8 +71,8 @@ def test_scrape_game_genres(html, expected):
     ('', False)
 ])
 def test_scrape_game_nsfw(html, expected):
-    soup = BeautifulSoup(html, 'html.parser')
-    assert scrape_game_nsfw(soup) == expected
+    page = parse_html(html)
+    assert scrape_game_nsfw(page) == expected
 
 
 @pytest.mark.parametrize("html, expected", [
@@ -67,8 +85,8 @@ def test_scrape_game_nsfw(html, expected):
     ('', [])
 ])
 def test_scrape_game_tags(html, expected):
-    soup = BeautifulSoup(html, 'html.parser')
-    assert scrape_game_tags(soup) == expected
+    page = parse_html(html)
+    assert scrape_game_tags(page) == expected
 
 
 @pytest.mark.parametrize("html, expected", [
@@ -82,8 +100,28 @@ def test_scrape_game_tags(html, expected):
 ])
 def test_scrape_game_description(html, expected):
     """Tests that the scrape game description function can handle a range of inputs."""
-    soup = BeautifulSoup(html, 'html.parser')
-    assert scrape_game_description(soup) == expected
+    page = parse_html(html)
+    assert scrape_game_description(page) == expected
+
+
+def test_release_date_parser_memoizes_strings():
+    """Tests that a string already parsed is not parsed again."""
+    parser = ReleaseDateParser()
+    with mock.patch.object(parser, "get_formats", wraps=parser.get_formats) as spy:
+        assert parser.parse("18 Oct, 2026") == datetime(2026, 10, 18)
+        assert parser.parse("18 Oct, 2026") == datetime(2026, 10, 18)
+    assert spy.call_count == 1
+
+
+def test_release_date_parser_tries_the_last_format_first():
+    """Tests that the format which last matched is tried before the others."""
+    parser = ReleaseDateParser()
+    parser.parse("18 Oct, 2026")
+    assert parser.get_formats()[0] == "%d %b, %Y"
+    assert parser.parse("2026-10-19") == datetime(2026, 10, 19)
+    assert parser.get_formats() == ["%Y-%m-%d", "%d %B, %Y", "%B %Y", "%d %b, %Y"]
+    assert parser.parse("Coming soon") is None
+    assert parser.get_formats()[0] == "%Y-%m-%d"
 
 
 @pytest.mark.parametrize("html, expected", [
@@ -97,8 +135,8 @@ def test_scrape_game_description(html, expected):
 ])
 def test_parse_release_date(html, expected):
     """Tests that the parse release date is capable of parsing a range of different date strings."""
-    soup = BeautifulSoup(html, 'html.parser')
-    assert parse_release_date(soup) == expected
+    page = parse_html(html)
+    assert parse_release_date(page) == expected
 
 
 @pytest.mark.parametrize("price_str, expected", [
@@ -120,7 +158,7 @@ def test_format_price(price_str, expected):
     assert format_price(price_str) == expected
 
 
-@mock.patch('requests.get')
+@mock.patch('http_client.get')
 def test_load_page_source_200_code_returns_string(mocked_get):
     """Tests that a get request with a 200 status code returns a string of the correct value."""
     mocked_response = mock.MagicMock()
@@ -133,7 +171,7 @@ def test_load_page_source_200_code_returns_string(mocked_get):
     assert content == mocked_response.text
 
 
-@mock.patch('requests.get')
+@mock.patch('http_client.get')
 def test_load_page_source_404_raises_error(mocked_get):
     """Tests that a get request with a 404 status code raises a connection error."""
     mocked_response = mock.MagicMock()
@@ -144,9 +182,9 @@ def test_load_page_source_404_raises_error(mocked_get):
         load_page_source(sample_url)
 
 
-@mock.patch('requests.get')
+@mock.patch('http_client.get')
 def test_load_page_source_calls_get(mocked_get):
-    """Tests that a function call to load page source calls requests.get once."""
+    """Tests that a function call to load page source sends one request through the shared client."""
     mocked_get.return_value.status_code = 200
     mocked_get.return_value.text = "Sample Page Content"
     sample_url = "https://www.url.com"
@@ -154,6 +192,20 @@ def test_load_page_source_calls_get(mocked_get):
     assert mocked_get.assert_called_once
 
 
+def test_load_page_source_revalidates_cached_pages(monkeypatch, tmp_path):
+    """Tests that an unchanged app page is served from the page cache rather than downloaded again."""
+    monkeypatch.setenv("PAGE_CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("PAGE_CACHE_PATH", str(tmp_path / "pages.sqlite3"))
+    monkeypatch.setattr(page_cache, "_cache", None)
+    received = []
+    page = make_app_page("A game.", tags=["Indie"])
+    with serve_pages({"/app/1/": page}, received=received, validators=True) as base_url:
+        first = load_page_source(f"{base_url}/app/1/")
+        second = load_page_source(f"{base_url}/app/1/")
+    assert first == second == page
+    assert "If-None-Match" in received[1][1]
+
+
 @pytest.mark.parametrize(
     "app_id, expected_url",
     [
@@ -166,3 +218,320 @@ def test_load_page_source_calls_get(mocked_get):
 def test_get_steam_app_url(app_id, expected_url):
     """Tests that steam app urls are correctly formed."""
     assert get_steam_app_url(app_id) == expected_url
+
+
+def test_load_page_sources_keeps_url_order():
+    """Tests that concurrently fetched pages come back in the order of their URLs."""
+    pages = {f"/app/{i}/": f"<p>{i}</p>" for i in range(20)}
+    with serve_pages(pages, latency=0.01) as base_url:
+        urls = [f"{base_url}/app/{i}/" for i in reversed(range(20))]
+        sources = load_page_sources(urls, max_workers=8)
+    assert sources == [f"<p>{i}</p>" for i in reversed(range(20))]
+
+
+def test_steam_rate_is_kept_across_batches(monkeypatch):
+    """Tests that every batch of app pages waits on the one process-wide
+    limiter, so the Steam rate holds over a whole run, not per batch."""
+    monkeypatch.setattr(rate_limiter, "_limiter", rate_limiter.HostRateLimiter(0))
+    with serve_pages({f"/app/{i}/": "<p></p>" for i in range(6)}) as base_url:
+        monkeypatch.setattr(scrape_steam, "STEAM_APP_URL", f"{base_url}/app/")
+        monkeypatch.setattr(scrape_steam, "REQUESTS_PER_SECOND", 20)
+        start = monotonic()
+        for i in range(6):
+            load_page_sources([f"{base_url}/app/{i}/"])
+        assert monotonic() - start >= 0.24
+
+
+def test_load_page_sources_raises_on_missing_page():
+    """Tests that a failed page fails the whole fetch, like the sequential version."""
+    with serve_pages({}) as base_url:
+        with pytest.raises(ConnectionError):
+            load_page_sources([f"{base_url}/app/1/"])
+
+
+def test_load_page_sources_retries_failed_pages(monkeypatch):
+    """Tests that a page failing once is fetched again on its own, rather
+    than failing the whole fetch."""
+    monkeypatch.setattr(retry, "_policy", retry.RetryPolicy(max_retries=2, base_delay=0.01))
+    received = []
+    pages = {f"/app/{i}/": f"<p>{i}</p>" for i in range(6)}
+    faults = {"/app/2/": [(503, {"Retry-After": "0"})], "/app/4/": [RESET]}
+    with serve_pages(pages, received=received, faults=faults) as base_url:
+        sources = load_page_sources([f"{base_url}/app/{i}/" for i in range(6)],
+                                    max_workers=3)
+    assert sources == [f"<p>{i}</p>" for i in range(6)]
+    assert len(received) == 8
+
+
+TAG_NAMES = [{"tagid": 492, "name": "Indie"}, {"tagid": 19, "name": "Action"},
+             {"tagid": 122, "name": "RPG"}, {"tagid": 597, "name": "Casual"},
+             {"tagid": 21, "name": "Adventure"}, {"tagid": 9, "name": "Strategy"}]
+
+
+@pytest.fixture
+def stub_steam():
+    """Points the scraper at a local stub store, which serves the given search
+    result rows a page at a time, a map of app IDs to app pages and a map of
+    app IDs to their app details API entries.
+    Every request is appended to `received`, if it is given.
+    Returns the list of `start` offsets requested from the search."""
+    with ExitStack() as stack:
+        def serve(rows: list[str], app_pages: dict = None, app_details: dict = None,
+                  received: list = None) -> list[int]:
+            requested_starts = []
+
+            def search_results(query: dict) -> str:
+                start, count = int(query["start"][0]), int(query["count"][0])
+                requested_starts.append(start)
+                return make_search_results(rows[start:start + count], start, len(rows))
+
+            def app_details_results(query: dict) -> str:
+                app_ids = query["appids"][0].split(",")
+                return dumps({app_id: app_details.get(int(app_id), {"success": False})
+                              for app_id in app_ids})
+
+            pages = {"/search/results/": search_results,
+                     "/tagdata/populartags/english": dumps(TAG_NAMES)}
+            if app_details is not None:
+                pages["/api/appdetails"] = app_details_results
+            pages.update({f"/app/{app_id}/": page
+                          for app_id, page in (app_pages or {}).items()})
+            base_url = stack.enter_context(serve_pages(pages, received=received))
+            stack.enter_context(mock.patch.multiple(
+                scrape_steam, STEAM_SEARCH_RESULTS_URL=f"{base_url}/search/results/",
+                STEAM_APP_URL=f"{base_url}/app/",
+                STEAM_APP_DETAILS_URL=f"{base_url}/api/appdetails",
+                STEAM_TAG_NAMES_URL=f"{base_url}/tagdata/populartags/english",
+                REQUESTS_PER_SECOND=0))
+            get_tag_names.cache_clear()
+            return requested_starts
+        yield serve
+        get_tag_names.cache_clear()
+
+
+DATED_ROWS = [make_search_row(i, f"Game {i}", date) for i, date in enumerate(
+    ["20 Oct, 2026", "19 Oct, 2026", "Coming soon", "18 Oct, 2026", "18 Oct, 2026",
+     "18 Oct, 2026", "17 Oct, 2026", "16 Oct, 2026", "15 Oct, 2026", "14 Oct, 2026"])]
+
+
+def test_iter_search_listings_walks_every_page(stub_steam):
+    """Tests that the paginator yields every result, in order, across pages."""
+    stub_steam(DATED_ROWS)
+    titles = [parse_title(listing) for listing in iter_search_listings(page_size=3)]
+    assert titles == [f"Game {i}" for i in range(10)]
+
+
+def test_iter_timely_listings_stops_before_the_target_date(stub_steam):
+    """Tests that only the target date is yielded, and no page after it is fetched."""
+    requested_starts = stub_steam(DATED_ROWS)
+    listings = iter_timely_listings(datetime(2026, 10, 18), page_size=3)
+    assert [parse_title(listing) for listing in listings] == ["Game 3", "Game 4", "Game 5"]
+    assert requested_starts == [0, 3, 6]
+
+
+def test_iter_timely_listings_backfills_a_date_range(stub_steam):
+    """Tests that a backfill yields every listing between the two dates."""
+    stub_steam(DATED_ROWS)
+    listings = iter_timely_listings(datetime(2026, 10, 15), datetime(2026, 10, 18), page_size=4)
+    assert [parse_title(listing) for listing in listings] == \
+        [f"Game {i}" for i in range(3, 9)]
+
+
+def test_release_dates_are_parsed_once_per_listing(stub_steam):
+    """Tests that a backfill does not parse a listing's release date again
+    when building its game."""
+    app_pages = {i: make_app_page(f"Game {i}.") for i in range(10)}
+    stub_steam(DATED_ROWS, app_pages)
+    with mock.patch("scrape_steam.parse_release_date",
+                    wraps=scrape_steam.parse_release_date) as spy:
+        games = loads(collect_and_parse_games(datetime(2026, 10, 15), 2, datetime(2026, 10, 18)))
+    assert [game["release_date"] for game in games["listings"]] == [
+        "18/10/2026", "18/10/2026", "18/10/2026", "17/10/2026", "16/10/2026", "15/10/2026"]
+    assert spy.call_count == 10
+
+
+def test_watermarked_listings_are_not_fetched_again(stub_steam):
+    """Tests that a listing scraped by an earlier run has none of its details
+    downloaded again."""
+    app_pages = {i: make_app_page(f"Game {i}.") for i in range(10)}
+    stub_steam(DATED_ROWS, app_pages)
+    watermark = Watermark("steam")
+    collect_and_parse_games(datetime(2026, 10, 15), 2, datetime(2026, 10, 18), watermark)
+    assert watermark.last_release == datetime(2026, 10, 18)
+    assert len(watermark.seen) == 6
+
+    with mock.patch("scrape_steam.get_app_details",
+                    wraps=scrape_steam.get_app_details) as spy:
+        games = loads(collect_and_parse_games(datetime(2026, 10, 14), 2,
+                                              datetime(2026, 10, 18), watermark))
+    assert [game["title"] for game in games["listings"]] == ["Game 9"]
+    assert [parse_title(listing) for listing in spy.call_args.args[0]] == ["Game 9"]
+    assert watermark.get_stats()["skipped"] == 6
+
+
+def test_iter_timely_listings_is_lazy(stub_steam):
+    """Tests that pages are only fetched as listings are consumed."""
+    requested_starts = stub_steam(DATED_ROWS)
+    listings = iter_timely_listings(datetime(2026, 10, 19), datetime(2026, 10, 20), page_size=2)
+    next(listings)
+    assert requested_starts == [0]
+    next(listings)
+    assert requested_starts == [0]
+
+
+def test_collect_and_parse_games_matches_sequential_output(stub_steam):
+    """Tests that the concurrent scrape returns exactly what a single worker does."""
+    rows = [make_search_row(i, f"Game {i}", "18 Oct, 2026") for i in range(12)]
+    app_pages = {i: make_app_page(f"Game {i}.", tags=["Indie"], genres=["Action"],
+                                  platforms=["win", "linux"])
+                 for i in range(12)}
+    stub_steam(rows, app_pages)
+
+    sequential = collect_and_parse_games(datetime(2026, 10, 18), max_workers=1)
+    concurrent = collect_and_parse_games(datetime(2026, 10, 18), max_workers=6)
+
+    assert concurrent == sequential
+    assert [game["title"] for game in loads(concurrent)["listings"]] == \
+        [f"Game {i}" for i in range(12)]
+
+
+@pytest.mark.parametrize("missing_field", ["short_description", "genres", "platforms",
+                                           "content_descriptors"])
+def test_parse_app_details_missing_field_returns_none(missing_field):
+    """Tests that incomplete API details are rejected, so the app page is scraped instead."""
+    app_details = make_app_details()
+    del app_details["data"][missing_field]
+    assert parse_app_details(app_details, [492], {492: "Indie"}) is None
+
+
+@pytest.mark.parametrize("app_details, tag_ids", [
+    (None, [492]),
+    ({"success": False}, [492]),
+    (make_app_details(), None),
+    (make_app_details(), [12345]),
+])
+def test_parse_app_details_unusable_returns_none(app_details, tag_ids):
+    """Tests that failed lookups and unknown or missing tags are rejected."""
+    assert parse_app_details(app_details, tag_ids, {492: "Indie"}) is None
+
+
+def test_parse_app_details():
+    """Tests that an app's API entry is formatted like its scraped app page."""
+    app_details = make_app_details("A &quot;great&quot; game. ", genres=["Action", "RPG"],
+                                   platforms=["windows", "linux"], is_nsfw=True)
+    assert parse_app_details(app_details, [19, 492], {492: "Indie", 19: "Action"}) == {
+        "description": 'A "great" game.',
+        "operating_systems": ["Windows", "Linux"],
+        "genres": ["Action", "RPG"],
+        "is_nsfw": True,
+        "tags": ["Action", "Indie"],
+    }
+
+
+def test_get_app_details_falls_back_to_app_pages(stub_steam):
+    """Tests that the API is used where it is complete, and the app page is scraped otherwise."""
+    incomplete = make_app_details("From the API.")
+    del incomplete["data"]["genres"]
+    rows = [make_search_row(1, "Game 1", "18 Oct, 2026", tag_ids=[492]),
+            make_search_row(2, "Game 2", "18 Oct, 2026", tag_ids=[492]),
+            make_search_row(3, "Game 3", "18 Oct, 2026")]
+    stub_steam(rows,
+               app_pages={2: make_app_page("From the page.", tags=["Indie"], genres=["RPG"]),
+                          3: make_app_page("Also from the page.", tags=["Action"])},
+               app_details={1: make_app_details("From the API.", genres=["Action"],
+                                                platforms=["windows"]),
+                            2: incomplete,
+                            3: make_app_details("From the API.")})
+
+    details = get_app_details(get_page_listings(make_search_page(rows)), provider="api")
+
+    assert [app["description"] for app in details] == \
+        ["From the API.", "From the page.", "Also from the page."]
+    assert details[0] == {"description": "From the API.", "operating_systems": ["Windows"],
+                          "genres": ["Action"], "is_nsfw": False, "tags": ["Indie"]}
+
+
+@pytest.mark.parametrize("tags", [["Indie", "Action"],
+                                  ["Indie", "Action", "RPG", "Casual", "Adventure", "Strategy"]])
+def test_detail_providers_agree(stub_steam, tags):
+    """Tests that the API and the app page give the same details for the
+    same game, including every tag when the search row only lists some."""
+    tag_ids = {tag["name"]: tag["tagid"] for tag in TAG_NAMES}
+    rows = [make_search_row(1, "Game 1", "18 Oct, 2026",
+                            tag_ids=[tag_ids[tag] for tag in tags[:5]])]
+    stub_steam(rows,
+               app_pages={1: make_app_page("A game.", tags=tags, genres=["RPG"],
+                                           platforms=["win"], is_nsfw=True)},
+               app_details={1: make_app_details("A game.", genres=["RPG"],
+                                                platforms=["windows"], is_nsfw=True)})
+    listings = get_page_listings(make_search_page(rows))
+
+    from_api = get_app_details(listings, provider="api")
+    from_pages = get_app_details(listings, provider="html")
+
+    assert from_api == from_pages
+    assert from_api[0]["tags"] == tags
+
+
+def test_rows_with_truncated_tags_only_fetch_their_app_page(stub_steam):
+    """Tests that a search row listing as many tags as a row can show has
+    only its app page fetched, without asking the API about it first."""
+    received = []
+    rows = [make_search_row(1, "Game 1", "18 Oct, 2026", tag_ids=[492, 19, 122, 597, 21])]
+    stub_steam(rows, app_pages={1: make_app_page("From the page.", tags=["Indie"])},
+               app_details={1: make_app_details("From the API.")}, received=received)
+
+    details = get_app_details(get_page_listings(make_search_page(rows)), provider="api")
+
+    assert details[0]["description"] == "From the page."
+    assert [path for path, _ in received] == ["/app/1/"]
+
+
+def test_get_app_details_unavailable_api_scrapes_app_pages(stub_steam):
+    """Tests that the app pages are scraped when the API cannot be reached."""
+    rows = [make_search_row(1, "Game 1", "18 Oct, 2026", tag_ids=[492])]
+    stub_steam(rows, app_pages={1: make_app_page("From the page.")})
+    details = get_app_details(get_page_listings(make_search_page(rows)), provider="api")
+    assert details[0]["description"] == "From the page."
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@pytest.mark.parametrize("html", [
+    '<div class="game_description_snippet">A<script>x</script><!--c--> &amp; <b>b</b></div>',
+    '<div class="game_description_snippet"><p>Never closed',
+    '<div class="game_description_snippet"/>Not inside',
+    '<div class="game_description_snippet">First</div><div class="game_description_snippet">Second</div>',
+    '<div id="genresAndManufacturer"><a href="/genre/x">X<a href="/genre/y">Y</a></a><a href>Z</a></div>'
+    '<a href="/genre/outside">Outside</a>',
+    '<a class="app_tag">Outer<a class="app_tag"> Inner </a></a><div class="app_tag">Not a link</div>',
+    '<h2>Mature <br> Content</h2><h2><script>mature content</script></h2>',
+    '<span class="platform_img win"></span><span class="platform_img linux">'
+    '<span class="platform_img mac"><span class="platform_img">',
+    '<div><p>Stray end tags</span></p></div></div><h2>Mature Content</h2>',
+    '',
+])
+def test_extract_app_page_details_matches_tree_walks(html):
+    """Tests that the single-pass extractor agrees with the scrape_game_* functions on edge cases."""
+    assert extract_app_page_details(html) == scrape_app_tree_details(parse_html(html, "html.parser"))
+
+
+@pytest.mark.parametrize("fixture", sorted(FIXTURES.glob("*.html")), ids=lambda path: path.name)
+def test_extract_app_page_details_matches_tree_walks_on_saved_pages(fixture):
+    """Tests that the single-pass extractor agrees with the scrape_game_* functions on saved app pages."""
+    html = fixture.read_text(encoding="utf_8")
+    assert extract_app_page_details(html) == scrape_app_tree_details(parse_html(html, "html.parser"))
+
+
+@pytest.mark.parametrize("fixture", sorted(FIXTURES.glob("*.html")), ids=lambda path: path.name)
+def test_scrape_app_page_details_memoizes_identical_pages(fixture, monkeypatch):
+    """Tests that an app page identical to one already scraped is not parsed again."""
+    monkeypatch.setenv("PARSE_MEMO_BACKEND", "memory")
+    monkeypatch.setattr(parse_memo, "_memo", None)
+    html = fixture.read_text(encoding="utf_8")
+    first = scrape_app_page_details(html)
+    with mock.patch("scrape_steam.extract_app_page_details") as mocked_extract:
+        second = scrape_app_page_details(html)
+    mocked_extract.assert_not_called()
+    assert first == second == extract_app_page_details(html)